@@ -0,0 +1,214 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from discord.ext import commands
+
+import metrics
+from cache import LRUCache
+from config import Config
+from outbound import outbound
+from ratelimit import TokenBucket
+
+
+# Starting cost estimates in seconds of work, per cost class and report
+# kind: "cached" (encounter already in memory), "report" (dps.report link,
+# size unknown) and "upload" (attachment; seconds per MB). Observed
+# runtimes replace them as commands run.
+COST_CLASSES: Dict[str, Dict[str, float]] = {
+    "encounter": {"cached": 0.2, "report": 3.0, "upload": 0.5},
+    "chart": {"cached": 1.0, "report": 4.0, "upload": 0.6},
+    # !jsondebug / !mechdebug always download (and re-send) the raw EI JSON
+    "raw_json": {"cached": 8.0, "report": 8.0, "upload": 1.0},
+}
+
+_MB = 1024 * 1024
+# Weight of the newest observation in the learned estimates
+_EWMA_ALPHA = 0.2
+# An estimate never drops below this, so a burst of cache hits still costs
+_MIN_COST = 0.05
+
+
+class AdmissionRejected(commands.CheckFailure):
+    """
+    A command was turned away by admission control (the user has been told).
+    """
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CostModel:
+    """
+    Estimated seconds of work per (command, report kind), learned as an
+    exponentially weighted average of observed runtimes. Uploads are
+    tracked per MB of attachment, so a 40 MB log costs more than a 2 MB one.
+    """
+
+    def __init__(self) -> None:
+        self._estimates: Dict[Tuple[str, str], float] = {}
+
+    def estimate(self, command: str, cost_class: str, kind: str, size: int = 0) -> float:
+        rate = self._estimates.get((command, kind))
+        if rate is None:
+            rate = COST_CLASSES[cost_class][kind]
+        if kind == "upload":
+            return max(rate * max(size / _MB, 1.0), _MIN_COST)
+        return max(rate, _MIN_COST)
+
+    def observe(self, command: str, cost_class: str, kind: str, seconds: float, size: int = 0) -> None:
+        if kind == "upload":
+            seconds /= max(size / _MB, 1.0)
+        key = (command, kind)
+        previous = self._estimates.get(key)
+        if previous is None:
+            previous = COST_CLASSES[cost_class][kind]
+        updated = previous + _EWMA_ALPHA * (seconds - previous)
+        self._estimates[key] = updated
+        metrics.ADMISSION_COST_ESTIMATE.labels(command, kind).set(updated)
+
+
+class _Admission:
+    __slots__ = ("command", "cost_class", "kind", "size", "cost", "buckets")
+
+    def __init__(self, command: str, cost_class: str, kind: str, size: int, cost: float) -> None:
+        self.command = command
+        self.cost_class = cost_class
+        self.kind = kind
+        self.size = size
+        self.cost = cost
+        # (bucket, tokens taken from it)
+        self.buckets: List[Tuple[TokenBucket, float]] = []
+
+
+class AdmissionController:
+    """
+    Cost-aware admission for expensive commands (those declaring
+    extras={"cost": <class>}), checked before the command runs:
+
+      - every user, guild and the bot as a whole has a token bucket holding
+        `budget` seconds of work per `period`
+      - a command takes its estimated cost from all three; if they have it,
+        it runs now
+      - if the slowest bucket refills within `max_queue` seconds, the tokens
+        are reserved and the command waits its turn
+      - otherwise it is rejected with a retry-after
+
+    After the command, the bucket charge is corrected to the measured
+    runtime and the estimate for that command learns from it.
+    """
+
+    def __init__(
+        self,
+        period: float,
+        user_budget: float,
+        guild_budget: float,
+        global_budget: float,
+        max_queue: float,
+    ) -> None:
+        self.period = period
+        self.user_budget = user_budget
+        self.guild_budget = guild_budget
+        self.max_queue = max_queue
+        self.costs = CostModel()
+        self.global_bucket = TokenBucket(global_budget, period) if global_budget > 0 else None
+        self._users = LRUCache("admission_users", 4096)
+        self._guilds = LRUCache("admission_guilds", 1024)
+
+    def _bucket(self, cache: LRUCache, key: int, budget: float) -> TokenBucket:
+        bucket = cache.get(key)
+        if bucket is None:
+            bucket = TokenBucket(budget, self.period)
+            cache.put(key, bucket)
+        return bucket
+
+    def _buckets_for(self, ctx: commands.Context) -> List[Tuple[str, TokenBucket]]:
+        buckets: List[Tuple[str, TokenBucket]] = []
+        if self.user_budget > 0:
+            buckets.append(("user", self._bucket(self._users, ctx.author.id, self.user_budget)))
+        if self.guild_budget > 0 and ctx.guild is not None:
+            buckets.append(("guild", self._bucket(self._guilds, ctx.guild.id, self.guild_budget)))
+        if self.global_bucket is not None:
+            buckets.append(("global", self.global_bucket))
+        return buckets
+
+    async def admit(
+        self,
+        ctx: commands.Context,
+        cost_class: str,
+        kind: str,
+        size: int = 0,
+        command: Optional[str] = None,
+    ) -> float:
+        """
+        Run-now / queue / reject decision for one invocation. Returns the
+        seconds it waited; raises AdmissionRejected after telling the user.
+        `command` names work that isn't a command (ctx.command is None).
+        """
+        if command is None:
+            command = ctx.command.qualified_name
+        cost = self.costs.estimate(command, cost_class, kind, size)
+        admission = _Admission(command, cost_class, kind, size, cost)
+        ctx.admission = admission
+
+        buckets = self._buckets_for(ctx)
+        # A single command bigger than a bucket is charged the whole bucket,
+        # so it can still run once that bucket is full
+        charges = [(scope, b, min(cost, b.capacity)) for scope, b in buckets]
+        wait, scope = max(
+            ((b.wait_time(c), scope) for scope, b, c in charges),
+            default=(0.0, ""),
+        )
+
+        if wait > self.max_queue:
+            metrics.ADMISSION_DECISIONS.labels(command, "rejected", scope).inc()
+            ctx.admission = None
+            who = {"user": "You have", "guild": "This server has", "global": "The bot has"}[scope]
+            text = (
+                f"{who} used up the processing budget for now. "
+                f"Try again in {wait:.0f}s."
+            )
+            await outbound.send(ctx, text)
+            raise AdmissionRejected(text, wait)
+
+        for _, bucket, charge in charges:
+            bucket.reserve(charge)
+            admission.buckets.append((bucket, charge))
+
+        if wait <= 0:
+            metrics.ADMISSION_DECISIONS.labels(command, "admitted", "").inc()
+            return 0.0
+
+        metrics.ADMISSION_DECISIONS.labels(command, "queued", scope).inc()
+        if wait >= 1.0:
+            outbound.status(ctx, f"Busy – your command starts in about {wait:.0f}s…")
+        await asyncio.sleep(wait)
+        metrics.ADMISSION_QUEUE_WAIT.observe(wait)
+        return wait
+
+    def settle(self, ctx: commands.Context, seconds: float) -> None:
+        """
+        Charge the measured runtime instead of the estimate and learn from it.
+        """
+        admission: Optional[_Admission] = getattr(ctx, "admission", None)
+        if admission is None:
+            return
+        ctx.admission = None
+        for bucket, charge in admission.buckets:
+            actual = min(seconds, bucket.capacity)
+            if actual < charge:
+                bucket.refund(charge - actual)
+            elif actual > charge:
+                bucket.reserve(actual - charge)
+        self.costs.observe(
+            admission.command, admission.cost_class, admission.kind, seconds, admission.size
+        )
+
+
+admission_controller = AdmissionController(
+    period=Config.ADMISSION_PERIOD,
+    user_budget=Config.ADMISSION_USER_BUDGET,
+    guild_budget=Config.ADMISSION_GUILD_BUDGET,
+    global_budget=Config.ADMISSION_GLOBAL_BUDGET,
+    max_queue=Config.ADMISSION_MAX_QUEUE,
+)
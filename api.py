@@ -0,0 +1,243 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+import scoring_config
+from cache import LRUCache
+from encounter import PHASE_METRICS, compute_phase_metrics
+from watchdog import label_current_task
+
+
+EncounterLoader = Callable[[str], Awaitable[Dict[str, Any]]]
+
+# Metric nodes served by /encounters/{report_id}/{metric}
+METRIC_NAMES: Tuple[str, ...] = tuple(PHASE_METRICS.nodes) + ("scoring_key",)
+
+_REPORT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# Bodies below this are sent as is; above _GZIP_IN_THREAD they are
+# compressed off the event loop
+_GZIP_MIN = 1024
+_GZIP_IN_THREAD = 256 * 1024
+
+_RETRY_AFTER_BUSY = 2
+
+
+class ApiError(Exception):
+    """
+    An HTTP error answer, e.g. a report dps.report refused or a full server.
+    """
+
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def encounter_summary(report_id: str, encounter: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Header fields, phases and players of an encounter (no metrics).
+    """
+    return {
+        "report_id": report_id,
+        "boss_name": encounter["boss_name"],
+        "duration": encounter.get("duration"),
+        "success": bool(encounter.get("success")),
+        "is_cm": bool(encounter.get("is_cm")),
+        "permalink": encounter.get("permalink"),
+        "phases": encounter["phase_table"]["phases"],
+        "players": [
+            {"name": name, "profession": profession}
+            for name, profession in encounter["name_prof_map"].items()
+        ],
+        "metrics": list(METRIC_NAMES),
+    }
+
+
+class EncounterApi:
+    """
+    Read-only JSON over computed encounters:
+
+      GET /encounters/{report_id}            header, phases, players
+      GET /encounters/{report_id}/{metric}   one metric node, ?phase=N (default 0)
+
+    Encounters come from `load` (the bot's encounter cache, fetching on a
+    miss) and metrics from the same compute_phase_metrics results the
+    commands use. Reports never change, so the weak ETag only depends on
+    the report, the resource and the boss' scoring key; a matching
+    If-None-Match is answered with 304 without touching the encounter.
+
+    At most `concurrency` requests load or compute at once. Further ones
+    get 503 with Retry-After instead of queueing on the event loop the
+    Discord commands share.
+    """
+
+    def __init__(self, load: EncounterLoader, concurrency: int) -> None:
+        self.load = load
+        self.concurrency = max(int(concurrency), 1)
+        self._busy = 0
+        # report id -> boss name, to work out an ETag without the encounter
+        self._bosses = LRUCache("api_boss", 4096)
+        # etag -> (json body, gzipped body or None)
+        self._bodies = LRUCache("api_body", 256)
+
+    # -- handlers -----------------------------------------------------------
+
+    async def get_encounter(self, request: "web.Request") -> "web.Response":
+        return await self._handle(request, "encounter", None)
+
+    async def get_metric(self, request: "web.Request") -> "web.Response":
+        return await self._handle(request, "metric", request.match_info["metric"])
+
+    async def _handle(
+        self,
+        request: "web.Request",
+        endpoint: str,
+        metric: Optional[str],
+    ) -> "web.Response":
+        started = time.perf_counter()
+        try:
+            response = await self._respond(request, metric)
+        except ApiError as e:
+            response = _error_response(e)
+        metrics.API_REQUESTS.labels(endpoint, str(response.status)).inc()
+        metrics.API_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+        return response
+
+    # -- internals ----------------------------------------------------------
+
+    async def _respond(self, request: "web.Request", metric: Optional[str]) -> "web.Response":
+        report_id = request.match_info["report_id"]
+        label_current_task("api", request.path_qs)
+        if not _REPORT_ID_RE.match(report_id):
+            raise ApiError(400, "Not a dps.report id.")
+        if metric is not None and metric not in METRIC_NAMES:
+            raise ApiError(404, f"Unknown metric {metric!r}; one of: {', '.join(METRIC_NAMES)}.")
+        try:
+            phase = int(request.query.get("phase", "0"))
+        except ValueError:
+            raise ApiError(400, "phase must be an integer.") from None
+
+        boss_name = self._bosses.get(report_id)
+        if boss_name is not None:
+            etag = _etag(report_id, metric, phase, boss_name)
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+            cached = self._bodies.get(etag)
+            if cached is not None:
+                return _json_response(request, etag, *cached)
+
+        if self._busy >= self.concurrency:
+            raise ApiError(503, "The API is busy. Try again shortly.", _RETRY_AFTER_BUSY)
+        self._busy += 1
+        metrics.API_IN_FLIGHT.set(self._busy)
+        try:
+            encounter = await self.load(report_id)
+            boss_name = encounter["boss_name"]
+            self._bosses.put(report_id, boss_name)
+            etag = _etag(report_id, metric, phase, boss_name)
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+            if metric is None:
+                payload = encounter_summary(report_id, encounter)
+            else:
+                phases = encounter["phase_table"]["phases"]
+                if not 0 <= phase < len(phases):
+                    raise ApiError(404, f"This log has phases 0-{len(phases) - 1}.")
+                payload = compute_phase_metrics(encounter, phase)[metric]
+
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            packed = await _gzip(body)
+        finally:
+            self._busy -= 1
+            metrics.API_IN_FLIGHT.set(self._busy)
+
+        self._bodies.put(etag, (body, packed))
+        return _json_response(request, etag, body, packed)
+
+
+def _etag(report_id: str, metric: Optional[str], phase: int, boss_name: str) -> str:
+    # The summary does not depend on scoring weights
+    scoring_key = scoring_config.current().key_for(boss_name) if metric is not None else ""
+    raw = f"{report_id}\0{metric or ''}\0{phase}\0{scoring_key}"
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def _etag_matches(request: "web.Request", etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = {tag.strip() for tag in header.split(",")}
+    # Weak comparison: W/"x" and "x" name the same representation
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+
+async def _gzip(body: bytes) -> Optional[bytes]:
+    if len(body) < _GZIP_MIN:
+        return None
+    if len(body) > _GZIP_IN_THREAD:
+        return await asyncio.to_thread(gzip.compress, body, 6)
+    return gzip.compress(body, 6)
+
+
+def _json_response(
+    request: "web.Request",
+    etag: str,
+    body: bytes,
+    packed: Optional[bytes],
+) -> "web.Response":
+    from aiohttp import web
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if packed is not None and "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        body = packed
+        headers["Content-Encoding"] = "gzip"
+    return web.Response(body=body, content_type="application/json", headers=headers)
+
+
+def _not_modified(etag: str) -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(status=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _error_response(error: ApiError) -> "web.Response":
+    from aiohttp import web
+
+    headers = {}
+    if error.retry_after is not None:
+        headers["Retry-After"] = str(error.retry_after)
+    return web.json_response({"error": str(error)}, status=error.status, headers=headers)
+
+
+async def start_api_server(
+    host: str,
+    port: int,
+    load: EncounterLoader,
+    concurrency: int,
+) -> "web.AppRunner":
+    """
+    Serve the encounter API on host:port from the running event loop.
+    Like the metrics server, aiohttp.web is only imported when enabled.
+    """
+    from aiohttp import web
+
+    api = EncounterApi(load, concurrency)
+    app = web.Application()
+    app.router.add_get("/encounters/{report_id}", api.get_encounter)
+    app.router.add_get("/encounters/{report_id}/{metric}", api.get_metric)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
@@ -0,0 +1,320 @@
+"""
+Backtest MVP / support weights against stored per-player metrics.
+
+    python backtest.py data/export --grid mvp.dps=0.5:1.0:0.05 --grid mvp.support=0.1,0.25,0.4
+    python backtest.py data/export --grid support.boon=0:0.5:0.1 --output backtest.csv
+
+Reads the rows written by the export (EXPORT_DIR or reprocess.py
+--export-dir) and scores every weight setting in the grid against the
+current weights (SCORING_CONFIG_PATH or --scoring-config). Keys not in
+the grid keep their current value.
+
+With the per-encounter normalisation of compute_support_scores and
+compute_mvp done once up front, an MVP score is a dot product of six
+per-player features with six combined weights. A whole block of settings
+is then one matrix product over (encounters x players) instead of a
+compute_mvp call per encounter and setting.
+"""
+import argparse
+import csv
+import itertools
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from export import read_export
+import scoring_config
+
+
+# Feature columns of the (encounters, players, features) tensor
+FEATURES = ("damage_share", "healing", "boon", "mech", "breakbar", "fail")
+GRID_KEYS = (
+    "mvp.dps",
+    "mvp.support",
+    "mvp.fail_penalty",
+    "support.healing",
+    "support.boon",
+    "support.mech",
+    "support.breakbar",
+)
+
+# Settings scored per matrix product; bounds memory to
+# encounters x players x SETTINGS_BLOCK floats
+SETTINGS_BLOCK = 64
+
+
+def parse_grid_values(spec: str) -> List[float]:
+    """
+    "0.1,0.2,0.5" or "start:stop:step" (stop included).
+    """
+    if ":" in spec:
+        start, stop, step = (float(v) for v in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"step must be positive in {spec!r}")
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(max(count, 1))]
+    return [float(v) for v in spec.split(",") if v.strip()]
+
+
+def build_grid(specs: Sequence[str], base: Dict[str, float]) -> Tuple[List[str], np.ndarray]:
+    """
+    Cartesian product of the --grid axes -> (keys, settings[K, len(GRID_KEYS)]).
+    """
+    axes: Dict[str, List[float]] = {}
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        key = key.strip()
+        if key not in GRID_KEYS:
+            raise SystemExit(f"Unknown grid key {key!r}; use one of {', '.join(GRID_KEYS)}")
+        axes[key] = parse_grid_values(values)
+
+    varied = list(axes)
+    combos = list(itertools.product(*(axes[k] for k in varied))) or [()]
+    settings = np.tile(np.array([base[k] for k in GRID_KEYS]), (len(combos), 1))
+    for j, key in enumerate(varied):
+        settings[:, GRID_KEYS.index(key)] = [combo[j] for combo in combos]
+    return varied, settings
+
+
+def base_weights(config: scoring_config.ScoringConfig) -> Dict[str, float]:
+    weights = {f"mvp.{k}": float(v) for k, v in config.mvp_weights.items()}
+    weights.update((f"support.{k}", float(v)) for k, v in config.support_weights.items())
+    return {k: weights.get(k, 0.0) for k in GRID_KEYS}
+
+
+def combined_weights(settings: np.ndarray) -> np.ndarray:
+    """
+    settings[K, GRID_KEYS] -> weights[FEATURES, K] such that
+    features @ weights == compute_mvp's score for each setting.
+    """
+    col = {k: settings[:, i] for i, k in enumerate(GRID_KEYS)}
+    support = col["mvp.support"]
+    return np.stack(
+        [
+            col["mvp.dps"],
+            support * col["support.healing"],
+            support * col["support.boon"],
+            support * col["support.mech"],
+            support * col["support.breakbar"],
+            -col["mvp.fail_penalty"],
+        ]
+    )
+
+
+def load_tensor(rows: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """
+    Export rows -> (features[E, P, F], mask[E, P], profession codes[E, P],
+    profession names, stored MVP flags[E, P]). A report exported twice is
+    counted once.
+    """
+    encounters: Dict[str, Dict[str, Dict]] = {}
+    for row in rows:
+        players = encounters.setdefault(row["report_id"], {})
+        players.setdefault(row["player"], row)
+
+    n_enc = len(encounters)
+    n_players = max((len(p) for p in encounters.values()), default=0)
+    raw = np.zeros((n_enc, n_players, len(FEATURES)))
+    mask = np.zeros((n_enc, n_players), dtype=bool)
+    prof = np.full((n_enc, n_players), -1, dtype=np.int32)
+    stored_mvp = np.zeros((n_enc, n_players), dtype=bool)
+    prof_names: List[str] = []
+    prof_index: Dict[str, int] = {}
+
+    for e, players in enumerate(encounters.values()):
+        for p, row in enumerate(players.values()):
+            raw[e, p] = [
+                row["damage_share"] or 0.0,
+                row.get("healing") or 0.0,
+                row["boon_score"] or 0.0,
+                row["success_score"] or 0.0,
+                row["breakbar"] or 0.0,
+                row["fail_score"] or 0.0,
+            ]
+            mask[e, p] = True
+            code = prof_index.get(row["profession"])
+            if code is None:
+                code = prof_index[row["profession"]] = len(prof_names)
+                prof_names.append(row["profession"])
+            prof[e, p] = code
+            stored_mvp[e, p] = bool(row.get("is_mvp"))
+
+    # scoring.normalize per encounter: divide by the max, all zero if max <= 0
+    features = raw.copy()
+    peak = raw[:, :, 1:5].max(axis=1, keepdims=True)
+    features[:, :, 1:5] = np.where(peak > 0, raw[:, :, 1:5] / np.where(peak > 0, peak, 1.0), 0.0)
+    # compute_mvp's fail normalisation: max <= 0 divides by 1
+    fail_peak = raw[:, :, 5:6].max(axis=1, keepdims=True)
+    features[:, :, 5:6] = raw[:, :, 5:6] / np.where(fail_peak > 0, fail_peak, 1.0)
+    return features, mask, prof, prof_names, stored_mvp
+
+
+def _ranks(scores: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Ranks of the players (axis 1) of every encounter, 0 = lowest score.
+    Equal scores share their average rank, as in Spearman's rho; ordinal
+    ranks would give tied players the same arbitrary order in both
+    rankings and inflate the correlation. Padding slots (not `valid`) are
+    left out and get 0.
+    """
+    moved = np.moveaxis(scores, 1, -1)
+    flat = moved.reshape(-1, moved.shape[-1])
+    n = flat.shape[1]
+    order = np.argsort(flat, axis=1, kind="stable")
+    ordered = np.take_along_axis(flat, order, axis=1)
+    pos = np.broadcast_to(np.arange(n), ordered.shape)
+
+    # First and last sorted position of each run of equal scores
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    ends = np.ones(ordered.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, pos, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, pos, n)[:, ::-1], axis=1)[:, ::-1]
+
+    flat_ranks = np.empty(ordered.shape)
+    np.put_along_axis(flat_ranks, order, (first + last) / 2.0, axis=1)
+    ranks = np.moveaxis(flat_ranks.reshape(moved.shape), -1, 1)
+
+    # Padding holds -inf, so it sorts first: shift the real players down to 0
+    valid = np.broadcast_to(valid, ranks.shape)
+    padding = (~valid).sum(axis=1, keepdims=True)
+    return np.where(valid, ranks - padding, 0.0)
+
+
+def evaluate(
+    features: np.ndarray,
+    mask: np.ndarray,
+    prof: np.ndarray,
+    n_profs: int,
+    settings: np.ndarray,
+    base: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Score every setting at once (in blocks of SETTINGS_BLOCK). Returns
+    per-setting arrays: mvp_change (share of encounters whose MVP differs
+    from `base`), spearman (mean per-encounter rank correlation with
+    `base`) and prof_mvp[K, professions] (MVP counts per profession).
+    """
+    n_enc = features.shape[0]
+    rows = np.arange(n_enc)
+    valid = mask[:, :, None]
+    n_valid = mask.sum(axis=1)
+
+    base_scores = np.where(mask, features @ combined_weights(base[None, :])[:, 0], -np.inf)
+    base_mvp = base_scores.argmax(axis=1)
+    base_rank = _ranks(base_scores, mask)[:, :, None]
+    base_centered = np.where(valid, base_rank - _masked_mean(base_rank, valid, n_valid), 0.0)
+
+    change, spearman, prof_mvp = [], [], []
+    for start in range(0, len(settings), SETTINGS_BLOCK):
+        block = settings[start : start + SETTINGS_BLOCK]
+        scores = np.einsum("epf,fk->epk", features, combined_weights(block))
+        scores = np.where(valid, scores, -np.inf)
+
+        mvp = scores.argmax(axis=1)  # [E, k]
+        change.append((mvp != base_mvp[:, None]).mean(axis=0))
+
+        ranks = _ranks(scores, valid)
+        centered = np.where(valid, ranks - _masked_mean(ranks, valid, n_valid), 0.0)
+        cov = (centered * base_centered).sum(axis=1)
+        var = (centered ** 2).sum(axis=1) * (base_centered ** 2).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rho = np.where(var > 0, cov / np.sqrt(var), np.nan)
+        spearman.append(np.nanmean(rho, axis=0) if n_enc else np.zeros(len(block)))
+
+        mvp_prof = prof[rows[:, None], mvp]  # [E, k]
+        counts = np.zeros((len(block), n_profs))
+        for k in range(len(block)):
+            counts[k] = np.bincount(mvp_prof[:, k], minlength=n_profs)
+        prof_mvp.append(counts)
+
+    return {
+        "mvp_change": np.concatenate(change),
+        "spearman": np.concatenate(spearman),
+        "prof_mvp": np.concatenate(prof_mvp),
+        "base_mvp": base_mvp,
+    }
+
+
+def _masked_mean(values: np.ndarray, valid: np.ndarray, n_valid: np.ndarray) -> np.ndarray:
+    total = np.where(valid, values, 0.0).sum(axis=1, keepdims=True)
+    return total / np.maximum(n_valid, 1)[:, None, None]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest MVP/support weights on exported rows")
+    parser.add_argument("export_dir", help="directory written by EXPORT_DIR / reprocess.py")
+    parser.add_argument(
+        "--grid",
+        action="append",
+        default=[],
+        help=f"KEY=v1,v2,... or KEY=start:stop:step; KEY one of {', '.join(GRID_KEYS)}",
+    )
+    parser.add_argument("--scoring-config", default=Config.SCORING_CONFIG_PATH)
+    parser.add_argument("--output", default="", help="CSV with one row per setting")
+    parser.add_argument("--top", type=int, default=10, help="settings listed per ranking")
+    args = parser.parse_args()
+
+    config = scoring_config.load_scoring_config(args.scoring_config or None)
+    base = base_weights(config)
+    varied, settings = build_grid(args.grid, base)
+    base_vec = np.array([base[k] for k in GRID_KEYS])
+
+    rows = read_export(args.export_dir)
+    if not rows:
+        raise SystemExit(f"No exported rows under {args.export_dir}")
+    features, mask, prof, prof_names, stored_mvp = load_tensor(rows)
+    n_enc = features.shape[0]
+    print(f"{n_enc} encounters, {int(mask.sum())} player rows, {len(settings)} settings")
+
+    started = time.perf_counter()
+    result = evaluate(features, mask, prof, len(prof_names), settings, base_vec)
+    print(f"Evaluated in {time.perf_counter() - started:.2f}s")
+
+    base_mvp = result["base_mvp"]
+    agree = stored_mvp[np.arange(n_enc), base_mvp].mean() if n_enc else 0.0
+    print(f"Current weights reproduce the stored MVP in {agree:.1%} of encounters")
+
+    # Per-spec bias: share of MVPs vs share of player slots
+    slots = np.bincount(prof[mask], minlength=len(prof_names)) / mask.sum()
+    base_share = np.bincount(prof[np.arange(n_enc), base_mvp], minlength=len(prof_names)) / n_enc
+    grid_share = result["prof_mvp"] / n_enc
+    print("\nProfession         slots   MVP now  bias   MVP range over grid")
+    for i in np.argsort(-base_share):
+        bias = base_share[i] / slots[i] if slots[i] else 0.0
+        print(
+            f"{prof_names[i]:<18} {slots[i]:6.1%}  {base_share[i]:6.1%}  {bias:4.2f}  "
+            f"{grid_share[:, i].min():6.1%} – {grid_share[:, i].max():6.1%}"
+        )
+
+    def describe(k: int) -> str:
+        return ", ".join(f"{key}={settings[k, GRID_KEYS.index(key)]:g}" for key in varied) or "current"
+
+    order = np.argsort(result["mvp_change"])
+    print(f"\nLeast MVP changes (top {args.top}):")
+    for k in order[: args.top]:
+        print(f"  {result['mvp_change'][k]:6.1%}  rho={result['spearman'][k]:.3f}  {describe(k)}")
+    print(f"Most MVP changes (top {args.top}):")
+    for k in order[::-1][: args.top]:
+        print(f"  {result['mvp_change'][k]:6.1%}  rho={result['spearman'][k]:.3f}  {describe(k)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                list(GRID_KEYS) + ["mvp_change", "spearman"] + [f"mvp_share_{p}" for p in prof_names]
+            )
+            for k in range(len(settings)):
+                writer.writerow(
+                    [f"{v:g}" for v in settings[k]]
+                    + [f"{result['mvp_change'][k]:.6f}", f"{result['spearman'][k]:.6f}"]
+                    + [f"{v:.6f}" for v in grid_share[k]]
+                )
+        print(f"Wrote {len(settings)} settings to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
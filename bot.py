@@ -1,10 +1,15 @@
-from typing import Dict
+from typing import Any, Dict, Optional, Set, Tuple
 
+import startup  # first import: starts the boot clock
 import discord
 from discord.ext import commands
+import asyncio
 import io
 import json
 import gzip
+import re
+import signal
+import time
 
 from aiohttp import ClientResponseError
 
@@ -14,29 +19,88 @@ from dps_report_client import (
     fetch_ei_json,
     fetch_upload_metadata,
 )
-from gw2_stats import (
-    get_player_dps,
-    get_mechanic_summary,
-    compute_support_metrics,
-    mechanic_fail_counts,
-    mechanic_success_scores,
-    mechanic_fail_scores,
-    compute_boss_damage,
-    BOON_GENERATION_WEIGHTS,
+from encounter import (
+    build_name_prof_map,
+    encounter_header,
+    encounter_from_json,
+    compute_phase_metrics,
+    phase_window,
+    encounter_cache,
 )
-from mechanics_config import get_fail_rules_for_boss, get_success_rules_for_boss
-from scoring import compute_support_scores, compute_mvp
+import scoring_config
+from jobs import JobFailed, JobTimeout, decode_encounter, open_job_queue
+from views import send_paginated
+from outbound import outbound, install_rate_limit_logging
 from icons import icon_for_profession
+import metrics
+from snapshot import save_snapshot, warm_start
+from cache import TTLCache
+from sessions import RaidSession, session_store
+from upload_index import UploadInfo, content_hash, open_upload_index
+from evtc_compress import compress_evtc, needs_compression
+from api import ApiError, start_api_server
+from export import encounter_rows, open_exporter
+from admission import AdmissionRejected, admission_controller
+from watchdog import format_stall, get_stall_watchdog, label_current_task, start_stall_watchdog
+from memgov import (
+    MemoryBudgetExceeded,
+    Reservation,
+    estimate_upload_cost,
+    memory_governor,
+)
+
+# numpy (charts) and cProfile/tracemalloc (profiling) are imported by the
+# commands that need them, not at boot.
+
+startup.mark("imports")
 
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(
-    command_prefix=Config.COMMAND_PREFIX,
-    intents=intents,
-    help_command=None,  # custom help if you want later
+# Commands only read the invoking message, so discord.py's message and
+# member caches are dead weight next to a few hundred MB of EI JSON.
+low_memory_options = dict(
+    max_messages=Config.MESSAGE_CACHE_SIZE or None,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False,
+)
+
+if Config.SHARDED:
+    # One process, many gateway shards; heavy work can go to worker.py
+    bot = commands.AutoShardedBot(
+        command_prefix=Config.COMMAND_PREFIX,
+        intents=intents,
+        help_command=None,
+        shard_count=Config.SHARD_COUNT or None,
+        **low_memory_options,
+    )
+else:
+    bot = commands.Bot(
+        command_prefix=Config.COMMAND_PREFIX,
+        intents=intents,
+        help_command=None,  # custom help if you want later
+        **low_memory_options,
+    )
+
+job_queue = open_job_queue(Config.JOB_QUEUE_PATH, Config.JOB_STALE_AFTER)
+upload_index = open_upload_index(Config.UPLOAD_INDEX_PATH)
+encounter_exporter = open_exporter(
+    Config.EXPORT_DIR, Config.EXPORT_FORMAT, Config.EXPORT_BATCH_ROWS
 )
+# report id -> (reason, message) for reports whose EI JSON dps.report refused
+unavailable_reports = TTLCache("unavailable_reports", 1024)
+# Shorter for states that can fix themselves (a report still processing, or
+# one whose owner makes it public); no_json needs a new upload to change
+UNAVAILABLE_TTLS: Dict[str, float] = {
+    "not_found": Config.UNAVAILABLE_TTL_NOT_FOUND,
+    "private": Config.UNAVAILABLE_TTL_PRIVATE,
+    "no_json": Config.UNAVAILABLE_TTL_NO_JSON,
+}
+# content hash -> upload in progress, so simultaneous duplicates wait for it
+_uploads_in_flight: Dict[str, "asyncio.Future[Optional[UploadInfo]]"] = {}
+# report id -> HTTP API load in progress, shared by concurrent requests
+_api_loads: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
 
 # ---------------------------------------------------------------------------
 # Profession -> Icon mapping
@@ -47,27 +111,6 @@ bot = commands.Bot(
 
 
 
-def build_name_prof_map(ei_json: dict) -> Dict[str, str]:
-    """
-    Build a mapping from player name -> profession/spec string
-    using the same logic as gw2_stats._safe_get_profession.
-    """
-    mapping: Dict[str, str] = {}
-    for p in ei_json.get("players", []) or []:
-        name = p.get("name") or p.get("character_name") or "Unknown"
-        prof = (
-            p.get("profession")
-            or p.get("professionName")
-            or p.get("spec")
-            or "Unknown"
-        )
-        mapping[name] = prof
-    return mapping
-
-
-
-
-
 def format_with_icon(name: str, name_prof_map: Dict[str, str]) -> str:
     """
     Given a player name and a name->profession map, return "[icon] name"
@@ -84,113 +127,204 @@ def format_with_icon(name: str, name_prof_map: Dict[str, str]) -> str:
 # Shared helpers
 # ---------------------------------------------------------------------------
 
-async def fetch_log_ei(
-    ctx: commands.Context,
-    report: str | None,
-):
+_PHASE_ARG_RE = re.compile(r"^(?:p|phase)?(\d{1,2})$", re.IGNORECASE)
+_RANGE_ARG_RE = re.compile(r"^(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)s?$")
+_LAST_ARG_RE = re.compile(r"^last(\d+(?:\.\d+)?)s?$", re.IGNORECASE)
+_TOP_ARG_RE = re.compile(r"^top(\d{1,2})$", re.IGNORECASE)
+_BURST_ARG_RE = re.compile(r"^burst(\d{1,3})s?$", re.IGNORECASE)
+_REPORT_LINK_RE = re.compile(r"https?://(?:www\.|[a-z]\.)?dps\.report/[\w-]+", re.IGNORECASE)
+
+
+def parse_report_ref(report: str) -> str:
     """
-    Shared helper that:
-      - If `report` is provided: treats it as dps.report URL or ID.
-      - Else: expects an attached ArcDPS log file.
+    Turn a dps.report URL (optionally wrapped in <>) or bare id into the id.
+    """
+    ref = report.strip().strip("<>")
+    if "dps.report" in ref:
+        ref = ref.split("/")[-1]
+    return ref
 
-    Returns:
-      (ei_json, boss_name, duration_seconds, success, is_cm, permalink)
-    or None on error (after sending a message to ctx).
+
+def split_phase_arg(report: str | None) -> Tuple[str | None, int]:
     """
-    # -----------------------------
-    # Mode 1: dps.report link or ID
-    # -----------------------------
-    if report is not None:
-        ref = report.strip().strip("<>")
+    Split an optional trailing phase argument off a command's report text:
 
-        if "dps.report" in ref:
-            ref = ref.split("/")[-1]
+      "XXXX-YYYY_boss"     -> ("XXXX-YYYY_boss", Config.PHASE_INDEX)
+      "XXXX-YYYY_boss p2"  -> ("XXXX-YYYY_boss", 2)
+      "2" (with upload)    -> (None, 2)
 
-        report_id = ref
-        await ctx.send(f"Fetching existing report `{report_id}` from dps.report…")
+    Phase numbers are Elite Insights phase indices as listed by !phases.
+    """
+    if not report:
+        return None, Config.PHASE_INDEX
 
-        try:
-            ei_json = await fetch_ei_json(report_id)
-        except ClientResponseError as e:
-            if e.status in (403, 404):
-                # Try to see if EI JSON is even available for this log
-                try:
-                    meta = await fetch_upload_metadata(report_id)
-                except Exception:
-                    await ctx.send(
-                        f"Elite Insights JSON for `{report_id}` is not accessible (HTTP {e.status}).\n"
-                        f"- The HTML page can still work fine.\n"
-                        f"- What the bot needs is the API endpoint:\n"
-                        f"  https://dps.report/getJson?id={report_id}\n"
-                        f"If opening that URL (or the `permalink` variant) in your browser "
-                        f"also gives an error, then EI JSON for this log is not publicly "
-                        f"exposed by dps.report."
-                    )
-                    return None
+    parts = report.split()
+    match = _PHASE_ARG_RE.match(parts[-1])
+    if match is None:
+        return report, Config.PHASE_INDEX
 
-                encounter = meta.get("encounter", {}) if isinstance(meta, dict) else {}
-                json_available = encounter.get("jsonAvailable")
-
-                if json_available is False:
-                    await ctx.send(
-                        f"Elite Insights JSON is **not available** for this report (`{report_id}`).\n"
-                        f"Re-upload the log to dps.report with EI JSON enabled, or use a different report."
-                    )
-                else:
-                    await ctx.send(
-                        f"dps.report refused EI JSON for `{report_id}` (HTTP {e.status}).\n"
-                        f"This can happen if the log is private or restricted. "
-                        f"Try opening these in your browser:\n"
-                        f"- https://dps.report/getJson?id={report_id}\n"
-                        f"- https://dps.report/getJson?permalink={report_id}"
-                    )
-                return None
-
-            await ctx.send(f"Failed to fetch Elite Insights JSON: HTTP {e.status} – {e.message}")
-            return None
+    rest = " ".join(parts[:-1]).strip()
+    return (rest or None), int(match.group(1))
 
-        except Exception as e:
-            await ctx.send(f"Failed to fetch Elite Insights JSON: `{e}`")
-            return None
+def split_window_arg(report: str | None) -> Tuple[str | None, Tuple[str, float, float]]:
+    """
+    Split an optional trailing time window off a command's report text:
 
-        boss_name = (
-            ei_json.get("fightName")
-            or ei_json.get("encounter", {}).get("boss")
-            or "Unknown Boss"
-        )
-        success = bool(
-            ei_json.get("success")
-            or ei_json.get("encounter", {}).get("success", False)
-        )
-        is_cm = bool(
-            ei_json.get("isCM")
-            or ei_json.get("isCm")
-            or ei_json.get("encounter", {}).get("isCm", False)
-        )
+      "<report> 120-180"  -> seconds 120..180 of the fight   ("range", 120, 180)
+      "<report> last10"   -> the last 10 seconds of the fight ("last", 10, 0)
+      "<report> p3"       -> phase 3                          ("phase", 3, 0)
+      "<report>"          -> the full fight                   ("phase", 0, 0)
+    """
+    if report:
+        parts = report.split()
+        tail = parts[-1]
+        rest = " ".join(parts[:-1]).strip() or None
+
+        match = _RANGE_ARG_RE.match(tail)
+        if match is not None:
+            return rest, ("range", float(match.group(1)), float(match.group(2)))
+        match = _LAST_ARG_RE.match(tail)
+        if match is not None:
+            return rest, ("last", float(match.group(1)), 0.0)
+
+    report, phase_index = split_phase_arg(report)
+    return report, ("phase", float(phase_index), 0.0)
+
+
+def split_graph_args(report: str | None) -> Tuple[str | None, int, int, int]:
+    """
+    Split !graph options off the report text, in any order after the report:
+
+      "<report> p2 top5 burst10" -> ("<report>", 2, 5, 10)
+
+    top<N> limits the players drawn (default TOP_N_DPS), burst<S> switches
+    from cumulative DPS to a rolling S-second window (0 = cumulative).
+    """
+    phase_index, top_n, window = Config.PHASE_INDEX, Config.TOP_N_DPS, 0
+    parts = report.split() if report else []
+    seen = set()
+    while parts:
+        top = _TOP_ARG_RE.match(parts[-1])
+        burst = _BURST_ARG_RE.match(parts[-1])
+        phase = _PHASE_ARG_RE.match(parts[-1])
+        if top is not None and "top" not in seen:
+            top_n, kind = max(int(top.group(1)), 1), "top"
+        elif burst is not None and "burst" not in seen:
+            window, kind = int(burst.group(1)), "burst"
+        elif phase is not None and "phase" not in seen:
+            phase_index, kind = int(phase.group(1)), "phase"
+        else:
+            break
+        seen.add(kind)
+        parts.pop()
+    return (" ".join(parts) or None), phase_index, top_n, window
+
+
+def format_fight_time(ms: float) -> str:
+    """
+    12345.0 -> "0:12.3"
+    """
+    seconds = max(ms, 0.0) / 1000.0
+    return f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+
+
+async def report_ei_error(
+    ctx: commands.Context,
+    report_id: str,
+    status: int | None,
+    message: str,
+) -> None:
+    """
+    Explain a failed EI JSON fetch to the user. For 403/404 we ask
+    dps.report whether EI JSON exists for the log at all, and remember the
+    answer (see answer_if_unavailable) so retries don't repeat the requests.
+    """
+    if status not in (403, 404):
+        if status is not None:
+            await outbound.send(ctx, f"Failed to fetch Elite Insights JSON: HTTP {status} – {message}")
+        else:
+            await outbound.send(ctx, f"Failed to fetch Elite Insights JSON: `{message}`")
+        return
 
-        duration = None
-        duration_ms = (
-            ei_json.get("durationMS")
-            or ei_json.get("encounterDuration")
+    # Only a real answer from dps.report is remembered: a 404 from the
+    # metadata endpoint too, or metadata saying whether JSON exists. A
+    # timeout or 5xx there says nothing about the report.
+    answered = True
+    try:
+        meta = await fetch_upload_metadata(report_id)
+    except ClientResponseError as e:
+        meta = None
+        answered = e.status == 404
+    except Exception:
+        meta = None
+        answered = False
+
+    if meta is None:
+        reason = "not_found" if status == 404 else "private"
+        text = (
+            f"Elite Insights JSON for `{report_id}` is not accessible (HTTP {status}).\n"
+            f"- The HTML page can still work fine.\n"
+            f"- What the bot needs is the API endpoint:\n"
+            f"  https://dps.report/getJson?id={report_id}\n"
+            f"If opening that URL (or the `permalink` variant) in your browser "
+            f"also gives an error, then EI JSON for this log is not publicly "
+            f"exposed by dps.report."
         )
-        if duration_ms is None:
-            phases = ei_json.get("phases") or []
-            if phases:
-                duration_ms = (
-                    phases[0].get("durationMS")
-                    or phases[0].get("duration")
-                )
-        if isinstance(duration_ms, (int, float)):
-            duration = duration_ms / 1000.0
+    else:
+        encounter = meta.get("encounter", {}) if isinstance(meta, dict) else {}
+        if encounter.get("jsonAvailable") is False:
+            reason = "no_json"
+            text = (
+                f"Elite Insights JSON is **not available** for this report (`{report_id}`).\n"
+                f"Re-upload the log to dps.report with EI JSON enabled, or use a different report."
+            )
+        else:
+            reason = "private"
+            text = (
+                f"dps.report refused EI JSON for `{report_id}` (HTTP {status}).\n"
+                f"This can happen if the log is private or restricted. "
+                f"Try opening these in your browser:\n"
+                f"- https://dps.report/getJson?id={report_id}\n"
+                f"- https://dps.report/getJson?permalink={report_id}"
+            )
 
-        permalink = f"https://dps.report/{report_id}"
-        return ei_json, boss_name, duration, success, is_cm, permalink
+    if answered:
+        unavailable_reports.put(report_id, (reason, text), UNAVAILABLE_TTLS[reason])
+        metrics.UNAVAILABLE_REPORTS.labels(reason, "recorded").inc()
+    await outbound.send(ctx, text)
 
-    # ----------------------------------
-    # Mode 2: attached ArcDPS log upload
-    # ----------------------------------
+
+async def answer_if_unavailable(ctx: commands.Context, report_id: str) -> bool:
+    """
+    If dps.report recently told us this report has no accessible EI JSON,
+    repeat that answer without asking it again. Returns True if answered.
+    """
+    known = unavailable_reports.get(report_id)
+    if known is None:
+        return False
+    reason, text = known
+    metrics.UNAVAILABLE_REPORTS.labels(reason, "answered").inc()
+    await outbound.send(ctx, text)
+    return True
+
+
+async def upload_attached_log(
+    ctx: commands.Context,
+    reservation: Optional[Reservation] = None,
+):
+    """
+    Upload the ArcDPS log attached to the command message to dps.report.
+    With a `reservation`, the file's memory is reserved for the upload and
+    given back afterwards (MemoryBudgetExceeded propagates). With
+    UPLOAD_INDEX_PATH set, a file that was uploaded before is not uploaded again.
+
+    Returns:
+      (report_id, boss_name, duration_seconds, success, is_cm, permalink)
+    or None on error (after sending a message to ctx).
+    """
     if not ctx.message.attachments:
-        await ctx.send(
+        await outbound.send(
+            ctx,
             "Attach a GW2 ArcDPS log (`.evtc`, `.evtc.zip`, `.zevtc`) "
             "or pass a dps.report link: `!log https://dps.report/xxxxx`."
         )
@@ -201,23 +335,88 @@ async def fetch_log_ei(
         attachment.filename.endswith(ext)
         for ext in (".evtc", ".evtc.zip", ".zevtc")
     ):
-        await ctx.send(
+        await outbound.send(
+            ctx,
             "That doesn't look like an ArcDPS log. "
             "Please upload a `.evtc`, `.evtc.zip`, or `.zevtc` file."
         )
         return None
 
-    await ctx.send(f"Uploading `{attachment.filename}` to dps.report…")
-    file_bytes = await attachment.read()
+    if reservation is not None:
+        await reservation.resize(estimate_upload_cost(attachment.size))
+    try:
+        file_bytes = await attachment.read()
+        if upload_index is None:
+            return await upload_log_bytes(ctx, file_bytes, attachment.filename)
+        return await upload_log_once(ctx, file_bytes, attachment.filename)
+    finally:
+        if reservation is not None:
+            await reservation.resize(0)
+
+
+async def upload_log_once(
+    ctx: commands.Context,
+    file_bytes: bytes,
+    filename: str,
+) -> Optional[UploadInfo]:
+    """
+    upload_log_bytes, unless the same bytes were uploaded before (or are
+    being uploaded right now): then the earlier report is reused.
+    """
+    size = len(file_bytes)
+    digest = await asyncio.to_thread(content_hash, file_bytes)
+
+    pending = _uploads_in_flight.get(digest)
+    if pending is not None:
+        known = await asyncio.shield(pending)
+        if known is not None:
+            upload_index.count_hit(size)
+    else:
+        known = await asyncio.to_thread(upload_index.lookup, digest, size)
+    if known is not None:
+        outbound.status(ctx, f"`{filename}` was already uploaded as `{known[0]}`, reusing it…")
+        return known
+
+    future = asyncio.get_running_loop().create_future()
+    _uploads_in_flight[digest] = future
+    uploaded = None
+    try:
+        uploaded = await upload_log_bytes(ctx, file_bytes, filename)
+        if uploaded is not None:
+            await asyncio.to_thread(upload_index.record, digest, size, uploaded)
+    finally:
+        _uploads_in_flight.pop(digest, None)
+        future.set_result(uploaded)
+    return uploaded
+
 
+async def upload_log_bytes(
+    ctx: commands.Context,
+    file_bytes: bytes,
+    filename: str,
+) -> Optional[UploadInfo]:
+    """
+    Upload one log to dps.report; same result as upload_attached_log.
+    Raw .evtc files are packed to .zevtc first (in a thread): uploads are
+    bound by bytes and raw logs are several times larger.
+    """
+    if needs_compression(filename):
+        outbound.status(ctx, f"Compressing `{filename}`…")
+        started = time.perf_counter()
+        raw_size = len(file_bytes)
+        file_bytes, filename = await asyncio.to_thread(compress_evtc, file_bytes, filename)
+        metrics.EVTC_COMPRESS_DURATION.observe(time.perf_counter() - started)
+        metrics.UPLOAD_BYTES_SAVED.labels("compression").inc(max(raw_size - len(file_bytes), 0))
+
+    outbound.status(ctx, f"Uploading `{filename}` to dps.report…")
     try:
-        upload_json = await upload_to_dps_report(file_bytes, attachment.filename)
+        upload_json = await upload_to_dps_report(file_bytes, filename)
     except Exception as e:
-        await ctx.send(f"Upload to dps.report failed: `{e}`")
+        await outbound.send(ctx, f"Upload to dps.report failed: `{e}`")
         return None
 
     if upload_json.get("error"):
-        await ctx.send(f"dps.report returned an error: `{upload_json['error']}`")
+        await outbound.send(ctx, f"dps.report returned an error: `{upload_json['error']}`")
         return None
 
     report_id = upload_json.get("id")
@@ -231,115 +430,423 @@ async def fetch_log_ei(
     is_cm = encounter.get("isCm", False)
 
     if not json_available:
-        await ctx.send(
+        await outbound.send(
+            ctx,
             f"{boss_name} – Elite Insights JSON is not available for this log.\n"
             f"Report: {permalink or 'N/A'}"
         )
         return None
 
+    return report_id, boss_name, duration, success, is_cm, permalink
+
+
+def _json_hook(reservation: Optional[Reservation]):
+    return reservation.for_response if reservation is not None else None
+
+
+async def fetch_report_json(
+    ctx: commands.Context,
+    report: str,
+    reservation: Optional[Reservation] = None,
+    status: str = "Fetching existing report `{report_id}` from dps.report…",
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Resolve a dps.report link/ID and fetch its EI JSON (see fetch_ei_json
+    for the id=/permalink= handling). Every command that needs the raw
+    JSON goes through here.
+
+    Returns (report_id, ei_json), or None after explaining the error to ctx.
+    MemoryBudgetExceeded propagates to the caller.
+    """
+    report_id = parse_report_ref(report)
+    if await answer_if_unavailable(ctx, report_id):
+        return None
+    outbound.status(ctx, status.format(report_id=report_id))
     try:
-        ei_json = await fetch_ei_json(report_id)
+        ei_json = await fetch_ei_json(report_id, before_body=_json_hook(reservation))
+    except ClientResponseError as e:
+        await report_ei_error(ctx, report_id, e.status, e.message)
+        return None
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
-        await ctx.send(f"Failed to fetch EI JSON: `{e}`")
+        await report_ei_error(ctx, report_id, None, str(e))
         return None
+    return report_id, ei_json
 
-    return ei_json, boss_name, duration, success, is_cm, permalink
 
-
-def compute_encounter_metrics(
-    ei_json: dict,
-    boss_name: str,
-    phase_index: int,
+async def fetch_log_ei(
+    ctx: commands.Context,
+    report: str | None,
+    reservation: Optional[Reservation] = None,
+    uploaded: Optional[UploadInfo] = None,
 ):
     """
-    Compute all the stuff needed for log/mvp/fail/support:
+    Shared helper that:
+      - If `report` is provided: treats it as dps.report URL or ID.
+      - Else: expects an attached ArcDPS log file (or its `uploaded` result
+        from upload_attached_log).
 
-      - player_rows (DPS list)
-      - mechanic_summary
-      - fail_counts (unweighted count)
-      - mech_success_scores (weighted success)
-      - fail_score_map (weighted fails)
-      - support_metrics + support_scores
-      - damage_share (boss HP%)
-      - mvp_name + mvp_scores
-      - name_prof_map (player name -> profession/spec)
+    With a `reservation`, the upload and the EI JSON are admitted by the
+    memory governor; MemoryBudgetExceeded propagates to the caller.
+
+    Returns:
+      (ei_json, boss_name, duration_seconds, success, is_cm, permalink)
+    or None on error (after sending a message to ctx).
     """
-    player_rows = get_player_dps(ei_json, phase_index=phase_index)
+    # -----------------------------
+    # Mode 1: dps.report link or ID
+    # -----------------------------
+    if report is not None:
+        fetched = await fetch_report_json(ctx, report, reservation)
+        if fetched is None:
+            return None
+        report_id, ei_json = fetched
 
-    mechanic_summary = get_mechanic_summary(ei_json, boss_name=boss_name)
-    fail_counts = mechanic_fail_counts(mechanic_summary)
-    mech_success = mechanic_success_scores(mechanic_summary)
-    fail_score_map = mechanic_fail_scores(mechanic_summary)
+        header = encounter_header(ei_json)
+        boss_name = header["boss_name"]
+        duration = header["duration"]
+        success = header["success"]
+        is_cm = header["is_cm"]
 
-    support_metrics = compute_support_metrics(
-        ei_json, phase_index=phase_index, mechanic_summary=mechanic_summary
-    )
-    support_scores = compute_support_scores(support_metrics)
+        permalink = f"https://dps.report/{report_id}"
+        return ei_json, boss_name, duration, success, is_cm, permalink
 
-    # Boss damage -> % boss HP per player
-    # Boss damage -> share of total boss damage (matches log "Target All" style)
-    raw_boss_damage = compute_boss_damage(
-        ei_json, phase_index=phase_index, target_index=0
+    # ----------------------------------
+    # Mode 2: attached ArcDPS log upload
+    # ----------------------------------
+    if uploaded is None:
+        uploaded = await upload_attached_log(ctx, reservation)
+        if uploaded is None:
+            return None
+    report_id, boss_name, duration, success, is_cm, permalink = uploaded
+
+    fetched = await fetch_report_json(
+        ctx, report_id, reservation, status="Fetching Elite Insights JSON for `{report_id}`…"
     )
+    if fetched is None:
+        return None
+    ei_json = fetched[1]
 
-    total_damage = sum(max(float(v), 0.0) for v in raw_boss_damage.values()) or 1.0
-    damage_share: Dict[str, float] = {}
-    for name, dmg in raw_boss_damage.items():
-        damage_share[name] = max(float(dmg), 0.0) / total_damage
+    return ei_json, boss_name, duration, success, is_cm, permalink
 
-    mvp_name, mvp_scores = compute_mvp(
-        boss_damage=damage_share,
-        support_scores=support_scores,
-        mech_success_scores=mech_success,
-        mech_fail_scores=fail_score_map,
-    )
 
-    name_prof_map = build_name_prof_map(ei_json)
+async def load_encounter_from_workers(
+    ctx: commands.Context,
+    report: str | None,
+    uploaded: Optional[UploadInfo] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    load_encounter for the job queue deployment: the fetch and the JSON walk
+    run in worker.py processes; this process only uploads attachments (see
+    load_encounter, which passes the `uploaded` result) and decodes the
+    stored result.
+    """
+    permalink = None
+    if report is not None:
+        report_id = parse_report_ref(report)
+        if await answer_if_unavailable(ctx, report_id):
+            return None
+    else:
+        report_id, permalink = uploaded[0], uploaded[5]
+
+    outbound.status(ctx, f"Processing report `{report_id}`…")
+    try:
+        payload = await job_queue.run(
+            report_id,
+            timeout=Config.JOB_TIMEOUT,
+            poll_interval=Config.JOB_POLL_INTERVAL,
+        )
+    except JobFailed as e:
+        await report_ei_error(ctx, report_id, e.status, str(e))
+        return None
+    except JobTimeout:
+        await outbound.send(
+            ctx,
+            f"Report `{report_id}` is still queued – the workers are busy. Try again shortly."
+        )
+        return None
+
+    encounter = await asyncio.to_thread(decode_encounter, payload)
+    if permalink:
+        encounter["permalink"] = permalink
+    return encounter
+
+
+def cached_encounter(report_key: str) -> Optional[Dict[str, Any]]:
+    """
+    The encounter for a report id from the cache or the warm-start snapshot.
+    """
+    cached = encounter_cache.get(report_key)
+    if cached is None:
+        cached = warm_start.take(report_key)
+        if cached is not None:
+            encounter_cache.put(report_key, cached)
+    return cached
+
 
-    return {
-        "player_rows": player_rows,
-        "mechanic_summary": mechanic_summary,
-        "fail_counts": fail_counts,
-        "mech_success_scores": mech_success,
-        "fail_score_map": fail_score_map,
-        "support_metrics": support_metrics,
-        "support_scores": support_scores,
-        "damage_share": damage_share,
-        "mvp_name": mvp_name,
-        "mvp_scores": mvp_scores,
-        "name_prof_map": name_prof_map,
-    }
+async def load_encounter(
+    ctx: commands.Context,
+    report: str | None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Return the compact encounter (see encounter.build_encounter) for a
+    dps.report link/ID or an attached log, plus the header fields
+    boss_name / duration / success / is_cm / permalink.
+
+    Encounters are cached by report id, so follow-up commands on the same
+    report (other rankings, other phases) skip the fetch and the JSON walk.
+    With JOB_QUEUE_PATH set, building is left to the worker processes.
+    Uploads and EI JSON parsing go through the memory governor; the raw
+    JSON is dropped as soon as the compact encounter is built. A duplicate
+    attachment maps to its earlier report, so it is served from the cache too.
+    Returns None on error (after sending a message to ctx).
+    """
+    if report is not None:
+        cached = cached_encounter(parse_report_ref(report))
+        if cached is not None:
+            return cached
+
+    try:
+        async with memory_governor.reservation() as reservation:
+            uploaded = None
+            if report is None:
+                uploaded = await upload_attached_log(ctx, reservation)
+                if uploaded is None:
+                    return None
+                cached = cached_encounter(parse_report_ref(uploaded[5] or uploaded[0]))
+                if cached is not None:
+                    return cached
+
+            if job_queue is not None:
+                encounter = await load_encounter_from_workers(ctx, report, uploaded)
+                if encounter is None:
+                    return None
+            else:
+                result = await fetch_log_ei(ctx, report, reservation, uploaded)
+                if result is None:
+                    return None
+
+                ei_json, boss_name, duration, success, is_cm, permalink = result
+                # The full JSON walk runs in a thread, as for the HTTP API
+                encounter = await asyncio.to_thread(
+                    encounter_from_json,
+                    ei_json,
+                    permalink,
+                    header={
+                        "boss_name": boss_name,
+                        "duration": duration,
+                        "success": success,
+                        "is_cm": is_cm,
+                    },
+                )
+                del ei_json, result
+    except MemoryBudgetExceeded as e:
+        await outbound.send(ctx, str(e))
+        return None
+
+    permalink = encounter.get("permalink")
+    if permalink:
+        report_id = permalink.rstrip("/").split("/")[-1]
+        encounter_cache.put(report_id, encounter)
+        export_encounter(report_id, encounter)
+    return encounter
+
+
+# Report id -> encounter whose export rows are being built in a thread;
+# whatever is left at shutdown is exported by finish_export
+_export_pending: Dict[str, Dict[str, Any]] = {}
+# Running export tasks (asyncio keeps only weak references to tasks)
+_export_tasks: Set[asyncio.Task] = set()
+
+
+def export_encounter(report_id: str, encounter: Dict[str, Any]) -> None:
+    """
+    Queue a newly loaded encounter for the columnar export (EXPORT_DIR).
+    Its rows are built and full batches written in a thread, off the event
+    loop.
+    """
+    if encounter_exporter is None or report_id in _export_pending:
+        return
+    if encounter_exporter.exported(report_id):
+        return
+    _export_pending[report_id] = encounter
+    task = asyncio.get_running_loop().create_task(_export_in_thread(report_id, encounter))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+
+
+async def _export_in_thread(report_id: str, encounter: Dict[str, Any]) -> None:
+    # A private by_phase: the thread never touches the cached encounter's
+    # metrics, and commands still compute only the nodes they read
+    detached = dict(encounter, by_phase={})
+    try:
+        rows = await asyncio.to_thread(encounter_rows, report_id, detached)
+    except Exception as e:
+        _export_pending.pop(report_id, None)
+        print(f"[WARN] Could not export report {report_id}: {e!r}")
+        return
+    del _export_pending[report_id]
+    if encounter_exporter.add_rows(report_id, rows):
+        await asyncio.to_thread(encounter_exporter.write_batch, encounter_exporter.take())
+
+
+def finish_export() -> None:
+    """
+    Shutdown (after the loop has stopped): export encounters whose rows were
+    still being built, then write everything buffered. Batch writes already
+    running in threads are waited for by asyncio.run before this.
+    """
+    for report_id, encounter in list(_export_pending.items()):
+        try:
+            encounter_exporter.add_rows(report_id, encounter_rows(report_id, encounter))
+        except Exception as e:
+            print(f"[WARN] Could not export report {report_id}: {e!r}")
+    _export_pending.clear()
+    encounter_exporter.flush()
+
+
+async def flush_export_periodically(interval: float) -> None:
+    """
+    Write partial export batches every `interval` seconds, so quiet weeks
+    still reach disk.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        rows = encounter_exporter.take()
+        if rows:
+            await asyncio.to_thread(encounter_exporter.write_batch, rows)
+
+
+# HTTP status the API answers for each negative-cache reason
+_UNAVAILABLE_STATUS: Dict[str, int] = {"not_found": 404, "private": 403, "no_json": 404}
+
+
+async def load_encounter_by_id(report_id: str) -> Dict[str, Any]:
+    """
+    load_encounter for the HTTP API: no Discord context, so failures raise
+    api.ApiError instead of being answered in a channel.
+
+    Concurrent requests for one report share a single load, which carries
+    on if the client goes away. The JSON walk runs in a thread, and API
+    loads step aside (503) while Discord commands wait for memory.
+    """
+    cached = cached_encounter(report_id)
+    if cached is not None:
+        return cached
+    pending = _api_loads.get(report_id)
+    if pending is None:
+        pending = asyncio.ensure_future(_load_encounter_for_api(report_id))
+        _api_loads[report_id] = pending
+        pending.add_done_callback(lambda f: _finish_api_load(report_id, f))
+    return await asyncio.shield(pending)
+
+
+def _finish_api_load(report_id: str, future: asyncio.Future) -> None:
+    _api_loads.pop(report_id, None)
+    if not future.cancelled():
+        future.exception()  # retrieved, even if every requester left
+
+
+async def _load_encounter_for_api(report_id: str) -> Dict[str, Any]:
+    unavailable = unavailable_reports.get(report_id)
+    if unavailable is not None:
+        reason, text = unavailable
+        raise ApiError(_UNAVAILABLE_STATUS.get(reason, 404), text)
+    if not Config.API_FETCH:
+        raise ApiError(404, "Report not loaded yet; run a bot command on it first.")
+    if memory_governor.waiting:
+        raise ApiError(503, "The bot is busy processing logs. Try again shortly.", 10)
+
+    try:
+        if job_queue is not None:
+            payload = await job_queue.run(
+                report_id,
+                timeout=Config.JOB_TIMEOUT,
+                poll_interval=Config.JOB_POLL_INTERVAL,
+            )
+            encounter = await asyncio.to_thread(decode_encounter, payload)
+        else:
+            async with memory_governor.reservation() as reservation:
+                ei_json = await fetch_ei_json(report_id, before_body=_json_hook(reservation))
+                encounter = await asyncio.to_thread(
+                    encounter_from_json, ei_json, f"https://dps.report/{report_id}"
+                )
+                del ei_json
+    except (ClientResponseError, JobFailed) as e:
+        status = e.status if e.status in (403, 404) else 502
+        detail = f"HTTP {e.status}" if e.status else str(e)
+        raise ApiError(status, f"dps.report could not provide this report ({detail}).")
+    except JobTimeout:
+        raise ApiError(503, "The workers are busy. Try again shortly.", 10)
+    except MemoryBudgetExceeded as e:
+        raise ApiError(503, str(e), 30)
+
+    encounter_cache.put(report_id, encounter)
+    export_encounter(report_id, encounter)
+    return encounter
+
+
+async def phase_metrics_or_notice(
+    ctx: commands.Context,
+    encounter: Dict[str, Any],
+    phase_index: int,
+) -> Optional[Dict[str, Any]]:
+    """
+    compute_phase_metrics, or None after telling the user the phase is invalid.
+    """
+    phases = encounter["phase_table"]["phases"]
+    if not 0 <= phase_index < len(phases):
+        await outbound.send(
+            ctx,
+            f"This log has phases 0–{len(phases) - 1}. "
+            f"Use `{Config.COMMAND_PREFIX}phases` to list them."
+        )
+        return None
+    return compute_phase_metrics(encounter, phase_index)
+
+
+def phase_suffix(phase: Dict[str, Any]) -> str:
+    """
+    " – <phase name>" for titles, empty for the full fight.
+    """
+    if phase["index"] == 0:
+        return ""
+    return f" – {phase['name']}"
 
 
 async def render_encounter_summary(
     ctx: commands.Context,
-    ei_json: dict,
-    boss_name: str,
-    duration,
-    success: bool,
-    is_cm: bool,
-    permalink: str | None,
+    encounter: Dict[str, Any],
+    phase_index: int,
 ):
     """
     Used by !log – just DPS, success/fail, MVP (and a brief fail summary).
     """
-    status_text = "✅ Success" if success else "❌ Fail"
-    cm_text = " (CM)" if is_cm else ""
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
+        return
+
+    boss_name = encounter["boss_name"]
+    permalink = encounter["permalink"]
+    phase = metrics["phase"]
+
+    status_text = "✅ Success" if encounter["success"] else "❌ Fail"
+    cm_text = " (CM)" if encounter["is_cm"] else ""
+    duration = encounter["duration"] if phase_index == 0 else phase["duration"]
     if isinstance(duration, (int, float)):
         duration_text = f"{duration:.1f}s"
     else:
         duration_text = "Unknown"
 
-    phase_index = Config.PHASE_INDEX
-
-    metrics = compute_encounter_metrics(ei_json, boss_name, phase_index)
     player_rows = metrics["player_rows"]
     fail_counts = metrics["fail_counts"]
     mvp_name = metrics["mvp_name"]
     name_prof_map = metrics["name_prof_map"]
 
     if not player_rows:
-        await ctx.send(
+        await outbound.send(
+            ctx,
             f"{boss_name}{cm_text} – Could not find player DPS data in EI JSON."
         )
         return
@@ -362,7 +869,7 @@ async def render_encounter_summary(
         mech_fail_lines.append(f"{formatted_name}: {count}")
     mech_fail_text = ", ".join(mech_fail_lines) if mech_fail_lines else "None 🎉"
 
-    title = f"📜 {boss_name}{cm_text} – Encounter Summary"
+    title = f"📜 {boss_name}{cm_text}{phase_suffix(phase)} – Encounter Summary"
     embed = discord.Embed(
         title=title,
         description="\n".join(dps_lines),
@@ -383,49 +890,346 @@ async def render_encounter_summary(
             inline=False,
         )
 
-    await ctx.send(embed=embed)
+    await outbound.send(ctx, embed=embed)
+
+
+# ---------------------------------------------------------------------------
+# Raid sessions (!session)
+# ---------------------------------------------------------------------------
+
+# channel id -> pending debounced scoreboard refresh
+_scoreboard_tasks: Dict[int, asyncio.Task] = {}
+
+
+def session_embed(session: RaidSession, final: bool = False) -> discord.Embed:
+    """
+    The pinned scoreboard: per-player totals over every log of the session.
+    """
+    lines = []
+    rows = session.standings()
+    for rank, row in enumerate(rows[:20], start=1):
+        label = format_with_icon(row["name"], {row["name"]: row["profession"]})
+        lines.append(
+            f"**{rank}. {label}** – 🏆 {row['mvps']} · "
+            f"{row['avg_damage_share'] * 100:.1f}% dmg · "
+            f"{row['fails']} fails ({row['fail_score']:.1f}) · "
+            f"{row['downs']} downs · boons {row['avg_boon_score']:.1f}"
+        )
+    if len(rows) > 20:
+        lines.append(f"…and {len(rows) - 20} more")
+
+    title = "🏁 Raid session – final" if final else "📊 Raid session – live"
+    embed = discord.Embed(
+        title=title,
+        description="\n".join(lines) or "No logs yet. Post a log or use `!log`.",
+        colour=discord.Colour.dark_gold() if final else discord.Colour.orange(),
+    )
+    embed.add_field(
+        name="Logs",
+        value=f"{len(session.report_ids)} ({session.kills} ✅ / {session.wipes} ❌)",
+        inline=True,
+    )
+    embed.add_field(
+        name="Fight time",
+        value=format_fight_time(session.fight_seconds * 1000.0).split(".")[0],
+        inline=True,
+    )
+    if session.recent:
+        recent = ", ".join(
+            f"{'✅' if b['success'] else '❌'} {b['boss']}{' (CM)' if b['is_cm'] else ''}"
+            for b in session.recent
+        )
+        embed.add_field(name="Recent", value=recent[:1024], inline=False)
+    started = time.strftime("%H:%M", time.localtime(session.started_at))
+    embed.set_footer(
+        text=f"Started {started} by {session.started_by} · avg dmg share, fails, downs and boons per log"
+    )
+    return embed
+
+
+async def refresh_scoreboard(
+    ctx: commands.Context,
+    session: RaidSession,
+    final: bool = False,
+) -> None:
+    """
+    Edit the session's scoreboard message in place; post (and pin) a new one
+    if it is gone.
+    """
+    embed = session_embed(session, final)
+    if session.scoreboard_message_id is not None:
+        message = ctx.channel.get_partial_message(session.scoreboard_message_id)
+        try:
+            await outbound.edit(message, embed=embed)
+            metrics.SESSION_SCOREBOARD_UPDATES.labels("edited").inc()
+            return
+        except discord.NotFound:
+            pass
+
+    message = await outbound.send(ctx, embed=embed, followup=True)
+    metrics.SESSION_SCOREBOARD_UPDATES.labels("reposted").inc()
+    session.scoreboard_message_id = message.id
+    session_store.save()
+    if not final:
+        try:
+            await message.pin()
+        except discord.HTTPException as e:
+            print(f"[WARN] Could not pin scoreboard in channel {ctx.channel.id}: {e}")
+
+
+async def _refresh_scoreboard_later(ctx: commands.Context, channel_id: int) -> None:
+    await asyncio.sleep(Config.SESSION_EDIT_DEBOUNCE)
+    # Logs folded from here on schedule their own refresh
+    _scoreboard_tasks.pop(channel_id, None)
+    session = session_store.get(channel_id)
+    if session is None:
+        return
+    try:
+        await refresh_scoreboard(ctx, session)
+    except Exception as e:
+        print(f"[WARN] Scoreboard update failed in channel {channel_id}: {e!r}")
+
+
+def schedule_scoreboard_refresh(ctx: commands.Context, session: RaidSession) -> None:
+    """
+    Refresh the scoreboard SESSION_EDIT_DEBOUNCE seconds from now; logs that
+    arrive meanwhile are covered by the same edit.
+    """
+    task = _scoreboard_tasks.get(session.channel_id)
+    if task is not None and not task.done():
+        metrics.SESSION_SCOREBOARD_UPDATES.labels("debounced").inc()
+        return
+    _scoreboard_tasks[session.channel_id] = bot.loop.create_task(
+        _refresh_scoreboard_later(ctx, session.channel_id)
+    )
+
+
+def add_to_session(ctx: commands.Context, encounter: Dict[str, Any]) -> bool:
+    """
+    Fold a processed log into the channel's running session, if any.
+    Returns True when the log was new to the session.
+    """
+    session = session_store.get(ctx.channel.id)
+    if session is None or not encounter.get("permalink"):
+        return False
+    report_id = parse_report_ref(encounter["permalink"])
+    if session.has_report(report_id):
+        return False
+    try:
+        full_fight = compute_phase_metrics(encounter, 0)
+    except IndexError:
+        return False
+    session.add_log(report_id, encounter, full_fight)
+    session_store.save()
+    schedule_scoreboard_refresh(ctx, session)
+    return True
 
 
 # ---------------------------------------------------------------------------
 # Bot events
 # ---------------------------------------------------------------------------
 
+def install_sigterm_handler() -> None:
+    """
+    Close the bot cleanly on SIGTERM (docker stop, orchestrators) as on
+    Ctrl+C, so bot.run returns and the shutdown code in __main__ runs.
+    """
+    loop = asyncio.get_running_loop()
+    # Holds the close task, so it is not garbage-collected while running
+    closing = []
+    try:
+        loop.add_signal_handler(
+            signal.SIGTERM, lambda: closing.append(loop.create_task(bot.close()))
+        )
+    except (NotImplementedError, RuntimeError):
+        pass  # no signal handlers on Windows' event loops
+
+
+@bot.event
+async def setup_hook():
+    install_rate_limit_logging()
+    install_sigterm_handler()
+    with startup.timed("scoring_config"):
+        scoring_config.init_scoring_config(Config.SCORING_CONFIG_PATH)
+    if Config.SNAPSHOT_PATH:
+        with startup.timed("restore"):
+            restored = warm_start.load(Config.SNAPSHOT_PATH)
+        if restored:
+            print(f"Warm start: {restored} encounters available from {Config.SNAPSHOT_PATH}")
+    resumed = session_store.load()
+    if resumed:
+        print(f"Resumed {resumed} raid session(s) from {Config.SESSION_PATH}")
+    if Config.SCORING_CONFIG_PATH and Config.SCORING_WATCH_INTERVAL > 0:
+        bot.loop.create_task(
+            scoring_config.watch_scoring_config(
+                Config.SCORING_CONFIG_PATH, Config.SCORING_WATCH_INTERVAL
+            )
+        )
+    if encounter_exporter is not None and Config.EXPORT_FLUSH_INTERVAL > 0:
+        bot.loop.create_task(flush_export_periodically(Config.EXPORT_FLUSH_INTERVAL))
+    if Config.METRICS_PORT:
+        await metrics.start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT)
+        metrics.start_event_loop_monitor(Config.LOOP_LAG_INTERVAL)
+        print(f"Metrics endpoint on {Config.METRICS_HOST}:{Config.METRICS_PORT}/metrics")
+    if Config.API_PORT:
+        await start_api_server(
+            Config.API_HOST, Config.API_PORT, load_encounter_by_id, Config.API_CONCURRENCY
+        )
+        print(f"Encounter API on {Config.API_HOST}:{Config.API_PORT}/encounters/<report id>")
+    if Config.LOOP_SAMPLING:
+        import profiling
+
+        profiling.start_loop_sampler(Config.LOOP_SAMPLING_INTERVAL)
+        print(f"Event loop sampling every {Config.LOOP_SAMPLING_INTERVAL * 1000:.0f} ms")
+    if Config.STALL_THRESHOLD > 0:
+        start_stall_watchdog(
+            Config.STALL_THRESHOLD, Config.STALL_CHECK_INTERVAL, Config.STALL_LOG_PATH
+        )
+    startup.mark("setup_hook")
+
+
+_startup_reported = False
+
+
 @bot.event
 async def on_ready():
+    global _startup_reported
+    if not _startup_reported:
+        # on_ready fires again after reconnects; only the first is startup
+        startup.mark("gateway_ready")
+        print(startup.report())
+        _startup_reported = True
     print(f"Logged in as {bot.user} (id={bot.user.id})")
+    if Config.SHARDED:
+        print(f"Shards: {bot.shard_count}")
+    if job_queue is not None:
+        print(f"Reports are processed by workers via {Config.JOB_QUEUE_PATH}")
     print("------")
 
 
+@bot.listen("on_message")
+async def session_link_listener(message: discord.Message):
+    """
+    In a channel with a running session, dps.report links posted without a
+    command are added to the scoreboard too.
+    """
+    if message.author.bot or session_store.get(message.channel.id) is None:
+        return
+    if message.content.startswith(Config.COMMAND_PREFIX):
+        return  # !log and friends fold their own logs
+
+    links = list(dict.fromkeys(_REPORT_LINK_RE.findall(message.content)))
+    if not links:
+        return
+    label_current_task("session_link", " ".join(links))
+    ctx = await bot.get_context(message)
+    exempt = await bot.is_owner(message.author)
+    added = []
+    for link in links:
+        session = session_store.get(message.channel.id)
+        report_id = parse_report_ref(link)
+        if session is None or session.has_report(report_id):
+            continue
+        if not exempt:
+            # Same budgets as !log, so posting links is no way around them
+            kind = "cached" if report_id in encounter_cache else "report"
+            try:
+                await admission_controller.admit(ctx, "encounter", kind, command="session_link")
+            except AdmissionRejected:
+                break
+        started = time.perf_counter()
+        try:
+            encounter = await load_encounter(ctx, link)
+        finally:
+            admission_controller.settle(ctx, time.perf_counter() - started)
+        if encounter is not None and add_to_session(ctx, encounter):
+            added.append(f"{'✅' if encounter['success'] else '❌'} {encounter['boss_name']}")
+    if added:
+        await outbound.send(ctx, "Added to the session scoreboard: " + ", ".join(added))
+
+
+def admission_kind(ctx: commands.Context) -> Tuple[str, int]:
+    """
+    (report kind, attachment bytes) for admission control's cost estimate.
+    """
+    if ctx.message.attachments:
+        return "upload", ctx.message.attachments[0].size
+    report = ctx.kwargs.get("report")
+    if report and report.split():
+        if parse_report_ref(report.split()[0]) in encounter_cache:
+            return "cached", 0
+    return "report", 0
+
+
+@bot.before_invoke
+async def before_any_command(ctx: commands.Context):
+    if ctx.command is not None:
+        # A stall while this command runs is reported with its message
+        label_current_task(ctx.command.qualified_name, ctx.message.content[:100])
+    cost_class = ctx.command.extras.get("cost") if ctx.command else None
+    if cost_class is not None and not await bot.is_owner(ctx.author):
+        # May wait for budget, or raise AdmissionRejected
+        await admission_controller.admit(ctx, cost_class, *admission_kind(ctx))
+    ctx.started_at = time.perf_counter()
+
+
+@bot.after_invoke
+async def after_any_command(ctx: commands.Context):
+    """
+    Runs after every command (also when it raised), so it is the single
+    place where per-command metrics are recorded.
+    """
+    name = ctx.command.qualified_name if ctx.command else "unknown"
+    outcome = "error" if ctx.command_failed else "ok"
+    metrics.COMMANDS_TOTAL.labels(name, outcome).inc()
+    started = getattr(ctx, "started_at", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.COMMAND_DURATION.labels(name).observe(elapsed)
+        admission_controller.settle(ctx, elapsed)
+
+
+@bot.event
+async def on_command_error(ctx: commands.Context, error: commands.CommandError):
+    if isinstance(error, AdmissionRejected):
+        metrics.COMMANDS_TOTAL.labels(ctx.command.qualified_name, "rejected").inc()
+        return  # the user was already told when to retry
+    # Everything else keeps discord.py's default reporting
+    await type(bot).on_command_error(bot, ctx, error)
+
+
 # ---------------------------------------------------------------------------
 # Commands
 # ---------------------------------------------------------------------------
 
 
-@bot.command(name="jsondebug")
+@bot.command(name="jsondebug", extras={"cost": "raw_json"})
 async def jsondebug_command(ctx: commands.Context, *, report: str):
     """
     Fetch the full Elite Insights JSON for a dps.report link/ID
     and upload it as a compressed .json.gz file.
     """
-    ref = report.strip().strip("<>")
-    if "dps.report" in ref:
-        ref = ref.split("/")[-1]
-
-    report_id = ref
-    await ctx.send(f"Fetching full EI JSON for `{report_id}`…")
-
-    try:
-        ei_json = await fetch_ei_json(report_id)
-    except Exception as e:
-        await ctx.send(f"Failed to fetch EI JSON: `{e}`")
-        return
-
-    raw = json.dumps(ei_json, ensure_ascii=False).encode("utf-8")
-    compressed = gzip.compress(raw)
+    async with memory_governor.reservation() as reservation:
+        try:
+            fetched = await fetch_report_json(
+                ctx, report, reservation, status="Fetching full EI JSON for `{report_id}`…"
+            )
+        except MemoryBudgetExceeded as e:
+            await outbound.send(ctx, str(e))
+            return
+        if fetched is None:
+            return
+        report_id, ei_json = fetched
+
+        raw = json.dumps(ei_json, ensure_ascii=False).encode("utf-8")
+        del ei_json
+        compressed = gzip.compress(raw)
+        del raw
 
     size_kb = len(compressed) / 1024
     if size_kb > 8 * 1024:
-        await ctx.send(
+        await outbound.send(
+            ctx,
             f"Compressed JSON is still too large to upload (~{size_kb:.1f} KB). "
             f"Try using a smaller log or run the fetch script locally."
         )
@@ -434,13 +1238,14 @@ async def jsondebug_command(ctx: commands.Context, *, report: str):
     buf = io.BytesIO(compressed)
     buf.seek(0)
     filename = f"ei_{report_id}.json.gz"
-    await ctx.send(
+    await outbound.send(
+        ctx,
         "Here is the full Elite Insights JSON (gzipped):",
         file=discord.File(buf, filename=filename),
     )
 
 
-@bot.command(name="supportdebug")
+@bot.command(name="supportdebug", extras={"cost": "encounter"})
 async def supportdebug_command(ctx: commands.Context, *, report: str):
     """
     Debug command to inspect support metrics for a log.
@@ -449,94 +1254,88 @@ async def supportdebug_command(ctx: commands.Context, *, report: str):
       - per-boon group generation
       - healing, breakbar, mechSuccess
     """
-    ref = report.strip().strip("<>")
-    if "dps.report" in ref:
-        ref = ref.split("/")[-1]
-
-    report_id = ref
-    await ctx.send(f"Fetching support metrics for `{report_id}`…")
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
+        return
 
-    try:
-        ei_json = await fetch_ei_json(report_id)
-    except Exception as e:
-        await ctx.send(f"Failed to fetch EI JSON: `{e}`")
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
         return
 
-    mech_summary = get_mechanic_summary(ei_json)
-    support = compute_support_metrics(
-        ei_json,
-        phase_index=Config.PHASE_INDEX,
-        mechanic_summary=mech_summary,
-    )
+    support = metrics["support_metrics"]
+    name_prof_map = metrics["name_prof_map"]
+    boon_weights = scoring_config.current().boon_weights
 
-    # Build name->prof map for icons
-    name_prof_map = build_name_prof_map(ei_json)
+    if not support:
+        await outbound.send(ctx, "No support metrics found.")
+        return
 
-    lines: list[str] = []
-    for name, m in support.items():
+    def render_item(idx: int, item) -> str:
+        name, m = item
         boons_generated = m.get("boons_generated", {}) or {}
         if boons_generated:
             boon_parts = []
             for boon, amount in sorted(boons_generated.items()):
-                w = BOON_GENERATION_WEIGHTS.get(boon, 1.0)
+                w = boon_weights.get(boon, 1.0)
                 boon_parts.append(f"{boon}={amount:.1f}s (w={w})")
             boon_str = ", ".join(boon_parts)
         else:
             boon_str = "none"
+        squad_generated = m.get("squad_boons_generated", {}) or {}
+        squad_str = ", ".join(
+            f"{boon}={amount:.1f}s" for boon, amount in sorted(squad_generated.items())
+        ) or "none"
 
         label = format_with_icon(name, name_prof_map)
 
-        line = (
+        return (
             f"{label}: "
             f"supportScore={m['boon_score']:.1f} | "
             f"boons[{boon_str}] | "
+            f"squad[{squad_str}] | "
             f"heal={m['healing']:.0f} | "
             f"bb={m['breakbar']:.0f} | "
             f"mechSuccess={m['mech_success']:.1f}"
         )
-        lines.append(line)
 
-    if not lines:
-        await ctx.send("No support metrics found.")
-        return
+    def make_embed(desc: str) -> discord.Embed:
+        return discord.Embed(
+            title=f"🔧 {encounter['boss_name']}{phase_suffix(metrics['phase'])} – Support debug",
+            description="```text\n" + desc[:3980] + "\n```",
+            colour=discord.Colour.dark_grey(),
+        )
 
-    chunk: list[str] = []
-    for line in lines:
-        chunk.append(line)
-        if len("\n".join(chunk)) > 1800:
-            await ctx.send("```text\n" + "\n".join(chunk) + "\n```")
-            chunk = []
-    if chunk:
-        await ctx.send("```text\n" + "\n".join(chunk) + "\n```")
+    await send_paginated(ctx, list(support.items()), render_item, make_embed, page_size=8)
 
 
-@bot.command(name="mechdebug")
+@bot.command(name="mechdebug", extras={"cost": "raw_json"})
 async def mechdebug_command(ctx: commands.Context, *, report: str):
     """
     Debug command to inspect mechanics JSON from a dps.report link or ID.
     """
-    ref = report.strip().strip("<>")
-    if "dps.report" in ref:
-        ref = ref.split("/")[-1]
-
-    report_id = ref
-    await ctx.send(f"Fetching mechanics for `{report_id}`…")
-
-    try:
-        ei_json = await fetch_ei_json(report_id)
-    except Exception as e:
-        await ctx.send(f"Failed to fetch EI JSON: `{e}`")
-        return
+    async with memory_governor.reservation() as reservation:
+        try:
+            fetched = await fetch_report_json(
+                ctx, report, reservation, status="Fetching mechanics for `{report_id}`…"
+            )
+        except MemoryBudgetExceeded as e:
+            await outbound.send(ctx, str(e))
+            return
+        if fetched is None:
+            return
+        report_id, ei_json = fetched
 
-    boss_name = (
-        ei_json.get("fightName")
-        or ei_json.get("encounter", {}).get("boss")
-        or "Unknown Boss"
-    )
+        boss_name = (
+            ei_json.get("fightName")
+            or ei_json.get("encounter", {}).get("boss")
+            or "Unknown Boss"
+        )
+        mechanics = ei_json.get("mechanics") or ei_json.get("mechanicLogs") or []
+        del ei_json
 
-    mechanics = ei_json.get("mechanics") or ei_json.get("mechanicLogs") or []
     if not mechanics:
-        await ctx.send(f"No 'mechanics' section found in EI JSON for **{boss_name}**.")
+        await outbound.send(ctx, f"No 'mechanics' section found in EI JSON for **{boss_name}**.")
         return
 
     mech_names = sorted(
@@ -546,7 +1345,8 @@ async def mechdebug_command(ctx: commands.Context, *, report: str):
     if len(summary) > 1900:
         summary = summary[:1900] + "\n…(truncated)"
 
-    await ctx.send(
+    await outbound.send(
+        ctx,
         f"Mechanics for **{boss_name}**:\n"
         "```text\n" + summary + "\n```"
     )
@@ -558,13 +1358,14 @@ async def mechdebug_command(ctx: commands.Context, *, report: str):
 
     safe_boss = "".join(c for c in boss_name if c.isalnum() or c in ("_", "-")) or "boss"
 
-    await ctx.send(
+    await outbound.send(
+        ctx,
         f"Full mechanics JSON for **{boss_name}**:",
         file=discord.File(buf, filename=f"mechanics_{safe_boss}_{report_id}.json"),
     )
 
 
-@bot.command(name="log")
+@bot.command(name="log", extras={"cost": "encounter"})
 async def log_command(ctx: commands.Context, *, report: str | None = None):
     """
     Parse a log (upload or dps.report) and show:
@@ -572,36 +1373,33 @@ async def log_command(ctx: commands.Context, *, report: str | None = None):
       - success/fail
       - MVP
     """
-    result = await fetch_log_ei(ctx, report)
-    if result is None:
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    ei_json, boss_name, duration, success, is_cm, permalink = result
-
-    await render_encounter_summary(
-        ctx,
-        ei_json=ei_json,
-        boss_name=boss_name,
-        duration=duration,
-        success=success,
-        is_cm=is_cm,
-        permalink=permalink,
-    )
+    await render_encounter_summary(ctx, encounter, phase_index)
+    add_to_session(ctx, encounter)
 
 
-@bot.command(name="mvp")
+@bot.command(name="mvp", extras={"cost": "encounter"})
 async def mvp_command(ctx: commands.Context, *, report: str | None = None):
     """
     Rank players by MVP score (boss HP%, support, mechanics).
     """
-    result = await fetch_log_ei(ctx, report)
-    if result is None:
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    ei_json, boss_name, duration, success, is_cm, permalink = result
-    phase_index = Config.PHASE_INDEX
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
+        return
 
-    metrics = compute_encounter_metrics(ei_json, boss_name, phase_index)
+    boss_name = encounter["boss_name"]
+    is_cm = encounter["is_cm"]
+    permalink = encounter["permalink"]
+    phase = metrics["phase"]
     mvp_scores = metrics["mvp_scores"]
     damage_share = metrics["damage_share"]
     support_scores = metrics["support_scores"]
@@ -610,40 +1408,46 @@ async def mvp_command(ctx: commands.Context, *, report: str | None = None):
     name_prof_map = metrics["name_prof_map"]
 
     if not mvp_scores:
-        await ctx.send("Could not compute MVP scores for this encounter.")
+        await outbound.send(ctx, "Could not compute MVP scores for this encounter.")
         return
 
     cm_text = " (CM)" if is_cm else ""
-    title = f"🏆 {boss_name}{cm_text} – MVP Ranking"
+    title = f"🏆 {boss_name}{cm_text}{phase_suffix(phase)} – MVP Ranking"
 
     ranking = sorted(mvp_scores.items(), key=lambda kv: kv[1], reverse=True)
 
-    lines = []
-    for idx, (name, score) in enumerate(ranking, start=1):
+    def render_item(idx: int, item) -> str:
+        name, score = item
         dmg_pct = damage_share.get(name, 0.0) * 100.0
         sup = support_scores.get(name, 0.0)
         mech_s = mech_success_scores.get(name, 0.0)
         mech_f = fail_score_map.get(name, 0.0)
         label = format_with_icon(name, name_prof_map)
-        lines.append(
+        return (
             f"**{idx}. {label}** – Score= {score:.3f} | "
             f"DPS%= {dmg_pct:.1f}% | Support= {sup:.2f} | "
             f"mech= +{mech_s:.1f} | fail= -{mech_f:.1f}"
         )
 
-    desc = "\n".join(lines)
-    embed = discord.Embed(
-        title=title,
-        description=desc[:4000],
-        colour=discord.Colour.gold(),
-    )
-    if permalink:
-        embed.add_field(name="Report", value=permalink, inline=False)
+    def make_embed(desc: str) -> discord.Embed:
+        embed = discord.Embed(
+            title=title,
+            description=desc,
+            colour=discord.Colour.gold(),
+        )
+        boss_targets = encounter.get("boss_targets") or []
+        if len(boss_targets) > 1:
+            embed.set_footer(
+                text="DPS% over: " + ", ".join(t["name"] for t in boss_targets)
+            )
+        if permalink:
+            embed.add_field(name="Report", value=permalink, inline=False)
+        return embed
 
-    await ctx.send(embed=embed)
+    await send_paginated(ctx, ranking, render_item, make_embed)
 
 
-@bot.command(name="fail")
+@bot.command(name="fail", extras={"cost": "encounter"})
 async def fail_command(ctx: commands.Context, *, report: str | None = None):
     """
     Rank players by weighted mechanics fail score (desc), and also show:
@@ -652,36 +1456,46 @@ async def fail_command(ctx: commands.Context, *, report: str | None = None):
       - down count
       - death count
     """
-    result = await fetch_log_ei(ctx, report)
-    if result is None:
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    ei_json, boss_name, duration, success, is_cm, permalink = result
-    phase_index = Config.PHASE_INDEX
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
+        return
 
-    metrics = compute_encounter_metrics(ei_json, boss_name, phase_index)
+    boss_name = encounter["boss_name"]
+    is_cm = encounter["is_cm"]
+    permalink = encounter["permalink"]
+    phase = metrics["phase"]
     fail_score_map = metrics["fail_score_map"]
     mechanic_summary = metrics["mechanic_summary"]
     name_prof_map = metrics["name_prof_map"]
 
     if not fail_score_map:
-        await ctx.send("No mechanics fail data found.")
+        await outbound.send(ctx, "No mechanics fail data found.")
         return
 
     # Get per-mechanic fail weights for this boss
-    fail_rules = get_fail_rules_for_boss(boss_name)
+    fail_rules = scoring_config.current().fail_rules_for(boss_name)
     default_fail_weight = float(fail_rules.get("__fail_default__", 1.0))
 
     cm_text = " (CM)" if is_cm else ""
-    title = f"💀 {boss_name}{cm_text} – Mechanics Fail Ranking "
+    title = f"💀 {boss_name}{cm_text}{phase_suffix(phase)} – Mechanics Fail Ranking "
 
-    ranking = sorted(fail_score_map.items(), key=lambda kv: kv[1], reverse=True)
+    ranking = [
+        (name, score)
+        for name, score in sorted(fail_score_map.items(), key=lambda kv: kv[1], reverse=True)
+        if score > 0
+    ]
 
-    lines = []
-    for idx, (name, score) in enumerate(ranking, start=1):
-        if score <= 0:
-            continue
+    if not ranking:
+        await outbound.send(ctx, "No failed mechanics recorded. 🎉")
+        return
 
+    def render_item(idx: int, item) -> str:
+        name, score = item
         summary = mechanic_summary.get(name, {})
         fails: list[str] = summary.get("fails", []) or []
 
@@ -742,29 +1556,24 @@ async def fail_command(ctx: commands.Context, *, report: str | None = None):
 
         details = " | ".join(detail_parts)
 
-        lines.append(
-            f"**{idx}. {label_with_icon}** – {details}"
-        )
-
-    if not lines:
-        await ctx.send("No failed mechanics recorded. 🎉")
-        return
+        return f"**{idx}. {label_with_icon}** – {details}"
 
-    desc = "\n".join(lines)
-    embed = discord.Embed(
-        title=title,
-        description=desc[:4000],
-        colour=discord.Colour.red(),
-    )
-    if permalink:
-        embed.add_field(name="Report", value=permalink, inline=False)
+    def make_embed(desc: str) -> discord.Embed:
+        embed = discord.Embed(
+            title=title,
+            description=desc,
+            colour=discord.Colour.red(),
+        )
+        if permalink:
+            embed.add_field(name="Report", value=permalink, inline=False)
+        return embed
 
-    await ctx.send(embed=embed)
+    await send_paginated(ctx, ranking, render_item, make_embed)
 
 
 
 
-@bot.command(name="support")
+@bot.command(name="support", extras={"cost": "encounter"})
 async def support_command(ctx: commands.Context, *, report: str | None = None):
     """
     Rank players by support score, also showing:
@@ -772,51 +1581,44 @@ async def support_command(ctx: commands.Context, *, report: str | None = None):
       - highest boon generated for group (approx. % of fight duration)
       - res count (number of successful resurrect mechanics)
     """
-    result = await fetch_log_ei(ctx, report)
-    if result is None:
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    ei_json, boss_name, duration, success, is_cm, permalink = result
-    phase_index = Config.PHASE_INDEX
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
+        return
 
-    # Compute all encounter metrics
-    metrics = compute_encounter_metrics(ei_json, boss_name, phase_index)
+    boss_name = encounter["boss_name"]
+    is_cm = encounter["is_cm"]
+    permalink = encounter["permalink"]
+    phase = metrics["phase"]
     support_scores = metrics["support_scores"]
     support_metrics = metrics["support_metrics"]
-    mech_success_scores = metrics["mech_success_scores"]  # kept if you want later
     mechanic_summary = metrics["mechanic_summary"]
     name_prof_map = metrics["name_prof_map"]
 
     if not support_scores:
-        await ctx.send("No support metrics found.")
+        await outbound.send(ctx, "No support metrics found.")
         return
 
-    # Try to get fight duration in seconds (for converting boon seconds -> %)
+    # Phase duration in seconds (for converting boon seconds -> %)
     fight_seconds = None
-    duration_ms = (
-        ei_json.get("durationMS")
-        or ei_json.get("encounterDuration")
-    )
-    if duration_ms is None:
-        phases = ei_json.get("phases") or []
-        if phases:
-            duration_ms = (
-                phases[0].get("durationMS")
-                or phases[0].get("duration")
-            )
-    if isinstance(duration_ms, (int, float)):
-        fight_seconds = max(float(duration_ms) / 1000.0, 1.0)  # avoid divide-by-zero
+    duration = encounter["duration"]
+    if phase["duration"] > 0:
+        fight_seconds = max(phase["duration"], 1.0)  # avoid divide-by-zero
     elif isinstance(duration, (int, float)):
         fight_seconds = max(float(duration), 1.0)
 
     cm_text = " (CM)" if is_cm else ""
-    title = f"🛡️ {boss_name}{cm_text} – Support Ranking"
+    title = f"🛡️ {boss_name}{cm_text}{phase_suffix(phase)} – Support Ranking"
 
     # Sort by support score (desc)
     ranking = sorted(support_scores.items(), key=lambda kv: kv[1], reverse=True)
 
-    lines = []
-    for idx, (name, score) in enumerate(ranking, start=1):
+    def render_item(idx: int, item) -> str:
+        name, score = item
         label = format_with_icon(name, name_prof_map)
 
         m = support_metrics.get(name, {}) or {}
@@ -861,22 +1663,21 @@ async def support_command(ctx: commands.Context, *, report: str | None = None):
 
         detail_str = " | ".join(parts)
 
-        lines.append(
-            f"**{idx}. {label}** – {detail_str}"
-        )
+        return f"**{idx}. {label}** – {detail_str}"
 
-    desc = "\n".join(lines)
-    embed = discord.Embed(
-        title=title,
-        description=desc[:4000],
-        colour=discord.Colour.green(),
-    )
-    if permalink:
-        embed.add_field(name="Report", value=permalink, inline=False)
+    def make_embed(desc: str) -> discord.Embed:
+        embed = discord.Embed(
+            title=title,
+            description=desc,
+            colour=discord.Colour.green(),
+        )
+        if permalink:
+            embed.add_field(name="Report", value=permalink, inline=False)
+        return embed
 
-    await ctx.send(embed=embed)
+    await send_paginated(ctx, ranking, render_item, make_embed)
 
-@bot.command(name="mechs")
+@bot.command(name="mechs", extras={"cost": "encounter"})
 async def mechs_command(ctx: commands.Context, *, report: str | None = None):
     """
     Rank players by mechanic success (done) score, showing:
@@ -884,30 +1685,39 @@ async def mechs_command(ctx: commands.Context, *, report: str | None = None):
       - top 3 success mechanics (by count, excluding res)
       - res count (if any)
     """
-    result = await fetch_log_ei(ctx, report)
-    if result is None:
+    report, phase_index = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    ei_json, boss_name, duration, success, is_cm, permalink = result
-    phase_index = Config.PHASE_INDEX
+    metrics = await phase_metrics_or_notice(ctx, encounter, phase_index)
+    if metrics is None:
+        return
 
-    metrics = compute_encounter_metrics(ei_json, boss_name, phase_index)
+    boss_name = encounter["boss_name"]
+    is_cm = encounter["is_cm"]
+    permalink = encounter["permalink"]
+    phase = metrics["phase"]
     mech_success_scores = metrics["mech_success_scores"]
     mechanic_summary = metrics["mechanic_summary"]
     name_prof_map = metrics["name_prof_map"]
 
     if not mech_success_scores:
-        await ctx.send("No mechanic success data found.")
+        await outbound.send(ctx, "No mechanic success data found.")
         return
 
     cm_text = " (CM)" if is_cm else ""
-    title = f"🎯 {boss_name}{cm_text} – Mechanics"
+    title = f"🎯 {boss_name}{cm_text}{phase_suffix(phase)} – Mechanics"
 
     # Sort players by their weighted mechanic success score (desc)
     ranking = sorted(mech_success_scores.items(), key=lambda kv: kv[1], reverse=True)
 
-    lines = []
-    for idx, (name, score) in enumerate(ranking, start=1):
+    if not ranking:
+        await outbound.send(ctx, "No successful mechanics recorded.")
+        return
+
+    def render_item(idx: int, item) -> str:
+        name, score = item
         summary = mechanic_summary.get(name, {}) or {}
         success_mechs = summary.get("success", []) or []
 
@@ -940,22 +1750,409 @@ async def mechs_command(ctx: commands.Context, *, report: str | None = None):
         details = " | ".join(parts)
         label_with_icon = format_with_icon(name, name_prof_map)
 
-        lines.append(f"**{idx}. {label_with_icon}** – {details}")
+        return f"**{idx}. {label_with_icon}** – {details}"
+
+    def make_embed(desc: str) -> discord.Embed:
+        embed = discord.Embed(
+            title=title,
+            description=desc,
+            colour=discord.Colour.blue(),
+        )
+        if permalink:
+            embed.add_field(name="Report", value=permalink, inline=False)
+        return embed
 
-    if not lines:
-        await ctx.send("No successful mechanics recorded.")
+    await send_paginated(ctx, ranking, render_item, make_embed)
+
+
+@bot.command(name="phases", extras={"cost": "encounter"})
+async def phases_command(ctx: commands.Context, *, report: str | None = None):
+    """
+    Per-phase breakdown from the precomputed phase table:
+      - phase duration
+      - top 3 DPS
+      - top breakbar and top weighted boon generation
+    """
+    report, _ = split_phase_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
         return
 
-    desc = "\n".join(lines)
+    boss_name = encounter["boss_name"]
+    name_prof_map = encounter["name_prof_map"]
+    phases = encounter["phase_table"]["phases"]
+
+    cm_text = " (CM)" if encounter["is_cm"] else ""
     embed = discord.Embed(
-        title=title,
-        description=desc[:4000],
-        colour=discord.Colour.blue(),
+        title=f"⏱️ {boss_name}{cm_text} – Phases",
+        description=(
+            f"Use `{Config.COMMAND_PREFIX}log <report> p<N>` (or mvp/support/…) "
+            f"to rank a single phase."
+        ),
+        colour=discord.Colour.purple(),
+    )
+
+    # Discord allows at most 25 fields; the report link takes one.
+    for phase in phases[:24]:
+        metrics = compute_phase_metrics(encounter, phase["index"])
+        rows = metrics["player_rows"]
+        support_metrics = metrics["support_metrics"]
+
+        parts = [f"⏱ {phase['duration']:.1f}s"]
+        if rows:
+            top = ", ".join(
+                f"{format_with_icon(r['name'], name_prof_map)} {int(r['dps']):,}"
+                for r in rows[:3]
+            )
+            parts.append(f"DPS: {top}")
+
+            bb_row = max(rows, key=lambda r: r["breakbar"])
+            if bb_row["breakbar"] > 0:
+                parts.append(
+                    f"BB: {format_with_icon(bb_row['name'], name_prof_map)} "
+                    f"{bb_row['breakbar']:.0f}"
+                )
+
+        if support_metrics:
+            boon_name, boon_m = max(
+                support_metrics.items(), key=lambda kv: kv[1]["boon_score"]
+            )
+            if boon_m["boon_score"] > 0:
+                parts.append(
+                    f"Boons: {format_with_icon(boon_name, name_prof_map)}"
+                )
+
+        embed.add_field(
+            name=f"{phase['index']}. {phase['name']}",
+            value="\n".join(parts)[:1024],
+            inline=False,
+        )
+
+    if encounter["permalink"]:
+        embed.add_field(name="Report", value=encounter["permalink"], inline=False)
+
+    await outbound.send(ctx, embed=embed)
+
+
+@bot.command(name="timeline", extras={"cost": "encounter"})
+async def timeline_command(ctx: commands.Context, *, report: str | None = None):
+    """
+    Chronological mechanics within a window of the fight:
+      - `p<N>` for a phase, `120-180` for seconds 120..180,
+        `last10` for the final 10 seconds (e.g. before a wipe)
+      - per-player fail counts for that window
+    """
+    report, (kind, a, b) = split_window_arg(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
+        return
+
+    store = encounter["mechanic_events"]
+    phases = encounter["phase_table"]["phases"]
+    end_ms = phases[0]["end"] or store.end_time()
+
+    if kind == "phase":
+        phase_index = int(a)
+        if not 0 <= phase_index < len(phases):
+            await outbound.send(
+                ctx,
+                f"This log has phases 0–{len(phases) - 1}. "
+                f"Use `{Config.COMMAND_PREFIX}phases` to list them."
+            )
+            return
+        start, end = phase_window(encounter, phase_index)
+        window_text = phases[phase_index]["name"]
+    elif kind == "last":
+        start, end = max(end_ms - a * 1000.0, 0.0), None
+        window_text = f"last {a:g}s"
+    else:
+        start, end = a * 1000.0, b * 1000.0
+        window_text = f"{format_fight_time(start)}–{format_fight_time(end)}"
+
+    boss_name = encounter["boss_name"]
+    name_prof_map = encounter["name_prof_map"]
+    fail_w, success_w = store.label_weights(boss_name, scoring_config.current())
+    fail_labels = {store.labels[i] for i, w in enumerate(fail_w) if w is not None}
+    success_labels = {store.labels[i] for i, w in enumerate(success_w) if w is not None}
+
+    events = list(store.events(start, end))
+    fail_counts: Dict[str, int] = {}
+    for _, name, label in events:
+        if label in fail_labels:
+            fail_counts[name] = fail_counts.get(name, 0) + 1
+
+    cm_text = " (CM)" if encounter["is_cm"] else ""
+    if not events:
+        await outbound.send(ctx, f"No player mechanics recorded for {boss_name}{cm_text} ({window_text}).")
+        return
+
+    def render_item(idx: int, item) -> str:
+        t, name, label = item
+        if label in fail_labels:
+            marker = "❌"
+        elif label in success_labels:
+            marker = "✅"
+        else:
+            marker = "•"
+        return (
+            f"`{format_fight_time(t)}` {marker} "
+            f"{format_with_icon(name, name_prof_map)} – {label}"
+        )
+
+    def make_embed(desc: str) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"🕒 {boss_name}{cm_text} – Timeline ({window_text})",
+            description=desc,
+            colour=discord.Colour.dark_teal(),
+        )
+        if fail_counts:
+            ranking = sorted(fail_counts.items(), key=lambda kv: kv[1], reverse=True)
+            embed.add_field(
+                name="Fails in window",
+                value=", ".join(
+                    f"{format_with_icon(n, name_prof_map)} x{c}" for n, c in ranking
+                )[:1024],
+                inline=False,
+            )
+        if encounter["permalink"]:
+            embed.add_field(name="Report", value=encounter["permalink"], inline=False)
+        return embed
+
+    await send_paginated(ctx, events, render_item, make_embed, page_size=25)
+
+
+@bot.command(name="graph", extras={"cost": "chart"})
+async def graph_command(ctx: commands.Context, *, report: str | None = None):
+    """
+    PNG chart of per-player DPS over time above boss HP%.
+
+      !graph <report> [p<N>] [top<N>] [burst<S>]
+
+    The series are sliced from the cached encounter with numpy and drawn in
+    a separate process; PNGs are cached per (report, phase, options).
+    """
+    from charts import build_chart_spec, chart_cache, render_chart
+
+    report, phase_index, top_n, window = split_graph_args(report)
+    encounter = await load_encounter(ctx, report)
+    if encounter is None:
+        return
+
+    phases = encounter["phase_table"]["phases"]
+    if not 0 <= phase_index < len(phases):
+        await outbound.send(
+            ctx,
+            f"This log has phases 0–{len(phases) - 1}. "
+            f"Use `{Config.COMMAND_PREFIX}phases` to list them."
+        )
+        return
+
+    permalink = encounter.get("permalink") or ""
+    key = (permalink.rstrip("/").split("/")[-1], phase_index, top_n, window)
+    png = chart_cache.get(key)
+    if png is None:
+        spec = build_chart_spec(encounter, phase_index, top_n, window)
+        if spec is None:
+            await outbound.send(ctx, "This log has no per-second damage data to chart.")
+            return
+        outbound.status(ctx, "Rendering chart…")
+        try:
+            png = await render_chart(spec)
+        except Exception as e:
+            await outbound.send(ctx, f"Could not render the chart: `{e}`")
+            return
+        if key[0]:
+            chart_cache.put(key, png)
+
+    phase = phases[phase_index]
+    cm_text = " (CM)" if encounter["is_cm"] else ""
+    mode = f"{window}s burst DPS" if window else "cumulative DPS"
+    embed = discord.Embed(
+        title=f"📈 {encounter['boss_name']}{cm_text}{phase_suffix(phase)} – DPS & Boss HP",
+        description=f"Top {top_n} by damage, {mode}.",
+        colour=discord.Colour.teal(),
     )
     if permalink:
         embed.add_field(name="Report", value=permalink, inline=False)
+    embed.set_image(url="attachment://graph.png")
 
-    await ctx.send(embed=embed)
+    await outbound.send(
+        ctx,
+        embed=embed,
+        file=discord.File(io.BytesIO(png), filename="graph.png"),
+    )
+
+
+@bot.command(name="profile")
+@commands.is_owner()
+async def profile_command(
+    ctx: commands.Context,
+    command_name: str,
+    *,
+    report: str | None = None,
+):
+    """
+    Owner-only: run another command that takes a log under cProfile +
+    tracemalloc and upload the report as a text file, e.g.
+    `!profile fail <link|id>`.
+
+    `!profile samples` uploads the event-loop sampler report instead
+    (requires LOOP_SAMPLING=1), `!profile samples reset` clears it.
+    `!profile stalls` uploads the stall watchdog's most recent stalls.
+    """
+    import profiling
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+
+    if command_name == "samples":
+        sampler = profiling.get_loop_sampler()
+        if sampler is None:
+            await outbound.send(ctx, "Event loop sampling is off. Set `LOOP_SAMPLING=1` and restart.")
+            return
+        if report == "reset":
+            sampler.reset()
+            await outbound.send(ctx, "Event loop samples cleared.")
+            return
+        text = sampler.report()
+        await outbound.send(
+            ctx,
+            f"Event loop samples ({sampler.samples}):",
+            file=discord.File(
+                io.BytesIO(text.encode("utf-8")),
+                filename=f"loop_samples_{stamp}.txt",
+            ),
+        )
+        return
+
+    if command_name == "stalls":
+        watchdog = get_stall_watchdog()
+        if watchdog is None:
+            await outbound.send(ctx, "The stall watchdog is off. Set `STALL_THRESHOLD` and restart.")
+            return
+        # Copied first: the watchdog thread appends to it
+        recent = list(watchdog.recent)
+        if not recent:
+            await outbound.send(ctx, f"No event loop stalls over {watchdog.threshold:g}s so far.")
+            return
+        text = "\n\n".join(format_stall(entry) for entry in reversed(recent))
+        await outbound.send(
+            ctx,
+            f"Last {len(recent)} event loop stall(s), newest first:",
+            file=discord.File(
+                io.BytesIO(text.encode("utf-8")),
+                filename=f"loop_stalls_{stamp}.txt",
+            ),
+        )
+        return
+
+    command = bot.get_command(command_name)
+    # Only commands that take a log (`report`) can be run on one here
+    if (
+        command is None
+        or command.name == "profile"
+        or "report" not in command.clean_params
+    ):
+        await outbound.send(ctx, f"Unknown command to profile: `{command_name}`")
+        return
+
+    title = f"{command.name} {report or '(attachment)'}"
+    text = await profiling.profile_awaitable(
+        ctx.invoke(command, report=report),
+        title=title,
+    )
+
+    safe_ref = "".join(
+        c for c in (report or "attachment").split("/")[-1]
+        if c.isalnum() or c in ("_", "-")
+    )[:60] or "report"
+    await outbound.send(
+        ctx,
+        f"Profile for `{title}`:",
+        file=discord.File(
+            io.BytesIO(text.encode("utf-8")),
+            filename=f"profile_{command.name}_{safe_ref}_{stamp}.txt",
+        ),
+    )
+
+
+@bot.command(name="scoring")
+@commands.is_owner()
+async def scoring_command(ctx: commands.Context, action: str | None = None):
+    """
+    Owner-only: show the active scoring config, or `!scoring reload` it
+    from SCORING_CONFIG_PATH without restarting.
+    """
+    previous = scoring_config.current()
+    if action == "reload":
+        try:
+            snapshot = scoring_config.reload_scoring_config(Config.SCORING_CONFIG_PATH)
+        except scoring_config.ScoringConfigError as e:
+            await outbound.send(ctx, f"Scoring config not reloaded (still `{previous.version}`): `{e}`")
+            return
+        changed = list(snapshot.changed_bosses(previous))
+        if not changed:
+            changed_text = "nothing changed"
+        elif changed == ["*"]:
+            changed_text = "global weights changed, all results will be recomputed"
+        else:
+            changed_text = "recomputing: " + ", ".join(changed)
+        await outbound.send(
+            ctx,
+            f"Scoring config `{previous.version}` → `{snapshot.version}` ({changed_text})."
+        )
+        return
+
+    loaded = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(previous.loaded_at))
+    await outbound.send(
+        ctx,
+        f"Scoring config `{previous.version}` from `{previous.source}`, loaded {loaded}."
+    )
+
+
+@bot.command(name="session")
+async def session_command(ctx: commands.Context, action: str | None = None):
+    """
+    `!session start` / `!session stop` a running scoreboard for this channel;
+    `!session` alone re-posts the current standings.
+    """
+    session = session_store.get(ctx.channel.id)
+
+    if action == "start":
+        if session is not None:
+            await outbound.send(
+                ctx,
+                f"A session is already running here ({len(session.report_ids)} logs). "
+                f"Use `{Config.COMMAND_PREFIX}session stop` first."
+            )
+            return
+        session = session_store.start(ctx.channel.id, ctx.author.display_name)
+        await refresh_scoreboard(ctx, session)
+        return
+
+    if action == "stop":
+        if session is None:
+            await outbound.send(ctx, "No session is running in this channel.")
+            return
+        task = _scoreboard_tasks.pop(ctx.channel.id, None)
+        if task is not None:
+            task.cancel()
+        session_store.stop(ctx.channel.id)
+        await refresh_scoreboard(ctx, session, final=True)
+        await outbound.send(
+            ctx,
+            f"Session ended after {len(session.report_ids)} logs "
+            f"({session.kills} kills, {session.wipes} wipes).",
+            followup=True,
+        )
+        return
+
+    if session is None:
+        await outbound.send(
+            ctx,
+            f"No session is running. Start one with `{Config.COMMAND_PREFIX}session start`."
+        )
+        return
+    await outbound.send(ctx, embed=session_embed(session))
 
 
 # ---------------------------------------------------------------------------
@@ -969,4 +2166,25 @@ if __name__ == "__main__":
         raise SystemExit(
             "DISCORD_BOT_TOKEN is not set. Add it to your environment or .env file."
         )
-    bot.run(_C.DISCORD_BOT_TOKEN)
+    try:
+        bot.run(_C.DISCORD_BOT_TOKEN)
+    finally:
+        if encounter_exporter is not None:
+            try:
+                finish_export()
+            except Exception as e:
+                print(f"[WARN] Could not write the last export batch: {e!r}")
+        if _C.SNAPSHOT_PATH:
+            # bot.run has returned (Ctrl+C, SIGTERM via install_sigterm_handler,
+            # or close): the caches are still in memory, so save them for the
+            # next boot
+            try:
+                size = save_snapshot(
+                    _C.SNAPSHOT_PATH,
+                    encounter_cache.items(),
+                    extra_blobs=warm_start.remaining(),
+                    limit=_C.ENCOUNTER_CACHE_SIZE,
+                )
+                print(f"Saved warm-start snapshot ({size / 1024:.0f} KiB) to {_C.SNAPSHOT_PATH}")
+            except Exception as e:
+                print(f"[WARN] Could not save snapshot: {e!r}")
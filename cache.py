@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+import metrics
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache that reports hits/misses to `metrics`.
+    """
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name = name
+        self.maxsize = max(int(maxsize), 1)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._hits, self._misses = metrics.cache_counters(name)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self._misses.inc()
+            return default
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """
+        Entries from least to most recently used (does not touch recency).
+        """
+        return iter(list(self._data.items()))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TTLCache:
+    """
+    Like LRUCache, but every entry has its own time to live; expired
+    entries count as misses and are dropped when looked up.
+    """
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name = name
+        self.maxsize = max(int(maxsize), 1)
+        # key -> (expires_at, value), least recently used first
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._hits, self._misses = metrics.cache_counters(name)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self._misses.inc()
+            return default
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,205 @@
+import asyncio
+import io
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from cache import LRUCache
+from config import Config
+
+
+# (report id, phase, top_n, window) -> PNG bytes
+chart_cache = LRUCache("charts", Config.CHART_CACHE_SIZE)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+# ---------------------------------------------------------------------------
+# Series math (vectorized, runs on the event loop: microseconds per chart)
+# ---------------------------------------------------------------------------
+
+def _damage_matrix(damage: Dict[str, Any]) -> Tuple[List[str], np.ndarray]:
+    """
+    Stack per-player cumulative damage into a (players x seconds) matrix,
+    padding shorter series with their last value.
+    """
+    names = [name for name, series in damage.items() if len(series)]
+    if not names:
+        return [], np.zeros((0, 0))
+    length = max(len(damage[name]) for name in names)
+    cum = np.empty((len(names), length))
+    for row, name in enumerate(names):
+        series = np.frombuffer(damage[name], dtype=np.float64)
+        cum[row, : len(series)] = series
+        cum[row, len(series):] = series[-1]
+    return names, cum
+
+
+def build_chart_spec(
+    encounter: Dict[str, Any],
+    phase_index: int,
+    top_n: int,
+    window: int = 0,
+) -> Optional[Dict[str, Any]]:
+    """
+    Everything render_chart_png needs, as plain arrays:
+
+      - DPS per player over the phase: cumulative (damage so far / time) or,
+        with `window` > 0, a rolling `window`-second DPS that shows bursts
+      - boss HP% per boss target over the same window
+
+    Returns None when the log has no per-second damage data.
+    """
+    series = encounter.get("time_series") or {}
+    names, cum = _damage_matrix(series.get("damage") or {})
+    if not names or cum.shape[1] < 2:
+        return None
+
+    phase = encounter["phase_table"]["phases"][phase_index]
+    last = cum.shape[1] - 1
+    s0 = min(int(phase["start"] // 1000), last - 1)
+    s1 = min(max(int(math.ceil(phase["end"] / 1000.0)), s0 + 1), last)
+
+    seg = cum[:, s0 : s1 + 1] - cum[:, s0 : s0 + 1]
+    seconds = np.arange(seg.shape[1], dtype=np.float64)
+
+    if window > 0:
+        w = min(window, seg.shape[1] - 1)
+        dps = np.full_like(seg, np.nan)
+        dps[:, w:] = (seg[:, w:] - seg[:, :-w]) / w
+        ylabel = f"DPS ({w}s rolling)"
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dps = seg / seconds
+        dps[:, 0] = np.nan
+        ylabel = "DPS (cumulative)"
+
+    order = np.argsort(seg[:, -1])[::-1][:top_n]
+    players = [(names[i], dps[i]) for i in order]
+
+    span = float(seconds[-1])
+    start_ms = s0 * 1000.0
+    health = []
+    for target in series.get("health") or []:
+        times = np.frombuffer(target["times"], dtype=np.float64)
+        percents = np.frombuffer(target["percents"], dtype=np.float64)
+        if not len(times):
+            continue
+        rel = (times - start_ms) / 1000.0
+        # Last known value at the window start, then everything inside it
+        lo = max(int(np.searchsorted(rel, 0.0, side="right")) - 1, 0)
+        hi = int(np.searchsorted(rel, span, side="right"))
+        x = np.clip(rel[lo:hi], 0.0, span)
+        y = percents[lo:hi]
+        if not len(x):
+            continue
+        health.append((target["name"], np.append(x, span), np.append(y, y[-1])))
+
+    wipe_at = None
+    if not encounter.get("success") and phase_index == 0 and health:
+        wipe_at = (span, min(float(h[2][-1]) for h in health))
+
+    return {
+        "title": f"{encounter['boss_name']} – {phase['name']}",
+        "seconds": seconds,
+        "players": players,
+        "ylabel": ylabel,
+        "health": health,
+        "wipe_at": wipe_at,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Rendering (runs in a separate process)
+# ---------------------------------------------------------------------------
+
+def render_chart_png(spec: Dict[str, Any]) -> bytes:
+    """
+    Draw DPS curves over boss HP and return the PNG bytes.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6.5), dpi=100)
+    ax_dps, ax_hp = fig.subplots(
+        2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]}
+    )
+
+    seconds = spec["seconds"]
+    for name, values in spec["players"]:
+        ax_dps.plot(seconds, values, linewidth=1.4, label=name)
+    ax_dps.set_ylabel(spec["ylabel"])
+    ax_dps.set_title(spec["title"])
+    ax_dps.grid(alpha=0.3)
+    if spec["players"]:
+        ax_dps.legend(fontsize=8, ncol=2, loc="upper right")
+
+    for name, x, y in spec["health"]:
+        ax_hp.step(x, y, where="post", linewidth=1.4, label=name)
+    ax_hp.set_ylim(0, 100)
+    ax_hp.set_ylabel("Boss HP %")
+    ax_hp.set_xlabel("Seconds")
+    ax_hp.grid(alpha=0.3)
+    if len(spec["health"]) > 1:
+        ax_hp.legend(fontsize=8, loc="upper right")
+
+    if spec["wipe_at"] is not None:
+        at, hp = spec["wipe_at"]
+        for ax in (ax_dps, ax_hp):
+            ax.axvline(at, color="red", linestyle="--", linewidth=1)
+        ax_hp.annotate(
+            f"wipe at {hp:.1f}%",
+            xy=(at, hp),
+            xytext=(-70, 10),
+            textcoords="offset points",
+            color="red",
+            fontsize=8,
+        )
+
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def _warm_up() -> None:
+    # Pay the matplotlib import in the worker, not on the first request
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.figure  # noqa: F401
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the bot process has threads (sampler, to_thread), fork is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=Config.CHART_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+        )
+    return _executor
+
+
+async def render_chart(spec: Dict[str, Any]) -> bytes:
+    """
+    render_chart_png in the chart process pool, off the event loop.
+    """
+    global _executor
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), render_chart_png, spec)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); start a fresh pool next time
+        _executor = None
+        raise
+    finally:
+        metrics.CHART_RENDER_DURATION.observe(time.perf_counter() - started)
+
@@ -9,6 +9,108 @@ class Config:
     COMMAND_PREFIX: str = os.getenv("COMMAND_PREFIX", "!")
     TOP_N_DPS: int = 10
     PHASE_INDEX: int = 0
+    ENCOUNTER_CACHE_SIZE: int = int(os.getenv("ENCOUNTER_CACHE_SIZE", "32"))
+
+    # Memory governor: budget for uploads + EI JSON parsing (the fly VM has 1 GB)
+    MEMORY_BUDGET_MB: float = float(os.getenv("MEMORY_BUDGET_MB", "600"))
+    MEMORY_QUEUE_TIMEOUT: float = float(os.getenv("MEMORY_QUEUE_TIMEOUT", "60"))
+    MEMORY_UNKNOWN_JSON_MB: float = float(os.getenv("MEMORY_UNKNOWN_JSON_MB", "150"))
+    # Memory reserved per byte of decoded EI JSON (the parsed objects plus the
+    # body); together with the budget it caps the largest log the bot accepts
+    MEMORY_JSON_FACTOR: float = float(os.getenv("MEMORY_JSON_FACTOR", "7"))
+    # discord.py message cache (0 = off; the bot never reads cached messages)
+    MESSAGE_CACHE_SIZE: int = int(os.getenv("MESSAGE_CACHE_SIZE", "0"))
+
+    # Warm-start snapshot of the encounter cache, written on shutdown and
+    # restored at boot (put it on a persistent volume); empty disables it
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", "")
+
+    # !session: running scoreboards, saved here so a restart keeps them
+    # (put it on a persistent volume; empty = memory only); scoreboard edits
+    # are batched over the debounce
+    SESSION_PATH: str = os.getenv("SESSION_PATH", "")
+    SESSION_EDIT_DEBOUNCE: float = float(os.getenv("SESSION_EDIT_DEBOUNCE", "10"))
+
+    # Content hash -> dps.report upload, so identical attachments are
+    # uploaded once (SQLite file, e.g. data/uploads.sqlite3; empty disables
+    # deduplication)
+    UPLOAD_INDEX_PATH: str = os.getenv("UPLOAD_INDEX_PATH", "")
+
+    # Seconds before racing getJson?permalink= against id= (or vice versa);
+    # negative = only retry the other variant after a 403
+    EI_HEDGE_DELAY: float = float(os.getenv("EI_HEDGE_DELAY", "1.0"))
+
+    # How long a report whose EI JSON dps.report refused is answered locally
+    UNAVAILABLE_TTL_NOT_FOUND: float = float(os.getenv("UNAVAILABLE_TTL_NOT_FOUND", "120"))
+    UNAVAILABLE_TTL_PRIVATE: float = float(os.getenv("UNAVAILABLE_TTL_PRIVATE", "900"))
+    UNAVAILABLE_TTL_NO_JSON: float = float(os.getenv("UNAVAILABLE_TTL_NO_JSON", "86400"))
+
+    # Paginated rankings: entries per page, seconds until buttons expire
+    PAGE_SIZE: int = int(os.getenv("PAGE_SIZE", "10"))
+    VIEW_TIMEOUT: float = float(os.getenv("VIEW_TIMEOUT", "180"))
+
+    # !graph: cached PNGs and chart rendering processes
+    CHART_CACHE_SIZE: int = int(os.getenv("CHART_CACHE_SIZE", "32"))
+    CHART_PROCESSES: int = int(os.getenv("CHART_PROCESSES", "1"))
+
+    # Outbound message budgets (Discord allows ~5 messages / 5s per channel)
+    OUTBOUND_CHANNEL_RATE: float = float(os.getenv("OUTBOUND_CHANNEL_RATE", "5"))
+    OUTBOUND_CHANNEL_PERIOD: float = float(os.getenv("OUTBOUND_CHANNEL_PERIOD", "5"))
+    OUTBOUND_GLOBAL_RATE: float = float(os.getenv("OUTBOUND_GLOBAL_RATE", "40"))
+
+    # Scoring weights file (JSON, see README); reloaded when it changes
+    SCORING_CONFIG_PATH: str = os.getenv("SCORING_CONFIG_PATH", "")
+    SCORING_WATCH_INTERVAL: float = float(os.getenv("SCORING_WATCH_INTERVAL", "5"))
+
+    # Gateway sharding (AutoShardedBot); SHARD_COUNT=0 lets Discord decide
+    SHARDED: bool = os.getenv("SHARDED", "0") == "1"
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", "0"))
+
+    # Worker job queue (SQLite file shared with worker.py); empty = compute in-process
+    JOB_QUEUE_PATH: str = os.getenv("JOB_QUEUE_PATH", "")
+    JOB_TIMEOUT: float = float(os.getenv("JOB_TIMEOUT", "120"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "0.25"))
+    JOB_STALE_AFTER: float = float(os.getenv("JOB_STALE_AFTER", "300"))
+    JOB_RESULT_TTL: float = float(os.getenv("JOB_RESULT_TTL", "86400"))
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "1"))
+
+    # Prometheus-style /metrics endpoint (0 disables it)
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "1.0"))
+
+    # Admission control for expensive commands: seconds of work allowed per
+    # ADMISSION_PERIOD for each user / guild / the whole bot (0 = no limit)
+    ADMISSION_PERIOD: float = float(os.getenv("ADMISSION_PERIOD", "60"))
+    ADMISSION_USER_BUDGET: float = float(os.getenv("ADMISSION_USER_BUDGET", "20"))
+    ADMISSION_GUILD_BUDGET: float = float(os.getenv("ADMISSION_GUILD_BUDGET", "45"))
+    ADMISSION_GLOBAL_BUDGET: float = float(os.getenv("ADMISSION_GLOBAL_BUDGET", "90"))
+    # Longest a command may wait for budget before it is rejected instead
+    ADMISSION_MAX_QUEUE: float = float(os.getenv("ADMISSION_MAX_QUEUE", "15"))
+
+    # Columnar export of per-player rows, partitioned by week (empty = off)
+    EXPORT_DIR: str = os.getenv("EXPORT_DIR", "")
+    EXPORT_FORMAT: str = os.getenv("EXPORT_FORMAT", "parquet")  # parquet / arrow / csv
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", "500"))
+    EXPORT_FLUSH_INTERVAL: float = float(os.getenv("EXPORT_FLUSH_INTERVAL", "300"))
+
+    # Read-only HTTP API over encounter results (0 disables it)
+    API_HOST: str = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT: int = int(os.getenv("API_PORT", "0"))
+    API_CONCURRENCY: int = int(os.getenv("API_CONCURRENCY", "2"))
+    # 0 = only serve reports the bot already has; never fetch for the API
+    API_FETCH: bool = os.getenv("API_FETCH", "1") == "1"
+
+    # Periodic stack sampling of the event loop (for !profile samples)
+    LOOP_SAMPLING: bool = os.getenv("LOOP_SAMPLING", "0") == "1"
+    LOOP_SAMPLING_INTERVAL: float = float(os.getenv("LOOP_SAMPLING_INTERVAL", "0.05"))
+
+    # Stall watchdog: log the loop's stack and the running command whenever
+    # the event loop is blocked for STALL_THRESHOLD seconds (0 = off), also
+    # to STALL_LOG_PATH if set
+    STALL_THRESHOLD: float = float(os.getenv("STALL_THRESHOLD", "0"))
+    STALL_CHECK_INTERVAL: float = float(os.getenv("STALL_CHECK_INTERVAL", "0.1"))
+    STALL_LOG_PATH: str = os.getenv("STALL_LOG_PATH", "")
 
 
 if not Config.DISCORD_BOT_TOKEN:
@@ -1,14 +1,61 @@
+import asyncio
+import json
+import re
+import time
+
 import aiohttp
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+from cache import LRUCache
+from config import Config
 
 DPS_REPORT_BASE = "https://dps.report"
 
+BeforeBody = Callable[[aiohttp.ClientResponse], Awaitable[None]]
+
+
+async def _request_json(
+    session: aiohttp.ClientSession,
+    method: str,
+    endpoint: str,
+    before_body: Optional[BeforeBody] = None,
+    **kwargs: Any,
+) -> Tuple[Any, int]:
+    """
+    Perform one dps.report request, recording status, duration and body size.
+
+    `before_body(resp)` is awaited once the headers are in and before the
+    body is read (e.g. to reserve memory from Content-Length).
+
+    Returns (decoded_json, body_size_in_bytes). HTTP errors are raised as
+    aiohttp.ClientResponseError, exactly like `raise_for_status()`.
+    """
+    started = time.perf_counter()
+    status = "error"
+    try:
+        async with session.request(
+            method, f"{DPS_REPORT_BASE}/{endpoint}", **kwargs
+        ) as resp:
+            status = str(resp.status)
+            resp.raise_for_status()
+            if before_body is not None:
+                await before_body(resp)
+            body = await resp.read()
+    finally:
+        metrics.DPS_REPORT_REQUESTS.labels(endpoint, status).inc()
+        metrics.DPS_REPORT_DURATION.labels(endpoint).observe(
+            time.perf_counter() - started
+        )
+
+    metrics.DPS_REPORT_RESPONSE_BYTES.labels(endpoint).observe(len(body))
+    return json.loads(body), len(body)
+
 
 async def upload_to_dps_report(file_bytes: bytes, filename: str) -> Dict[str, Any]:
     """
     Upload an ArcDPS log to dps.report and return the JSON response.
     """
-    url = f"{DPS_REPORT_BASE}/uploadContent?json=1"
     data = aiohttp.FormData()
     data.add_field(
         "file",
@@ -16,40 +63,151 @@ async def upload_to_dps_report(file_bytes: bytes, filename: str) -> Dict[str, An
         filename=filename,
         content_type="application/octet-stream",
     )
+    metrics.DPS_REPORT_UPLOAD_BYTES.observe(len(file_bytes))
 
     async with aiohttp.ClientSession() as session:
-        async with session.post(url, data=data) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+        upload_json, _ = await _request_json(
+            session, "POST", "uploadContent", params={"json": 1}, data=data
+        )
+        return upload_json
+
+
+# ---------------------------------------------------------------------------
+# EI JSON: id= vs permalink=
+# ---------------------------------------------------------------------------
 
+VARIANTS = ("id", "permalink")
 
-async def fetch_ei_json(report_id_or_permalink: str) -> Dict[str, Any]:
+# "abcd-20240101-123456_vg": the slug of a dps.report link
+_PERMALINK_SLUG_RE = re.compile(r"^\w{4}-\d{8}-\d{6}_\w+$")
+
+# reference -> variant that returned its JSON last time
+_variant_cache = LRUCache("ei_variant", 2048)
+
+
+def classify_reference(ref: str) -> str:
+    """
+    Guess which getJson parameter will work for a reference: link slugs
+    usually need permalink=, anything else is tried as id= first.
+    """
+    return "permalink" if _PERMALINK_SLUG_RE.match(ref) else "id"
+
+
+def variant_order(ref: str) -> Tuple[str, str]:
+    first = _variant_cache.get(ref) or classify_reference(ref)
+    return (first, "permalink" if first == "id" else "id")
+
+
+async def _fetch_hedged(
+    session: aiohttp.ClientSession,
+    ref: str,
+    order: Tuple[str, str],
+    before_body: Optional[BeforeBody],
+    hedge_delay: float,
+) -> Tuple[Any, int, str]:
+    """
+    Request getJson with the first variant; start the second when the first
+    answers 403 or, with hedge_delay >= 0, has not answered within
+    hedge_delay seconds. The first 2xx response wins and the other request
+    is cancelled before its body is read, so only one body is downloaded
+    (and only one before_body call is made).
+
+    Returns (ei_json, size, variant).
+    """
+    tasks: Dict[str, "asyncio.Task[Tuple[Any, int]]"] = {}
+    winner: Optional[str] = None
+
+    def gate(variant: str) -> BeforeBody:
+        async def hook(resp: aiohttp.ClientResponse) -> None:
+            nonlocal winner
+            if winner is None:
+                winner = variant
+                for other, task in tasks.items():
+                    if other != variant:
+                        task.cancel()
+            if before_body is not None:
+                await before_body(resp)
+
+        return hook
+
+    def start(variant: str) -> None:
+        tasks[variant] = asyncio.ensure_future(
+            _request_json(
+                session,
+                "GET",
+                "getJson",
+                before_body=gate(variant),
+                params={variant: ref},
+            )
+        )
+
+    first, second = order
+    start(first)
+    try:
+        if hedge_delay >= 0:
+            await asyncio.wait([tasks[first]], timeout=hedge_delay)
+            # Only hedge a request that has no response yet, not a slow body
+            if winner is None and not tasks[first].done():
+                metrics.EI_JSON_HEDGES.labels("launched").inc()
+                start(second)
+
+        forbidden: Optional[aiohttp.ClientResponseError] = None
+        while True:
+            pending = [t for t in tasks.values() if not t.done()]
+            if pending:
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for variant, task in tasks.items():
+                if not task.done() or task.cancelled():
+                    continue
+                error = task.exception()
+                if error is None:
+                    ei_json, size = task.result()
+                    if len(tasks) > 1:
+                        metrics.EI_JSON_HEDGES.labels(
+                            "won_first" if variant == first else "won_second"
+                        ).inc()
+                    return ei_json, size, variant
+                if isinstance(error, aiohttp.ClientResponseError) and error.status == 403:
+                    forbidden = error
+                    continue
+                # Anything but 403 is the answer (404, 5xx, network)
+                raise error
+            if second not in tasks:
+                start(second)
+            elif all(t.done() for t in tasks.values()):
+                raise forbidden
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+async def fetch_ei_json(
+    report_id_or_permalink: str,
+    before_body: Optional[BeforeBody] = None,
+    hedge_delay: Optional[float] = None,
+) -> Dict[str, Any]:
     """
     Fetch Elite Insights JSON from dps.report for a given report id or permalink.
 
-    We first try using `id=`, and if that returns HTTP 403,
-    we retry using `permalink=`.
+    dps.report answers some references only via `id=` and others only via
+    `permalink=` (HTTP 403 otherwise). We try the variant that worked for
+    this reference before, else the one its shape suggests, and hedge with
+    the other one after `hedge_delay` seconds (EI_HEDGE_DELAY; negative:
+    only after a 403). `before_body` is passed to _request_json.
     """
+    if hedge_delay is None:
+        hedge_delay = Config.EI_HEDGE_DELAY
+    ref = report_id_or_permalink
     async with aiohttp.ClientSession() as session:
-        # 1) Try id=
-        try:
-            async with session.get(
-                f"{DPS_REPORT_BASE}/getJson",
-                params={"id": report_id_or_permalink},
-            ) as resp:
-                resp.raise_for_status()
-                return await resp.json()
-        except aiohttp.ClientResponseError as e:
-            if e.status == 403:
-                # 2) Try permalink=
-                async with session.get(
-                    f"{DPS_REPORT_BASE}/getJson",
-                    params={"permalink": report_id_or_permalink},
-                ) as resp2:
-                    resp2.raise_for_status()
-                    return await resp2.json()
-            # Re-raise so caller can handle status codes
-            raise
+        ei_json, size, variant = await _fetch_hedged(
+            session, ref, variant_order(ref), before_body, hedge_delay
+        )
+
+    _variant_cache.put(ref, variant)
+    metrics.EI_JSON_VARIANT.labels(variant).inc()
+    metrics.EI_JSON_BYTES.observe(size)
+    return ei_json
 
 
 async def fetch_upload_metadata(report_id: str) -> Dict[str, Any]:
@@ -58,9 +216,10 @@ async def fetch_upload_metadata(report_id: str) -> Dict[str, Any]:
     for an existing dps.report id.
     """
     async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"{DPS_REPORT_BASE}/getUploadMetadata",
+        meta, _ = await _request_json(
+            session,
+            "GET",
+            "getUploadMetadata",
             params={"json": 1, "id": report_id},
-        ) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+        )
+        return meta
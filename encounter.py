@@ -0,0 +1,335 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from cache import LRUCache
+from config import Config
+from metric_graph import LazyMetrics, MetricGraph
+from gw2_stats import (
+    build_boss_target_index,
+    compute_phase_table,
+    compute_time_series,
+    dps_rows_from_table,
+    boss_damage_from_table,
+    support_metrics_from_table,
+    build_mechanic_event_store,
+    mechanic_fail_counts,
+    mechanic_success_scores,
+    mechanic_fail_scores,
+)
+from scoring import compute_support_scores, compute_mvp
+from scoring_config import ScoringConfig, current as current_scoring_config
+
+
+# report id / permalink slug -> compact encounter (see build_encounter)
+encounter_cache = LRUCache("encounters", Config.ENCOUNTER_CACHE_SIZE)
+
+
+def build_name_prof_map(ei_json: dict) -> Dict[str, str]:
+    """
+    Build a mapping from player name -> profession/spec string
+    using the same logic as gw2_stats._safe_get_profession.
+    """
+    mapping: Dict[str, str] = {}
+    for p in ei_json.get("players", []) or []:
+        name = p.get("name") or p.get("character_name") or "Unknown"
+        prof = (
+            p.get("profession")
+            or p.get("professionName")
+            or p.get("spec")
+            or "Unknown"
+        )
+        mapping[name] = prof
+    return mapping
+
+
+def encounter_header(ei_json: dict) -> Dict[str, Any]:
+    """
+    Boss name, result, CM flag and duration (seconds or None) from EI JSON.
+    """
+    encounter = ei_json.get("encounter", {}) or {}
+    boss_name = ei_json.get("fightName") or encounter.get("boss") or "Unknown Boss"
+    success = bool(ei_json.get("success") or encounter.get("success", False))
+    is_cm = bool(
+        ei_json.get("isCM") or ei_json.get("isCm") or encounter.get("isCm", False)
+    )
+
+    duration = None
+    duration_ms = ei_json.get("durationMS") or ei_json.get("encounterDuration")
+    if duration_ms is None:
+        phases = ei_json.get("phases") or []
+        if phases:
+            duration_ms = phases[0].get("durationMS") or phases[0].get("duration")
+    if isinstance(duration_ms, (int, float)):
+        duration = duration_ms / 1000.0
+
+    return {
+        "boss_name": boss_name,
+        "success": success,
+        "is_cm": is_cm,
+        "duration": duration,
+    }
+
+
+def fight_start_time(ei_json: dict) -> Optional[float]:
+    """
+    Fight start as a unix timestamp, from EI's "timeStartStd"
+    ("2024-01-31 20:15:32 +01:00"), or None if missing/unparsable.
+    """
+    raw = ei_json.get("timeStartStd") or ei_json.get("timeStart")
+    if not isinstance(raw, str):
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S %z", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(raw.strip(), fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+# Layout version of build_encounter's result. Bump it whenever that layout
+# changes: encoded encounters (snapshots, worker results) carry it and are
+# refused on a mismatch, so code never sees keys of another layout.
+ENCOUNTER_FORMAT = 2
+
+
+def build_encounter(ei_json: dict, boss_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Walk the EI JSON once and keep only the compact data the commands need:
+
+      - boss_targets (EI targets counted as boss damage)
+      - phase_table (per-phase DPS, boss damage, boons, breakbar, healing)
+      - mechanic_events (MechanicEventStore, time-indexed per player)
+      - time_series (per-second cumulative boss damage and boss HP, for charts)
+      - name_prof_map
+      - time_start (unix timestamp of the pull, or None)
+
+    Nothing here depends on scoring weights (the table keeps every boon), so
+    a scoring config reload never needs the raw JSON again.
+
+    Per-phase metrics are derived from this lazily by compute_phase_metrics
+    and memoized under "by_phase", so the raw JSON can be dropped afterwards.
+    """
+    started = time.perf_counter()
+    if boss_name is None:
+        boss_name = encounter_header(ei_json)["boss_name"]
+
+    boss_targets = build_boss_target_index(ei_json, boss_name)
+    target_indices = [t["index"] for t in boss_targets]
+    encounter = {
+        "boss_name": boss_name,
+        "boss_targets": boss_targets,
+        "phase_table": compute_phase_table(
+            ei_json,
+            target_indices=target_indices,
+            important_boons=(),
+        ),
+        "mechanic_events": build_mechanic_event_store(ei_json),
+        "time_series": compute_time_series(ei_json, target_indices),
+        "name_prof_map": build_name_prof_map(ei_json),
+        "time_start": fight_start_time(ei_json),
+        "by_phase": {},
+    }
+
+    metrics.ENCOUNTER_COMPUTE_DURATION.labels("build").observe(
+        time.perf_counter() - started
+    )
+    return encounter
+
+
+def encounter_from_json(
+    ei_json: dict,
+    permalink: Optional[str] = None,
+    header: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    build_encounter plus the header fields duration / success / is_cm /
+    permalink: the one way the bot, the workers and offline reprocessing
+    turn EI JSON into an encounter. `header` (encounter_header's fields)
+    overrides what the JSON says, e.g. with dps.report's upload response.
+    """
+    if header is None:
+        header = encounter_header(ei_json)
+    encounter = build_encounter(ei_json, header["boss_name"])
+    encounter.update(
+        duration=header["duration"],
+        success=header["success"],
+        is_cm=header["is_cm"],
+        permalink=permalink,
+    )
+    return encounter
+
+
+# ---------------------------------------------------------------------------
+# Per-phase metrics as a lazy graph: each command computes only what it reads
+# ---------------------------------------------------------------------------
+
+PHASE_METRICS = MetricGraph()
+
+
+@PHASE_METRICS.node("phase")
+def _phase(m: LazyMetrics) -> Dict[str, Any]:
+    return m.encounter["phase_table"]["phases"][m.phase_index]
+
+
+@PHASE_METRICS.node("name_prof_map")
+def _name_prof_map(m: LazyMetrics) -> Dict[str, str]:
+    return m.encounter["name_prof_map"]
+
+
+@PHASE_METRICS.node("player_rows")
+def _player_rows(m: LazyMetrics) -> List[Dict[str, Any]]:
+    return dps_rows_from_table(m.encounter["phase_table"], m.phase_index)
+
+
+@PHASE_METRICS.node("mechanic_summary")
+def _mechanic_summary(m: LazyMetrics) -> Dict[str, Dict[str, Any]]:
+    return phase_mechanic_summary(m.encounter, m.phase_index, m.config)
+
+
+@PHASE_METRICS.node("fail_counts", "mechanic_summary")
+def _fail_counts(m: LazyMetrics, mechanic_summary) -> Dict[str, int]:
+    return mechanic_fail_counts(mechanic_summary)
+
+
+@PHASE_METRICS.node("mech_success_scores", "mechanic_summary")
+def _mech_success_scores(m: LazyMetrics, mechanic_summary) -> Dict[str, float]:
+    return mechanic_success_scores(mechanic_summary)
+
+
+@PHASE_METRICS.node("fail_score_map", "mechanic_summary")
+def _fail_score_map(m: LazyMetrics, mechanic_summary) -> Dict[str, float]:
+    return mechanic_fail_scores(mechanic_summary)
+
+
+@PHASE_METRICS.node("support_metrics", "mechanic_summary")
+def _support_metrics(m: LazyMetrics, mechanic_summary) -> Dict[str, Dict[str, Any]]:
+    return support_metrics_from_table(
+        m.encounter["phase_table"],
+        m.phase_index,
+        mechanic_summary=mechanic_summary,
+        boon_weights=m.config.boon_weights,
+        important_boons=m.config.important_boons,
+    )
+
+
+@PHASE_METRICS.node("support_scores", "support_metrics")
+def _support_scores(m: LazyMetrics, support_metrics) -> Dict[str, float]:
+    return compute_support_scores(support_metrics, m.config.support_weights)
+
+
+@PHASE_METRICS.node("damage_share")
+def _damage_share(m: LazyMetrics) -> Dict[str, float]:
+    # Boss damage -> share of total boss damage (matches log "Target All" style)
+    raw_boss_damage = boss_damage_from_table(m.encounter["phase_table"], m.phase_index)
+    total_damage = sum(max(float(v), 0.0) for v in raw_boss_damage.values()) or 1.0
+    return {
+        name: max(float(dmg), 0.0) / total_damage
+        for name, dmg in raw_boss_damage.items()
+    }
+
+
+@PHASE_METRICS.node(
+    "mvp", "damage_share", "support_scores", "mech_success_scores", "fail_score_map"
+)
+def _mvp(m: LazyMetrics, damage_share, support_scores, mech_success, fail_score_map):
+    return compute_mvp(
+        boss_damage=damage_share,
+        support_scores=support_scores,
+        mech_success_scores=mech_success,
+        mech_fail_scores=fail_score_map,
+        weights=m.config.mvp_weights,
+    )
+
+
+@PHASE_METRICS.node("mvp_name", "mvp")
+def _mvp_name(m: LazyMetrics, mvp) -> Optional[str]:
+    return mvp[0]
+
+
+@PHASE_METRICS.node("mvp_scores", "mvp")
+def _mvp_scores(m: LazyMetrics, mvp) -> Dict[str, float]:
+    return mvp[1]
+
+
+def compute_phase_metrics(
+    encounter: Dict[str, Any],
+    phase_index: int,
+    config: Optional[ScoringConfig] = None,
+) -> LazyMetrics:
+    """
+    Everything log/mvp/fail/support need for one phase, as a lazy mapping
+    (see PHASE_METRICS); each key is computed on first access:
+
+      - phase (name/start/end/duration)
+      - player_rows (DPS list)
+      - mechanic_summary (events within the phase window)
+      - fail_counts (unweighted count)
+      - mech_success_scores (weighted success)
+      - fail_score_map (weighted fails)
+      - support_metrics + support_scores
+      - damage_share (boss HP%)
+      - mvp_name + mvp_scores
+      - name_prof_map (player name -> profession/spec)
+      - scoring_key (scoring config key the result was computed with)
+
+    The mapping is memoized per (phase, scoring key for this boss), so every
+    node computed for a report is reused by later commands on it, and after
+    a config reload only bosses whose weights changed are recomputed.
+    """
+    if config is None:
+        config = current_scoring_config()
+    scoring_key = config.key_for(encounter["boss_name"])
+    by_phase = encounter["by_phase"]
+    cached = by_phase.get((phase_index, scoring_key))
+    if cached is not None:
+        return cached.bound(encounter, config)
+
+    phases = encounter["phase_table"]["phases"]
+    if not 0 <= phase_index < len(phases):
+        raise IndexError(f"phase {phase_index} out of range (0..{len(phases) - 1})")
+
+    # Memoized unbound: the encounter must not reference itself through it
+    memo = LazyMetrics(
+        PHASE_METRICS,
+        None,
+        phase_index,
+        None,
+        values={"scoring_key": scoring_key},
+    )
+    # Results for superseded weights can't be asked for again
+    for key in [k for k in by_phase if k[1] != scoring_key]:
+        del by_phase[key]
+    by_phase[(phase_index, scoring_key)] = memo
+    return memo.bound(encounter, config)
+
+
+def phase_window(
+    encounter: Dict[str, Any],
+    phase_index: int,
+) -> Tuple[Optional[float], Optional[float]]:
+    """
+    (start_ms, end_ms) of a phase; (None, None) for the full fight so that
+    events logged slightly outside EI's phase bounds are still counted.
+    """
+    if phase_index == 0:
+        return None, None
+    phase = encounter["phase_table"]["phases"][phase_index]
+    return phase["start"], phase["end"]
+
+
+def phase_mechanic_summary(
+    encounter: Dict[str, Any],
+    phase_index: int,
+    config: Optional[ScoringConfig] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    get_mechanic_summary-shaped result restricted to one phase.
+    """
+    if config is None:
+        config = current_scoring_config()
+    start, end = phase_window(encounter, phase_index)
+    return encounter["mechanic_events"].summarize(
+        encounter["boss_name"], start=start, end=end, config=config
+    )
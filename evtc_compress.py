@@ -0,0 +1,55 @@
+import io
+import os
+import zipfile
+from typing import Tuple
+
+
+# Extensions dps.report accepts; only plain .evtc is worth compressing
+COMPRESSED_LOG_EXTENSIONS = (".zevtc", ".evtc.zip")
+
+_CHUNK = 1024 * 1024
+
+# (max input size, zlib level). Above 6 deflate gets several times slower
+# for ~1% smaller output; big logs would spend more time compressing than
+# the smaller upload saves, so they get the fast levels
+_LEVELS = (
+    (8 * 1024 * 1024, 6),
+    (32 * 1024 * 1024, 3),
+)
+_LEVEL_LARGE = 1
+
+
+def needs_compression(filename: str) -> bool:
+    name = filename.lower()
+    return name.endswith(".evtc") and not name.endswith(COMPRESSED_LOG_EXTENSIONS)
+
+
+def compression_level(size: int) -> int:
+    for limit, level in _LEVELS:
+        if size <= limit:
+            return level
+    return _LEVEL_LARGE
+
+
+def compress_evtc(data: bytes, filename: str) -> Tuple[bytes, str]:
+    """
+    Pack a raw .evtc into the .zevtc form ArcDPS itself writes (a zip with
+    the .evtc inside). Returns (zevtc_bytes, new_filename).
+
+    The input is fed to the compressor in 1 MiB slices of a memoryview, so
+    the only extra memory is the compressed output. zlib releases the GIL,
+    so this is meant for asyncio.to_thread.
+    """
+    entry_name = os.path.basename(filename)
+    out = io.BytesIO()
+    view = memoryview(data)
+    with zipfile.ZipFile(
+        out,
+        "w",
+        compression=zipfile.ZIP_DEFLATED,
+        compresslevel=compression_level(len(data)),
+    ) as zf:
+        with zf.open(entry_name, "w", force_zip64=len(data) > 0x7FFFFFFF) as entry:
+            for offset in range(0, len(view), _CHUNK):
+                entry.write(view[offset : offset + _CHUNK])
+    return out.getvalue(), entry_name[: -len(".evtc")] + ".zevtc"
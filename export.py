@@ -0,0 +1,353 @@
+import csv
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from cache import LRUCache
+from encounter import compute_phase_metrics
+from gw2_stats import IMPORTANT_BOONS
+
+
+# Boon generation columns, one per boon the support score weighs
+EXPORT_BOONS: Tuple[str, ...] = tuple(sorted(IMPORTANT_BOONS))
+
+# Bumped whenever EXPORT_COLUMNS changes; stored in the schema metadata of
+# Parquet/Arrow parts. Columns are only ever added, so parts of different
+# versions read together by column name (read_export, duckdb's
+# union_by_name, pyarrow.unify_schemas). Missing columns are null.
+#   1: initial columns
+#   2: + healing
+EXPORT_SCHEMA_VERSION = 2
+
+# (column, type). Types: str, bool, int, float, timestamp, float_list.
+# Every file of one schema version has exactly these columns.
+EXPORT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("report_id", "str"),
+    ("boss", "str"),
+    ("is_cm", "bool"),
+    ("success", "bool"),
+    ("date", "timestamp"),
+    ("duration", "float"),
+    ("player", "str"),
+    ("account", "str"),
+    ("profession", "str"),
+    ("dps", "float"),
+    ("phase_dps", "float_list"),
+    ("damage_share", "float"),
+    ("breakbar", "float"),
+    ("healing", "float"),
+    ("downs", "int"),
+    ("fail_score", "float"),
+    ("success_score", "float"),
+    ("boon_score", "float"),
+    ("mvp_score", "float"),
+    ("is_mvp", "bool"),
+) + tuple((f"boon_{boon.lower()}", "float") for boon in EXPORT_BOONS)
+
+FORMATS = ("parquet", "arrow", "csv")
+_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"}
+
+
+def encounter_rows(report_id: str, encounter: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    One row per player of an encounter (see EXPORT_COLUMNS). Full-fight
+    metrics come from compute_phase_metrics, so they match the commands.
+    """
+    m = compute_phase_metrics(encounter, 0)
+    damage_share = m["damage_share"]
+    fail_scores = m["fail_score_map"]
+    success_scores = m["mech_success_scores"]
+    support = m["support_metrics"]
+    mvp_scores = m["mvp_scores"]
+    mvp_name = m["mvp_name"]
+    start = encounter.get("time_start")
+
+    rows: List[Dict[str, Any]] = []
+    for name, pdata in encounter["phase_table"]["players"].items():
+        phase_dps = pdata["dps"][: pdata["dps_phases"]]
+        sm = support.get(name) or {}
+        boons = sm.get("boons_generated") or {}
+        row = {
+            "report_id": report_id,
+            "boss": encounter["boss_name"],
+            "is_cm": bool(encounter.get("is_cm")),
+            "success": bool(encounter.get("success")),
+            "date": start,
+            "duration": encounter.get("duration"),
+            "player": name,
+            "account": pdata.get("account", ""),
+            "profession": pdata["profession"],
+            "dps": phase_dps[0] if phase_dps else 0.0,
+            "phase_dps": list(phase_dps),
+            "damage_share": damage_share.get(name, 0.0),
+            "breakbar": pdata["breakbar"][0] if pdata["breakbar"] else 0.0,
+            "healing": sm.get("healing", 0.0),
+            "downs": pdata["downs"][0],
+            "fail_score": fail_scores.get(name, 0.0),
+            "success_score": success_scores.get(name, 0.0),
+            "boon_score": sm.get("boon_score", 0.0),
+            "mvp_score": mvp_scores.get(name, 0.0),
+            "is_mvp": name == mvp_name,
+        }
+        for boon in EXPORT_BOONS:
+            row[f"boon_{boon.lower()}"] = boons.get(boon, 0.0)
+        rows.append(row)
+    return rows
+
+
+def week_partition(timestamp: Optional[float]) -> str:
+    """
+    Hive-style partition directory ("week=2024-W05") for an ISO week.
+    """
+    when = datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), timezone.utc)
+    year, week, _ = when.isocalendar()
+    return f"week={year}-W{week:02d}"
+
+
+def resolve_format(requested: str) -> str:
+    """
+    `requested` if its writer is available; parquet/arrow need pyarrow and
+    fall back to csv without it.
+    """
+    fmt = (requested or "parquet").lower()
+    if fmt not in FORMATS:
+        print(f"[WARN] Unknown EXPORT_FORMAT {requested!r}, using csv")
+        return "csv"
+    if fmt != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(f"[WARN] pyarrow is not installed; exporting csv instead of {fmt}")
+            return "csv"
+    return fmt
+
+
+def _arrow_table(rows: Sequence[Dict[str, Any]]):
+    import pyarrow as pa
+
+    types = {
+        "str": pa.string(),
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "timestamp": pa.timestamp("s", tz="UTC"),
+        "float_list": pa.list_(pa.float64()),
+    }
+    columns = {}
+    for name, kind in EXPORT_COLUMNS:
+        values = [row[name] for row in rows]
+        if kind == "timestamp":
+            values = [None if v is None else int(v) for v in values]
+        columns[name] = pa.array(values, type=types[kind])
+    return pa.table(columns).replace_schema_metadata(
+        {"gw2bot_export_version": str(EXPORT_SCHEMA_VERSION)}
+    )
+
+
+def _csv_value(value: Any, kind: str) -> Any:
+    if value is None:
+        return ""
+    if kind == "float_list":
+        return ";".join(f"{v:g}" for v in value)
+    if kind == "timestamp":
+        return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value
+
+
+def write_rows(path: str, rows: Sequence[Dict[str, Any]], fmt: str) -> None:
+    """
+    Write one part file. Parquet/Arrow are zstd-compressed; phase_dps is a
+    list column there and ";"-separated in csv.
+    """
+    tmp_path = f"{path}.tmp"
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(_arrow_table(rows), tmp_path, compression="zstd")
+    elif fmt == "arrow":
+        import pyarrow as pa
+
+        table = _arrow_table(rows)
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+    else:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in EXPORT_COLUMNS])
+            for row in rows:
+                writer.writerow([_csv_value(row[name], kind) for name, kind in EXPORT_COLUMNS])
+    # Readers globbing the directory never see a half-written file
+    os.replace(tmp_path, path)
+
+
+def _parse_csv_value(value: str, kind: str) -> Any:
+    if kind == "str":
+        return value
+    if value == "":
+        return [] if kind == "float_list" else None
+    if kind == "bool":
+        return value == "True"
+    if kind == "int":
+        return int(value)
+    if kind == "float_list":
+        return [float(v) for v in value.split(";")]
+    if kind == "timestamp":
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+    return float(value)
+
+
+def read_export(directory: str) -> List[Dict[str, Any]]:
+    """
+    Every row under an export directory (any format, all weeks), oldest
+    part first. Columns are matched by name; those a part lacks (older
+    schema versions) are None.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.startswith("part-") and name.rsplit(".", 1)[-1] in FORMATS:
+                paths.append(os.path.join(root, name))
+    paths.sort(key=os.path.basename)
+
+    rows: List[Dict[str, Any]] = []
+    kinds = dict(EXPORT_COLUMNS)
+    for path in paths:
+        ext = path.rsplit(".", 1)[-1]
+        if ext == "csv":
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for raw in csv.DictReader(f):
+                    row = dict.fromkeys(kinds)
+                    row.update(
+                        (name, _parse_csv_value(value, kinds[name]))
+                        for name, value in raw.items()
+                        if name in kinds
+                    )
+                    rows.append(row)
+            continue
+
+        import pyarrow as pa
+
+        if ext == "parquet":
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path)
+        else:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+        if "date" in table.column_names:
+            table = table.set_column(
+                table.column_names.index("date"), "date", table["date"].cast(pa.int64())
+            )
+        for item in table.to_pylist():
+            row = dict.fromkeys(kinds)
+            row.update(item)
+            rows.append(row)
+    return rows
+
+
+class EncounterExporter:
+    """
+    Buffers per-player rows of newly loaded encounters and writes them in
+    batches as one part file per ISO week under `directory`:
+
+        <directory>/week=2024-W05/part-<time>-<n>.parquet
+
+    Parquet/Arrow files can't be appended to, so each flush adds a part;
+    pandas, pyarrow and duckdb read a partition directory as one table.
+
+    add() and take() run on the event loop; write_batch() does the file
+    I/O in a thread.
+    """
+
+    def __init__(self, directory: str, fmt: str = "parquet", batch_rows: int = 500) -> None:
+        self.directory = directory
+        self.format = resolve_format(fmt)
+        self.batch_rows = max(int(batch_rows), 1)
+        self._rows: List[Dict[str, Any]] = []
+        self._parts = 0
+        # Reports exported by this process; a report reloaded after cache
+        # eviction is not written twice
+        self._exported = LRUCache("export_reports", 8192)
+
+    def exported(self, report_id: str) -> bool:
+        """
+        Whether the report's rows were already queued by this process.
+        """
+        return report_id in self._exported
+
+    def add(self, report_id: str, encounter: Dict[str, Any]) -> bool:
+        """
+        Queue an encounter's rows. Returns True once a batch is full.
+        """
+        if report_id in self._exported:
+            return len(self._rows) >= self.batch_rows
+        return self.add_rows(report_id, encounter_rows(report_id, encounter))
+
+    def add_rows(self, report_id: str, rows: Sequence[Dict[str, Any]]) -> bool:
+        """
+        add() for rows built elsewhere (reprocess.py's workers, a thread).
+        """
+        if report_id not in self._exported:
+            self._exported.put(report_id, True)
+            self._rows.extend(rows)
+        return len(self._rows) >= self.batch_rows
+
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def take(self) -> List[Dict[str, Any]]:
+        """
+        Hand over the buffered rows (on the event loop) for write_batch.
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def write_batch(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """
+        Write rows to their week partitions; returns the number written.
+        Blocking file I/O, meant for asyncio.to_thread.
+        """
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        by_week: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_week.setdefault(week_partition(row["date"]), []).append(row)
+
+        written = 0
+        for week, week_rows in by_week.items():
+            directory = os.path.join(self.directory, week)
+            self._parts += 1
+            name = f"part-{time.time_ns()}-{self._parts}.{_EXTENSIONS[self.format]}"
+            try:
+                os.makedirs(directory, exist_ok=True)
+                write_rows(os.path.join(directory, name), week_rows, self.format)
+            except Exception as e:
+                print(f"[WARN] Could not export {len(week_rows)} rows to {directory}: {e!r}")
+                metrics.EXPORT_ROWS.labels(self.format, "error").inc(len(week_rows))
+                continue
+            metrics.EXPORT_ROWS.labels(self.format, "written").inc(len(week_rows))
+            written += len(week_rows)
+
+        metrics.EXPORT_FLUSH_DURATION.observe(time.perf_counter() - started)
+        return written
+
+    def flush(self) -> int:
+        """
+        take() + write_batch() in one blocking call (shutdown, offline tools).
+        """
+        return self.write_batch(self.take())
+
+
+def open_exporter(directory: str, fmt: str, batch_rows: int) -> Optional[EncounterExporter]:
+    """
+    EncounterExporter for `directory`, or None when exporting is disabled.
+    """
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return EncounterExporter(directory, fmt, batch_rows)
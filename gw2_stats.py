@@ -1,6 +1,8 @@
-from typing import Dict, List, Any, Optional, Set
+from array import array
+from typing import AbstractSet, Dict, List, Any, Mapping, Optional, Sequence, Set, Tuple
 
-from mechanics_config import get_success_rules_for_boss, get_fail_rules_for_boss
+from mechanic_events import MechanicEventStore
+from targets_config import get_boss_target_names
 
 
 IMPORTANT_BOONS: Set[str] = {
@@ -104,6 +106,9 @@ def get_mechanic_summary(
     Also uses mechanics_config.{SUCCESS,FAILED}_MECHANICS_CONFIG
     via get_success_rules_for_boss/get_fail_rules_for_boss.
 
+    This is an aggregate over MechanicEventStore; build the store once and
+    call store.summarize(boss, start, end) for time-window summaries.
+
     Returns:
     {
       "Player Name": {
@@ -118,84 +123,16 @@ def get_mechanic_summary(
     if boss_name is None:
         boss_name = ei_json.get("fightName") or ""
 
-    players = ei_json.get("players", [])
-    result: Dict[str, Dict[str, Any]] = {
-        _safe_get_player_name(p): {
-            "fails": [],
-            "success": [],
-            "fail_score": 0.0,
-            "success_score": 0.0,
-        }
-        for p in players
-    }
+    store = build_mechanic_event_store(ei_json)
+    return store.summarize(boss_name)
 
-    mechanics = ei_json.get("mechanics", []) or []
 
-    success_rules = get_success_rules_for_boss(boss_name)
-    fail_rules = get_fail_rules_for_boss(boss_name)
-
-    default_success_weight = success_rules.get("__success_default__")
-    default_fail_weight = fail_rules.get("__fail_default__")
-
-    for mech in mechanics:
-        label = (
-            mech.get("name")
-            or mech.get("fullName")
-            or mech.get("description")
-            or "Unknown mechanic"
-        )
-        lower_label = label.lower()
-
-        # Config-based classification
-        conf_success_weight = success_rules.get(label)
-        conf_fail_weight = fail_rules.get(label)
-
-        is_success_conf = conf_success_weight is not None
-        is_fail_conf = conf_fail_weight is not None
-
-        # Fallback to simple heuristics if not configured
-        if not (is_success_conf or is_fail_conf):
-            is_fail = False
-            is_success = False
-
-            # Fail-ish keywords
-            if any(
-                k in lower_label
-                for k in ("downed", "death", "floor", "fail", "breath", "tantrum", "poison dmg")
-            ):
-                is_fail = True
-
-            # Success-ish keywords
-            if any(k in lower_label for k in ("cc", "slub", "res", "got up", "fixate")):
-                is_success = True
-
-            # Assign default weights if available
-            if is_fail and default_fail_weight is not None:
-                conf_fail_weight = float(default_fail_weight)
-                is_fail_conf = True
-            if is_success and default_success_weight is not None:
-                conf_success_weight = float(default_success_weight)
-                is_success_conf = True
-
-        # Apply mechanic to each occurrence
-        for entry in mech.get("mechanicsData", []) or []:
-            actor_name = entry.get("actor")
-            if actor_name not in result:
-                # Could be an NPC / non-player
-                continue
-
-            count = 1.0  # each occurrence counts as 1
-            if is_fail_conf:
-                w = float(conf_fail_weight)
-                result[actor_name]["fails"].append(label)
-                result[actor_name]["fail_score"] += w * count
-
-            if is_success_conf:
-                w = float(conf_success_weight)
-                result[actor_name]["success"].append(label)
-                result[actor_name]["success_score"] += w * count
-
-    return result
+def build_mechanic_event_store(ei_json: dict) -> MechanicEventStore:
+    """
+    Time-indexed per-player mechanic events (see mechanic_events).
+    """
+    names = [_safe_get_player_name(p) for p in ei_json.get("players", []) or []]
+    return MechanicEventStore.from_ei_json(ei_json, names)
 
 
 def mechanic_fail_counts(mechanic_summary: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
@@ -252,6 +189,107 @@ def build_buff_id_map(ei_json: dict) -> Dict[int, Dict[str, str]]:
     return buff_map
 
 
+def build_boon_columns(
+    ei_json: dict,
+    important_boons: Optional[AbstractSet[str]] = None,
+) -> Tuple[Dict[int, int], List[str]]:
+    """
+    Resolve boon buff ids once per log into matrix columns.
+
+    Returns (buff id -> column, column -> boon name). Ids sharing a name
+    share a column. With `important_boons` empty or None every boon is kept.
+    """
+    columns: Dict[int, int] = {}
+    names: List[str] = []
+    by_name: Dict[str, int] = {}
+    for buff_id, info in build_buff_id_map(ei_json).items():
+        if info.get("classification") != "Boon":
+            continue
+        boon_name = info.get("name")
+        if important_boons and boon_name not in important_boons:
+            continue
+        col = by_name.get(boon_name)
+        if col is None:
+            col = by_name[boon_name] = len(names)
+            names.append(boon_name)
+        columns[buff_id] = col
+    return columns, names
+
+
+def compute_boon_matrix(
+    ei_json: dict,
+    n_phases: int,
+    important_boons: Optional[AbstractSet[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Boon generation of every player for every phase, as flat
+    phases x players x boons matrices (array('d'), row-major):
+
+    {
+      "boons":     ["Might", "Quickness", ...],     # columns
+      "players":   {"Player Name": row, ...},
+      "n_players": 10,        # rows per phase (len(ei_json["players"]))
+      "group":     array('d'),  # players[*].groupBuffs generation
+      "squad":     array('d'),  # players[*].squadBuffs generation
+    }
+
+    Players sharing a name (e.g. the "Unknown" fallback) each keep their
+    row; the name maps to the last one, as in compute_phase_table. Read a
+    cell with boon_matrix_row(). Phases missing from a buff's
+    buffData fall back to its first entry (the full fight).
+    """
+    columns, names = build_boon_columns(ei_json, important_boons)
+    players = ei_json.get("players", []) or []
+    n_players, n_boons = len(players), len(names)
+    size = n_phases * n_players * n_boons
+    matrices = {"group": array("d", bytes(8 * size)), "squad": array("d", bytes(8 * size))}
+    rows: Dict[str, int] = {}
+
+    for row, p in enumerate(players):
+        rows[_safe_get_player_name(p)] = row
+        for kind, key in (("group", "groupBuffs"), ("squad", "squadBuffs")):
+            cells = matrices[kind]
+            for buff in p.get(key, []) or []:
+                col = columns.get(buff.get("id"))
+                if col is None:
+                    continue
+                buff_data = buff.get("buffData", []) or []
+                if not buff_data:
+                    continue
+                for i in range(n_phases):
+                    entry = buff_data[i] if i < len(buff_data) else buff_data[0]
+                    gen = float((entry or {}).get("generation", 0.0))
+                    if gen > 0.0:
+                        cells[(i * n_players + row) * n_boons + col] += gen
+
+    return {"boons": names, "players": rows, "n_players": n_players, **matrices}
+
+
+def boon_matrix_row(
+    matrix: Dict[str, Any],
+    phase_index: int,
+    name: str,
+    kind: str = "group",
+    important_boons: Optional[AbstractSet[str]] = None,
+) -> Dict[str, float]:
+    """
+    {boon name: generation} for one player and phase (non-zero cells only).
+    """
+    row = matrix["players"].get(name)
+    if row is None:
+        return {}
+    names = matrix["boons"]
+    n_boons = len(names)
+    # Not len(matrix["players"]): duplicate names make that dict shorter
+    start = (phase_index * matrix["n_players"] + row) * n_boons
+    cells = matrix[kind][start : start + n_boons]
+    return {
+        boon: value
+        for boon, value in zip(names, cells)
+        if value > 0.0 and (not important_boons or boon in important_boons)
+    }
+
+
 def compute_group_boon_generation(
     ei_json: dict,
     phase_index: int = 0,
@@ -274,44 +312,11 @@ def compute_group_boon_generation(
     if important_boons is None:
         important_boons = IMPORTANT_BOONS
 
-    buff_map = build_buff_id_map(ei_json)
-    result: Dict[str, Dict[str, float]] = {}
-
-    for p in ei_json.get("players", []) or []:
-        name = _safe_get_player_name(p)
-        per_boon: Dict[str, float] = {}
-
-        for gb in p.get("groupBuffs", []) or []:
-            buff_id = gb.get("id")
-            if buff_id is None:
-                continue
-
-            info = buff_map.get(buff_id)
-            if not info:
-                continue
-
-            boon_name = info.get("name")
-            classification = info.get("classification")
-            if classification != "Boon":
-                continue
-            if important_boons and boon_name not in important_boons:
-                continue
-
-            buff_data = gb.get("buffData", []) or []
-            if not buff_data:
-                continue
-
-            idx = phase_index if phase_index < len(buff_data) else 0
-            phase_entry = buff_data[idx] or {}
-            gen = float(phase_entry.get("generation", 0.0))
-            if gen <= 0.0:
-                continue
-
-            per_boon[boon_name] = per_boon.get(boon_name, 0.0) + gen
-
-        result[name] = per_boon
-
-    return result
+    matrix = compute_boon_matrix(ei_json, phase_index + 1, important_boons)
+    return {
+        name: boon_matrix_row(matrix, phase_index, name)
+        for name in matrix["players"]
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -399,6 +404,268 @@ def compute_support_metrics(
     return metrics
 
 
+# ---------------------------------------------------------------------------
+# Boss targets
+# ---------------------------------------------------------------------------
+
+def build_boss_target_index(
+    ei_json: dict,
+    boss_name: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Which EI targets count as "boss" for this encounter.
+
+    Uses targets_config.BOSS_TARGETS_CONFIG when the encounter is listed,
+    otherwise the targets EI assigns to the full-fight phase. Fake targets
+    (EI's "isFake") are never included. Falls back to target 0.
+
+    Returns:
+      [ {"index": 0, "name": "Nikare"}, {"index": 1, "name": "Kenut"} ]
+    """
+    if boss_name is None:
+        boss_name = ei_json.get("fightName") or ""
+
+    targets = ei_json.get("targets", []) or []
+
+    def usable(i: int) -> bool:
+        return 0 <= i < len(targets) and not (targets[i] or {}).get("isFake", False)
+
+    indices: List[int] = []
+    wanted = {n.lower() for n in get_boss_target_names(boss_name)}
+    if wanted:
+        indices = [
+            i for i, t in enumerate(targets)
+            if usable(i) and str((t or {}).get("name", "")).lower() in wanted
+        ]
+
+    if not indices:
+        phases = ei_json.get("phases", []) or []
+        phase_targets = (phases[0] or {}).get("targets", []) if phases else []
+        indices = [i for i in phase_targets if isinstance(i, int) and usable(i)]
+
+    if not indices:
+        indices = [0]
+
+    return [
+        {
+            "index": i,
+            "name": (targets[i] or {}).get("name", f"Target {i}")
+            if i < len(targets) else f"Target {i}",
+        }
+        for i in sorted(set(indices))
+    ]
+
+
+# ---------------------------------------------------------------------------
+# All-phases table (one pass over players)
+# ---------------------------------------------------------------------------
+
+def get_phases(ei_json: dict) -> List[Dict[str, Any]]:
+    """
+    Phase boundaries from ei_json["phases"] (index 0 is the full fight).
+
+    [
+      {"index": 0, "name": "Full Fight", "start": 0.0, "end": 412345.0,
+       "duration": 412.3},    # start/end in ms, duration in seconds
+      ...
+    ]
+    """
+    phases: List[Dict[str, Any]] = []
+    for i, ph in enumerate(ei_json.get("phases", []) or []):
+        ph = ph or {}
+        start = float(ph.get("start") or 0.0)
+        end = float(ph.get("end") or start)
+        phases.append(
+            {
+                "index": i,
+                "name": ph.get("name") or f"Phase {i}",
+                "start": start,
+                "end": end,
+                "duration": max(end - start, 0.0) / 1000.0,
+            }
+        )
+
+    if not phases:
+        duration_ms = float(ei_json.get("durationMS") or 0.0)
+        phases.append(
+            {
+                "index": 0,
+                "name": "Full Fight",
+                "start": 0.0,
+                "end": duration_ms,
+                "duration": duration_ms / 1000.0,
+            }
+        )
+    return phases
+
+
+def compute_phase_table(
+    ei_json: dict,
+    target_indices: Sequence[int] = (0,),
+    important_boons: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Walk players once and collect per-phase stats for every phase.
+
+    boss_damage is summed over `target_indices` (see build_boss_target_index).
+
+    {
+      "phases": [ ...get_phases()... ],
+      "players": {
+        "Player Name": {
+          "profession": str,
+          "account": str,
+          "dps_phases": int,        # phases with dpsAll data
+          "dps": [float, ...],      # one entry per phase
+          "breakbar": [float, ...],
+          "boss_damage": [float, ...],
+          "healing": [float, ...],
+          "downs": [int, ...],
+        },
+        ...
+      },
+      "boon_matrix": { ...compute_boon_matrix()... },
+    }
+    """
+    if important_boons is None:
+        important_boons = IMPORTANT_BOONS
+
+    phases = get_phases(ei_json)
+    n_phases = len(phases)
+
+    players: Dict[str, Dict[str, Any]] = {}
+    for p in ei_json.get("players", []) or []:
+        name = _safe_get_player_name(p)
+
+        dps = [0.0] * n_phases
+        breakbar = [0.0] * n_phases
+        dps_all = p.get("dpsAll", []) or []
+        for i, stats in enumerate(dps_all[:n_phases]):
+            stats = stats or {}
+            dps[i] = float(
+                stats.get("dps") or stats.get("Dps") or stats.get("dpsAll") or 0.0
+            )
+            breakbar[i] = float(
+                stats.get("breakbarDamage") or stats.get("BreakbarDamage") or 0.0
+            )
+
+        boss_damage = [0.0] * n_phases
+        dps_targets = p.get("dpsTargets", []) or []
+        for t in target_indices:
+            if t >= len(dps_targets):
+                continue
+            for i, stats in enumerate((dps_targets[t] or [])[:n_phases]):
+                boss_damage[i] += float((stats or {}).get("damage", 0.0))
+
+        healing = [0.0] * n_phases
+        healing_stats = p.get("extHealingStats") or p.get("healingStats") or []
+        for i, phase_heal in enumerate(healing_stats[:n_phases]):
+            phase_heal = phase_heal or {}
+            out_heal = (
+                phase_heal.get("outgoingHealing")
+                or phase_heal.get("healing")
+                or 0.0
+            )
+            out_barrier = phase_heal.get("outgoingBarrier") or 0.0
+            healing[i] = float(out_heal) + float(out_barrier)
+
+        downs = [0] * n_phases
+        for i, stats in enumerate((p.get("defenses", []) or [])[:n_phases]):
+            downs[i] = int((stats or {}).get("downCount") or 0)
+
+        players[name] = {
+            "profession": _safe_get_profession(p),
+            "account": p.get("account") or "",
+            "dps_phases": min(len(dps_all), n_phases),
+            "dps": dps,
+            "breakbar": breakbar,
+            "boss_damage": boss_damage,
+            "healing": healing,
+            "downs": downs,
+        }
+
+    return {
+        "phases": phases,
+        "players": players,
+        "boon_matrix": compute_boon_matrix(ei_json, n_phases, important_boons),
+    }
+
+
+def dps_rows_from_table(
+    phase_table: Dict[str, Any],
+    phase_index: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Same rows as get_player_dps, read from a precomputed phase table.
+    """
+    rows: List[Dict[str, Any]] = []
+    for name, pdata in phase_table["players"].items():
+        if phase_index >= pdata["dps_phases"]:
+            continue
+        rows.append(
+            {
+                "name": name,
+                "profession": pdata["profession"],
+                "dps": pdata["dps"][phase_index],
+                "breakbar": pdata["breakbar"][phase_index],
+            }
+        )
+    rows.sort(key=lambda r: r["dps"], reverse=True)
+    return rows
+
+
+def boss_damage_from_table(
+    phase_table: Dict[str, Any],
+    phase_index: int = 0,
+) -> Dict[str, float]:
+    """
+    Same result as compute_boss_damage, read from a precomputed phase table.
+    """
+    return {
+        name: pdata["boss_damage"][phase_index]
+        for name, pdata in phase_table["players"].items()
+    }
+
+
+def support_metrics_from_table(
+    phase_table: Dict[str, Any],
+    phase_index: int = 0,
+    mechanic_summary: Optional[Dict[str, Dict[str, Any]]] = None,
+    boon_weights: Optional[Mapping[str, float]] = None,
+    important_boons: Optional[AbstractSet[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Same shape as compute_support_metrics, read from a precomputed phase table.
+
+    When the table was built with all boons (important_boons=()), pass
+    `important_boons` here to count only those.
+    """
+    mechanic_summary = mechanic_summary or {}
+    if boon_weights is None:
+        boon_weights = BOON_GENERATION_WEIGHTS
+    matrix = phase_table["boon_matrix"]
+    metrics: Dict[str, Dict[str, Any]] = {}
+
+    for name, pdata in phase_table["players"].items():
+        boons_generated = boon_matrix_row(matrix, phase_index, name, "group", important_boons)
+        squad_generated = boon_matrix_row(matrix, phase_index, name, "squad", important_boons)
+        boon_score = 0.0
+        for boon_name, amount in boons_generated.items():
+            boon_score += amount * boon_weights.get(boon_name, 1.0)
+
+        ms = mechanic_summary.get(name, {})
+        metrics[name] = {
+            "healing": pdata["healing"][phase_index],
+            "boon_score": boon_score,
+            "boons_generated": boons_generated,
+            "squad_boons_generated": squad_generated,
+            "mech_success": float(ms.get("success_score", 0.0)),
+            "breakbar": pdata["breakbar"][phase_index],
+        }
+
+    return metrics
+
+
 # ---------------------------------------------------------------------------
 # Boss damage (for MVP: % boss HP)
 # ---------------------------------------------------------------------------
@@ -407,15 +674,20 @@ def compute_boss_damage(
     ei_json: dict,
     phase_index: int = 0,
     target_index: int = 0,
+    target_indices: Optional[Sequence[int]] = None,
 ) -> Dict[str, float]:
     """
-    Compute per-player damage to the main boss target for a given phase.
+    Compute per-player damage to the boss target(s) for a given phase.
 
-    Uses players[*].dpsTargets[target_index][phase_index]["damage"].
+    Uses players[*].dpsTargets[t][phase_index]["damage"], summed over
+    `target_indices` when given, else just `target_index`.
 
     Returns:
       { "Player Name": damage }
     """
+    if target_indices is None:
+        target_indices = (target_index,)
+
     players = ei_json.get("players", []) or []
     result: Dict[str, float] = {}
 
@@ -424,12 +696,73 @@ def compute_boss_damage(
         dmg_val = 0.0
 
         dps_targets = p.get("dpsTargets", []) or []
-        if target_index < len(dps_targets):
-            target_phases = dps_targets[target_index] or []
+        for t in target_indices:
+            if t >= len(dps_targets):
+                continue
+            target_phases = dps_targets[t] or []
             if phase_index < len(target_phases):
                 stats = target_phases[phase_index] or {}
-                dmg_val = float(stats.get("damage", 0.0))
+                dmg_val += float(stats.get("damage", 0.0))
 
         result[name] = dmg_val
 
     return result
+
+
+# ---------------------------------------------------------------------------
+# Per-second series (for !graph)
+# ---------------------------------------------------------------------------
+
+def compute_time_series(
+    ei_json: dict,
+    target_indices: Sequence[int] = (0,),
+) -> Dict[str, Any]:
+    """
+    Full-fight per-second series, compact enough to keep with the encounter:
+
+    {
+      "damage": {"Player Name": array('d'), ...},  # cumulative boss damage,
+                                                   # index = second of the fight
+      "health": [
+        {"name": str, "times": array('d'), "percents": array('d')},  # ms, HP%
+        ...
+      ],
+    }
+
+    damage sums players[*].targetDamage1S[t][0] over `target_indices`;
+    health comes from targets[t].healthPercents.
+    """
+    damage: Dict[str, array] = {}
+    for p in ei_json.get("players", []) or []:
+        per_target = p.get("targetDamage1S", []) or []
+        total: List[float] = []
+        for t in target_indices:
+            if t >= len(per_target) or not per_target[t]:
+                continue
+            series = per_target[t][0] or []
+            if len(series) > len(total):
+                # Shorter series hold their last (cumulative) value
+                last = total[-1] if total else 0.0
+                total.extend([last] * (len(series) - len(total)))
+            last = 0.0
+            for i in range(len(total)):
+                if i < len(series):
+                    last = float(series[i] or 0.0)
+                total[i] += last
+        damage[_safe_get_player_name(p)] = array("d", total)
+
+    targets = ei_json.get("targets", []) or []
+    health: List[Dict[str, Any]] = []
+    for t in target_indices:
+        if t >= len(targets):
+            continue
+        points = targets[t].get("healthPercents") or []
+        health.append(
+            {
+                "name": targets[t].get("name") or f"Target {t}",
+                "times": array("d", (float(pt[0]) for pt in points)),
+                "percents": array("d", (float(pt[1]) for pt in points)),
+            }
+        )
+
+    return {"damage": damage, "health": health}
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import struct
+import time
+import zlib
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+from encounter import ENCOUNTER_FORMAT
+
+
+class JobFailed(Exception):
+    """
+    A worker could not process a report. `status` is the dps.report HTTP
+    status when the failure was an HTTP error, else None.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class StaleEncounter(ValueError):
+    """
+    An encoded encounter of another ENCOUNTER_FORMAT than this code's.
+    """
+
+
+# Encoded encounters start with their ENCOUNTER_FORMAT, outside the zlib
+# stream so it can be checked without decompressing
+_FORMAT_PREFIX = struct.Struct(">H")
+
+
+def encode_encounter(encounter: Dict[str, Any]) -> bytes:
+    return _FORMAT_PREFIX.pack(ENCOUNTER_FORMAT) + zlib.compress(
+        pickle.dumps(encounter, protocol=pickle.HIGHEST_PROTOCOL), 6
+    )
+
+
+def is_current(payload: bytes) -> bool:
+    """
+    Whether an encoded encounter has this code's ENCOUNTER_FORMAT.
+    """
+    prefix = payload[: _FORMAT_PREFIX.size]
+    return len(prefix) == _FORMAT_PREFIX.size and _FORMAT_PREFIX.unpack(prefix)[0] == ENCOUNTER_FORMAT
+
+
+def decode_encounter(payload: bytes) -> Dict[str, Any]:
+    if not is_current(payload):
+        raise StaleEncounter("encounter was encoded in another format")
+    return pickle.loads(zlib.decompress(payload[_FORMAT_PREFIX.size :]))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id   TEXT    NOT NULL,
+    status      TEXT    NOT NULL,  -- queued / running / done / failed
+    worker      TEXT,
+    error       TEXT,
+    http_status INTEGER,
+    created     REAL    NOT NULL,
+    started     REAL,
+    finished    REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_report ON jobs (report_id, status);
+CREATE TABLE IF NOT EXISTS results (
+    report_id TEXT PRIMARY KEY,
+    payload   BLOB NOT NULL,
+    created   REAL NOT NULL
+);
+"""
+
+
+class SQLiteJobQueue:
+    """
+    Job queue + shared result cache in one SQLite file, for one gateway and
+    any number of worker processes on the same host.
+
+      jobs     report ids waiting for / being processed by a worker
+      results  report id -> compressed compact encounter (encode_encounter)
+
+    Workers claim jobs with an IMMEDIATE transaction, so two workers never
+    get the same job. Jobs held by a worker for longer than `stale_after`
+    seconds (e.g. the process died) are handed out again.
+
+    All methods block; the gateway calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, stale_after: float = 300.0) -> None:
+        self.path = path
+        self.stale_after = stale_after
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    # -- gateway side -------------------------------------------------------
+
+    def get_result(self, report_id: str) -> Optional[bytes]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT payload FROM results WHERE report_id = ?", (report_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def submit(self, report_id: str) -> int:
+        """
+        Queue a report, or return the id of the job already queued/running
+        for it.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE report_id = ? AND status IN ('queued', 'running') "
+                "ORDER BY id LIMIT 1",
+                (report_id,),
+            ).fetchone()
+            if row is not None:
+                job_id = row[0]
+            else:
+                cur = conn.execute(
+                    "INSERT INTO jobs (report_id, status, created) VALUES (?, 'queued', ?)",
+                    (report_id, time.time()),
+                )
+                job_id = cur.lastrowid
+            conn.execute("COMMIT")
+            return job_id
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def job_state(self, job_id: int) -> Tuple[str, Optional[str], Optional[int]]:
+        """
+        (status, error, http_status) of a job.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT status, error, http_status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return "failed", "job disappeared", None
+        return row[0], row[1], row[2]
+
+    def depth(self) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+        return int(row[0])
+
+    async def run(
+        self,
+        report_id: str,
+        timeout: float,
+        poll_interval: float = 0.25,
+    ) -> bytes:
+        """
+        Return the encoded encounter for a report, queueing it for the workers
+        if no result is stored yet. Raises JobFailed / JobTimeout.
+        """
+        payload = await asyncio.to_thread(self.get_result, report_id)
+        if payload is not None and is_current(payload):
+            metrics.JOBS_TOTAL.labels("cached").inc()
+            return payload
+        # A result stored by older code is recomputed (and replaced)
+
+        started = time.perf_counter()
+        job_id = await asyncio.to_thread(self.submit, report_id)
+        metrics.JOB_QUEUE_DEPTH.set(await asyncio.to_thread(self.depth))
+        try:
+            while True:
+                status, error, http_status = await asyncio.to_thread(self.job_state, job_id)
+                if status == "done":
+                    payload = await asyncio.to_thread(self.get_result, report_id)
+                    if payload is not None and is_current(payload):
+                        metrics.JOBS_TOTAL.labels("done").inc()
+                        return payload
+                    if payload is None:
+                        status, error = "failed", "result missing"
+                    else:
+                        status, error = "failed", "worker runs an older version; restart it"
+                if status == "failed":
+                    metrics.JOBS_TOTAL.labels("failed").inc()
+                    raise JobFailed(error or "unknown error", http_status)
+                if time.perf_counter() - started > timeout:
+                    metrics.JOBS_TOTAL.labels("timeout").inc()
+                    raise JobTimeout(f"no worker finished `{report_id}` within {timeout:.0f}s")
+                await asyncio.sleep(poll_interval)
+        finally:
+            metrics.JOB_WAIT.observe(time.perf_counter() - started)
+
+    # -- worker side --------------------------------------------------------
+
+    def claim(self, worker: str) -> Optional[Tuple[int, str]]:
+        """
+        Take the oldest queued (or stale running) job. Returns (job_id, report_id).
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, report_id FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND started < ?) "
+                "ORDER BY id LIMIT 1",
+                (now - self.stale_after,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                    (worker, now, row[0]),
+                )
+            conn.execute("COMMIT")
+            return (row[0], row[1]) if row is not None else None
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, job_id: int, report_id: str, payload: bytes) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (report_id, payload, created) VALUES (?, ?, ?)",
+                (report_id, sqlite3.Binary(payload), now),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ? WHERE id = ?",
+                (now, job_id),
+            )
+
+    def fail(self, job_id: int, error: str, http_status: Optional[int] = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, http_status = ?, finished = ? "
+                "WHERE id = ?",
+                (error[:500], http_status, time.time(), job_id),
+            )
+
+    def prune(self, max_age: float) -> None:
+        """
+        Drop finished jobs and results older than `max_age` seconds.
+        """
+        cutoff = time.time() - max_age
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM results WHERE created < ?", (cutoff,))
+
+
+def open_job_queue(path: str, stale_after: float = 300.0) -> Optional[SQLiteJobQueue]:
+    """
+    The configured job queue, or None when reports are processed in-process.
+    """
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return SQLiteJobQueue(path, stale_after=stale_after)
@@ -0,0 +1,232 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mechanics_config import get_success_rules_for_boss, get_fail_rules_for_boss
+
+
+FAIL_KEYWORDS = ("downed", "death", "floor", "fail", "breath", "tantrum", "poison dmg")
+SUCCESS_KEYWORDS = ("cc", "slub", "res", "got up", "fixate")
+
+
+def mechanic_label(mech: dict) -> str:
+    return (
+        mech.get("name")
+        or mech.get("fullName")
+        or mech.get("description")
+        or "Unknown mechanic"
+    )
+
+
+def classify_mechanic(
+    label: str,
+    success_rules: Dict[str, float],
+    fail_rules: Dict[str, float],
+) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Return (fail_weight, success_weight) for a mechanic label; None means the
+    mechanic is not counted on that side.
+
+    Configured labels use mechanics_config weights. Anything else falls back
+    to keyword heuristics with the boss' "__fail_default__" /
+    "__success_default__" weights, if the boss has them.
+    """
+    fail_w = fail_rules.get(label)
+    success_w = success_rules.get(label)
+    if fail_w is not None or success_w is not None:
+        return (
+            float(fail_w) if fail_w is not None else None,
+            float(success_w) if success_w is not None else None,
+        )
+
+    lower_label = label.lower()
+    default_fail = fail_rules.get("__fail_default__")
+    default_success = success_rules.get("__success_default__")
+
+    if default_fail is not None and any(k in lower_label for k in FAIL_KEYWORDS):
+        fail_w = float(default_fail)
+    if default_success is not None and any(k in lower_label for k in SUCCESS_KEYWORDS):
+        success_w = float(default_success)
+    return fail_w, success_w
+
+
+class MechanicEventStore:
+    """
+    Time-indexed mechanic events, one pair of parallel arrays per player:
+
+      times[name]  -> array('d') of event times (ms from log start), sorted
+      codes[name]  -> array('H') of label codes, index into `labels`
+
+    Range queries use binary search on the time column, so asking for a phase
+    or "the last 10 seconds" costs O(log n + events in range).
+    """
+
+    def __init__(self, labels: List[str], player_names: Iterable[str]) -> None:
+        self.labels = labels
+        self.times: Dict[str, array] = {name: array("d") for name in player_names}
+        self.codes: Dict[str, array] = {name: array("H") for name in self.times}
+        # scoring config key -> label_weights() result
+        self._weights: Dict[str, Tuple[List[Optional[float]], List[Optional[float]]]] = {}
+
+    @classmethod
+    def from_ei_json(cls, ei_json: dict, player_names: Iterable[str]) -> "MechanicEventStore":
+        """
+        Build the store from ei_json["mechanics"], keeping player events only.
+        """
+        label_codes: Dict[str, int] = {}
+        labels: List[str] = []
+        store = cls(labels, player_names)
+
+        pending: Dict[str, List[Tuple[float, int]]] = {name: [] for name in store.times}
+        for mech in ei_json.get("mechanics", []) or []:
+            label = mechanic_label(mech)
+            code = label_codes.get(label)
+            if code is None:
+                code = len(labels)
+                label_codes[label] = code
+                labels.append(label)
+
+            for entry in mech.get("mechanicsData", []) or []:
+                events = pending.get(entry.get("actor"))
+                if events is None:
+                    # Could be an NPC / non-player
+                    continue
+                events.append((float(entry.get("time") or 0.0), code))
+
+        for name, events in pending.items():
+            events.sort(key=lambda e: e[0])
+            store.times[name] = array("d", (t for t, _ in events))
+            store.codes[name] = array("H", (c for _, c in events))
+
+        return store
+
+    def _bounds(
+        self,
+        name: str,
+        start: Optional[float],
+        end: Optional[float],
+    ) -> Tuple[int, int]:
+        times = self.times[name]
+        lo = 0 if start is None else bisect_left(times, start)
+        hi = len(times) if end is None else bisect_right(times, end)
+        return lo, hi
+
+    def player_events(
+        self,
+        name: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Tuple[float, str]]:
+        """
+        (time, label) for one player within [start, end] (ms, inclusive).
+        """
+        lo, hi = self._bounds(name, start, end)
+        times, codes, labels = self.times[name], self.codes[name], self.labels
+        for i in range(lo, hi):
+            yield times[i], labels[codes[i]]
+
+    def events(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[Tuple[float, str, str]]:
+        """
+        (time, player, label) for every player within [start, end], in time order.
+        """
+        streams = []
+        for name in self.times:
+            lo, hi = self._bounds(name, start, end)
+            if lo < hi:
+                streams.append(self._stream(name, lo, hi))
+        return heapq.merge(*streams, key=lambda e: e[0])
+
+    def _stream(self, name: str, lo: int, hi: int) -> Iterator[Tuple[float, str, str]]:
+        times, codes, labels = self.times[name], self.codes[name], self.labels
+        for i in range(lo, hi):
+            yield times[i], name, labels[codes[i]]
+
+    def end_time(self) -> float:
+        """
+        Time of the last recorded player event (0.0 if there are none).
+        """
+        return max((t[-1] for t in self.times.values() if t), default=0.0)
+
+    def label_weights(
+        self,
+        boss_name: str,
+        config: Optional[Any] = None,
+    ) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+        """
+        Per label code (fail_weight, success_weight) lists for a boss.
+
+        `config` is a scoring_config.ScoringConfig snapshot; without one the
+        built-in mechanics_config weights are used. Results are memoized per
+        snapshot key, since every phase/window query reuses them.
+        """
+        if config is not None:
+            key = config.key_for(boss_name)
+            cached = self._weights.get(key)
+            if cached is not None:
+                return cached
+            success_rules = config.success_rules_for(boss_name)
+            fail_rules = config.fail_rules_for(boss_name)
+        else:
+            key = None
+            success_rules = get_success_rules_for_boss(boss_name)
+            fail_rules = get_fail_rules_for_boss(boss_name)
+
+        fail_w: List[Optional[float]] = []
+        success_w: List[Optional[float]] = []
+        for label in self.labels:
+            f, s = classify_mechanic(label, success_rules, fail_rules)
+            fail_w.append(f)
+            success_w.append(s)
+
+        if key is not None:
+            if len(self._weights) >= 8:
+                self._weights.clear()
+            self._weights[key] = (fail_w, success_w)
+        return fail_w, success_w
+
+    def summarize(
+        self,
+        boss_name: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        config: Optional[Any] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        get_mechanic_summary-shaped result for events within [start, end].
+        """
+        fail_w, success_w = self.label_weights(boss_name, config)
+        labels = self.labels
+        result: Dict[str, Dict[str, Any]] = {}
+
+        for name in self.times:
+            fails: List[str] = []
+            success: List[str] = []
+            fail_score = 0.0
+            success_score = 0.0
+
+            lo, hi = self._bounds(name, start, end)
+            codes = self.codes[name]
+            for i in range(lo, hi):
+                code = codes[i]
+                w = fail_w[code]
+                if w is not None:
+                    fails.append(labels[code])
+                    fail_score += w
+                w = success_w[code]
+                if w is not None:
+                    success.append(labels[code])
+                    success_score += w
+
+            result[name] = {
+                "fails": fails,
+                "success": success,
+                "fail_score": fail_score,
+                "success_score": success_score,
+            }
+
+        return result
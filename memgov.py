@@ -0,0 +1,199 @@
+import asyncio
+import os
+import resource
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+import metrics
+from config import Config
+
+
+_MB = 1024 * 1024
+
+# Typical gzip ratio for EI JSON when the response is content-encoded
+COMPRESSED_JSON_RATIO = 8.0
+
+
+class MemoryBudgetExceeded(Exception):
+    """
+    Raised when a job cannot get its memory within the budget; the message
+    is meant for the user.
+    """
+
+
+def estimate_json_cost(content_length: Optional[int], content_encoding: Optional[str] = None) -> int:
+    """
+    Bytes to reserve for fetching and parsing one EI JSON response.
+    """
+    if not content_length:
+        return int(Config.MEMORY_UNKNOWN_JSON_MB * _MB)
+    decoded = float(content_length)
+    if content_encoding and content_encoding.lower() not in ("identity", ""):
+        decoded *= COMPRESSED_JSON_RATIO
+    # Parsed EI JSON (dicts, floats, strings) takes several times the size
+    # of the raw body; the body itself is alive while json.loads runs
+    return int(decoded * Config.MEMORY_JSON_FACTOR)
+
+
+def estimate_upload_cost(file_size: int) -> int:
+    """
+    Bytes to reserve while uploading a log: the file plus the multipart copy.
+    """
+    return int(file_size) * 2
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes (peak RSS where /proc is missing).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """
+    Highest resident set size this process reached, in bytes.
+    """
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryGovernor:
+    """
+    Admits memory-heavy work (uploads, EI JSON fetch + parse) only while the
+    sum of reservations stays within `budget` bytes.
+
+    Waiters are served in FIFO order so one large log is not starved by a
+    stream of small ones. A reservation that can never fit is rejected
+    immediately; one that waits longer than `queue_timeout` is rejected too.
+    """
+
+    def __init__(self, budget: int, queue_timeout: float) -> None:
+        self.budget = int(budget)
+        self.queue_timeout = queue_timeout
+        self.reserved = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def reservation(self) -> "Reservation":
+        return Reservation(self)
+
+    async def _acquire(self, nbytes: int) -> None:
+        if nbytes > self.budget:
+            metrics.MEMORY_ADMISSIONS.labels("too_large").inc()
+            raise MemoryBudgetExceeded(
+                f"This log needs about {nbytes / _MB:.0f} MB to process, more than the "
+                f"bot's {self.budget / _MB:.0f} MB budget."
+            )
+
+        if not self._waiters and self.reserved + nbytes <= self.budget:
+            self._take(nbytes)
+            metrics.MEMORY_ADMISSIONS.labels("admitted").inc()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (nbytes, future)
+        self._waiters.append(entry)
+        metrics.MEMORY_WAITING.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as we gave up: hand it back
+                self._release(nbytes)
+            else:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                # A large waiter at the head may have been blocking others
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.MEMORY_ADMISSIONS.labels("timeout").inc()
+                raise MemoryBudgetExceeded(
+                    "The bot is busy processing other large logs. Try again in a minute."
+                ) from None
+            raise
+        finally:
+            metrics.MEMORY_WAITING.set(len(self._waiters))
+        metrics.MEMORY_ADMISSIONS.labels("queued").inc()
+
+    def _take(self, nbytes: int) -> None:
+        self.reserved += nbytes
+        metrics.MEMORY_RESERVED_BYTES.set(self.reserved)
+
+    def _release(self, nbytes: int) -> None:
+        self.reserved = max(self.reserved - nbytes, 0)
+        metrics.MEMORY_RESERVED_BYTES.set(self.reserved)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.reserved + nbytes > self.budget:
+                break
+            self._waiters.popleft()
+            self._take(nbytes)
+            future.set_result(None)
+
+
+class Reservation:
+    """
+    Memory held by one command. Use as `async with governor.reservation() as r`
+    and call `resize()` as the job moves between stages; everything is
+    released on exit.
+
+    Growing first releases what is held and then waits for the full amount,
+    so a job never waits while holding memory (no deadlock between jobs).
+    """
+
+    def __init__(self, governor: MemoryGovernor) -> None:
+        self.governor = governor
+        self.held = 0
+
+    async def resize(self, nbytes: int) -> None:
+        nbytes = max(int(nbytes), 0)
+        if nbytes <= self.held:
+            self.governor._release(self.held - nbytes)
+            self.held = nbytes
+            return
+        self.release()
+        await self.governor._acquire(nbytes)
+        self.held = nbytes
+
+    async def for_response(self, resp) -> None:
+        """
+        before_body hook for dps_report_client: size the reservation from the
+        response headers before the body is read.
+        """
+        await self.resize(
+            estimate_json_cost(
+                resp.content_length, resp.headers.get("Content-Encoding")
+            )
+        )
+
+    def release(self) -> None:
+        if self.held:
+            self.governor._release(self.held)
+            self.held = 0
+
+    async def __aenter__(self) -> "Reservation":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+memory_governor = MemoryGovernor(
+    budget=int(Config.MEMORY_BUDGET_MB * _MB),
+    queue_timeout=Config.MEMORY_QUEUE_TIMEOUT,
+)
+
+metrics.register_collector(lambda: metrics.MEMORY_USED_BYTES.set(current_rss()))
@@ -0,0 +1,141 @@
+import time
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+import metrics
+
+
+NodeFn = Callable[..., Any]
+
+
+class MetricGraph:
+    """
+    Named metric nodes with declared dependencies:
+
+        graph = MetricGraph()
+
+        @graph.node("fail_counts", "mechanic_summary")
+        def _fail_counts(m, mechanic_summary): ...
+
+    A node function gets the LazyMetrics it is evaluated for (for
+    .encounter / .phase_index / .config) followed by its dependencies'
+    values, in the declared order. Dependencies must be registered first,
+    which also rules out cycles.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: Dict[str, Tuple[Tuple[str, ...], NodeFn]] = {}
+
+    def node(self, name: str, *deps: str) -> Callable[[NodeFn], NodeFn]:
+        def register(fn: NodeFn) -> NodeFn:
+            if name in self.nodes:
+                raise ValueError(f"metric node {name!r} is already defined")
+            missing = [d for d in deps if d not in self.nodes]
+            if missing:
+                raise ValueError(f"metric node {name!r} depends on unknown {missing}")
+            self.nodes[name] = (tuple(deps), fn)
+            return fn
+
+        return register
+
+
+class LazyMetrics(Mapping):
+    """
+    Read-only mapping over a MetricGraph for one (encounter, phase, config):
+    a node is computed the first time it (or something depending on it) is
+    looked up, then kept. Commands read it like the old metrics dict and
+    only pay for the nodes they touch.
+
+    The copy memoized on an encounter is unbound (no encounter/config), so
+    the encounter does not end up in a reference cycle with its own metrics
+    and is freed as soon as it leaves the cache. bound() gives a view that
+    shares its values with the encounter attached, for one lookup. Pickling
+    likewise keeps the computed values only.
+    """
+
+    def __init__(
+        self,
+        graph: MetricGraph,
+        encounter: Optional[Dict[str, Any]],
+        phase_index: int,
+        config: Any,
+        values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.graph = graph
+        self.encounter = encounter
+        self.phase_index = phase_index
+        self.config = config
+        self._values: Dict[str, Any] = dict(values or {})
+
+    def bound(self, encounter: Dict[str, Any], config: Any) -> "LazyMetrics":
+        """
+        A view for `encounter`/`config` sharing (and adding to) these values.
+        """
+        view = LazyMetrics(self.graph, encounter, self.phase_index, config)
+        view._values = self._values
+        return view
+
+    def computed(self) -> Tuple[str, ...]:
+        return tuple(self._values)
+
+    def evaluate_all(self) -> "LazyMetrics":
+        for name in self.graph.nodes:
+            self[name]
+        return self
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            value = self._values[name]
+        except KeyError:
+            pass
+        else:
+            metrics.METRIC_NODE_EVALUATIONS.labels(name, "reused").inc()
+            return value
+
+        spec = self.graph.nodes.get(name)
+        if spec is None:
+            raise KeyError(name)
+        if self.encounter is None:
+            raise RuntimeError(f"metric node {name!r} needs an encounter; use bound()")
+        deps, fn = spec
+        args = [self._get_quiet(dep) for dep in deps]
+
+        started = time.perf_counter()
+        value = fn(self, *args)
+        metrics.ENCOUNTER_COMPUTE_DURATION.labels(name).observe(time.perf_counter() - started)
+        metrics.METRIC_NODE_EVALUATIONS.labels(name, "computed").inc()
+        self._values[name] = value
+        return value
+
+    def _get_quiet(self, name: str) -> Any:
+        # Dependencies resolved on the way are not counted as reuse
+        if name in self._values:
+            return self._values[name]
+        return self[name]
+
+    def _names(self) -> Tuple[str, ...]:
+        # Graph nodes plus any values seeded at construction
+        extra = tuple(k for k in self._values if k not in self.graph.nodes)
+        return tuple(self.graph.nodes) + extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names())
+
+    def __len__(self) -> int:
+        return len(self._names())
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.graph.nodes or name in self._values
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "graph": self.graph,
+            "phase_index": self.phase_index,
+            "values": self._values,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.graph = state["graph"]
+        self.phase_index = state["phase_index"]
+        self._values = state["values"]
+        self.encounter = None
+        self.config = None
@@ -0,0 +1,542 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+
+# ---------------------------------------------------------------------------
+# Bucket presets
+# ---------------------------------------------------------------------------
+
+# Seconds: covers a fast cache hit up to a slow 150 MB EI JSON download.
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Bytes: 1 KiB .. 256 MiB in powers of 4.
+SIZE_BUCKETS: Tuple[float, ...] = tuple(float(1024 * 4 ** i) for i in range(10))
+
+
+# ---------------------------------------------------------------------------
+# Metric primitives
+#
+# Children are created once per label combination and then only mutate
+# preallocated slots, so observing a value never allocates. Callers on hot
+# paths should keep a reference to the child returned by `labels()`.
+# ---------------------------------------------------------------------------
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # Last slot is the implicit +Inf bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Timer:
+    """
+    Context manager observing the elapsed wall time into a histogram child.
+    """
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child: _HistogramChild) -> None:
+        self._child = child
+        self._started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        _REGISTRY.append(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        A fresh child holding one label combination's value.
+        """
+
+    def labels(self, *values: str):
+        """
+        Return the child for the given label values, creating it on first use.
+        """
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {key}"
+                )
+            child = self._new_child()
+            self._children[key] = child
+        return child
+
+    def _label_str(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [
+            f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)
+        ]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.doc}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for key, child in self._children.items():
+            out.append(f"{self.name}{self._label_str(key)} {_fmt(child.value)}")
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labelnames: Sequence[str] = (),
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return _Timer(self._default)
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.doc}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = self._label_str(key, f'le="{_fmt(bound)}"')
+                out.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += child.counts[-1]
+            le = self._label_str(key, 'le="+Inf"')
+            out.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = self._label_str(key)
+            out.append(f"{self.name}_sum{labels} {_fmt(child.sum)}")
+            out.append(f"{self.name}_count{labels} {child.count}")
+
+
+def time_histogram(child: _HistogramChild) -> _Timer:
+    """
+    `with time_histogram(HIST.labels("x")):` for labelled histograms.
+    """
+    return _Timer(child)
+
+
+_REGISTRY: List[_Metric] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    """
+    Call `fn` before every render, for gauges that are cheaper to read on
+    scrape than to keep updated (e.g. process memory).
+    """
+    _COLLECTORS.append(fn)
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    for collector in _COLLECTORS:
+        try:
+            collector()
+        except Exception:
+            pass
+    out: List[str] = []
+    for metric in _REGISTRY:
+        metric.render(out)
+    out.append("")
+    return "\n".join(out)
+
+
+# ---------------------------------------------------------------------------
+# Bot metrics
+# ---------------------------------------------------------------------------
+
+COMMANDS_TOTAL = Counter(
+    "gw2bot_commands_total",
+    "Bot commands invoked, by command and outcome.",
+    ("command", "outcome"),
+)
+COMMAND_DURATION = Histogram(
+    "gw2bot_command_duration_seconds",
+    "Wall time spent handling a bot command.",
+    ("command",),
+)
+
+DPS_REPORT_REQUESTS = Counter(
+    "gw2bot_dps_report_requests_total",
+    "Requests made to dps.report, by endpoint and HTTP status.",
+    ("endpoint", "status"),
+)
+DPS_REPORT_DURATION = Histogram(
+    "gw2bot_dps_report_request_seconds",
+    "Duration of dps.report requests, including the body download.",
+    ("endpoint",),
+)
+DPS_REPORT_RESPONSE_BYTES = Histogram(
+    "gw2bot_dps_report_response_bytes",
+    "Size of dps.report response bodies.",
+    ("endpoint",),
+    buckets=SIZE_BUCKETS,
+)
+DPS_REPORT_UPLOAD_BYTES = Histogram(
+    "gw2bot_dps_report_upload_bytes",
+    "Size of log files uploaded to dps.report.",
+    buckets=SIZE_BUCKETS,
+)
+METRIC_NODE_EVALUATIONS = Counter(
+    "gw2bot_metric_node_evaluations_total",
+    "Per-phase metric node lookups, by node and outcome (computed/reused).",
+    ("node", "outcome"),
+)
+EI_JSON_VARIANT = Counter(
+    "gw2bot_ei_json_variant_total",
+    "EI JSON fetches by the getJson parameter that served them (id/permalink).",
+    ("variant",),
+)
+EI_JSON_HEDGES = Counter(
+    "gw2bot_ei_json_hedges_total",
+    "Hedged id/permalink requests: launched, and which variant won.",
+    ("outcome",),
+)
+UNAVAILABLE_REPORTS = Counter(
+    "gw2bot_unavailable_reports_total",
+    "Reports without accessible EI JSON: recorded in the negative cache, or answered from it.",
+    ("reason", "action"),
+)
+EI_JSON_BYTES = Histogram(
+    "gw2bot_ei_json_bytes",
+    "Size of Elite Insights JSON documents fetched from dps.report.",
+    buckets=SIZE_BUCKETS,
+)
+
+ENCOUNTER_COMPUTE_DURATION = Histogram(
+    "gw2bot_encounter_compute_seconds",
+    "Time spent computing encounter metrics, by stage (build, or the per-phase metric node).",
+    ("stage",),
+)
+
+CHART_RENDER_DURATION = Histogram(
+    "gw2bot_chart_render_seconds",
+    "Time to render a !graph PNG in the chart process pool (including queueing).",
+)
+EVENT_LOOP_LAG = Gauge(
+    "gw2bot_event_loop_lag_seconds",
+    "Most recent event loop scheduling lag.",
+)
+EVENT_LOOP_LAG_HIST = Histogram(
+    "gw2bot_event_loop_lag_distribution_seconds",
+    "Distribution of event loop scheduling lag.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = Counter(
+    "gw2bot_loop_stalls_total",
+    "Event loop stalls over STALL_THRESHOLD, by what was running (command name, api, ...).",
+    ("kind",),
+)
+LOOP_STALL_SECONDS = Histogram(
+    "gw2bot_loop_stall_seconds",
+    "Duration of event loop stalls over STALL_THRESHOLD.",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+CACHE_REQUESTS = Counter(
+    "gw2bot_cache_requests_total",
+    "Cache lookups, by cache name and result (hit/miss).",
+    ("cache", "result"),
+)
+
+
+def cache_counters(cache: str) -> Tuple[_CounterChild, _CounterChild]:
+    """
+    Return the (hit, miss) counter children for a named cache.
+    """
+    return (
+        CACHE_REQUESTS.labels(cache, "hit"),
+        CACHE_REQUESTS.labels(cache, "miss"),
+    )
+
+
+UPLOAD_BYTES_SAVED = Counter(
+    "gw2bot_upload_bytes_saved_total",
+    "Log bytes not sent to dps.report, by reason (duplicate/compression).",
+    ("reason",),
+)
+EVTC_COMPRESS_DURATION = Histogram(
+    "gw2bot_evtc_compress_seconds",
+    "Time spent recompressing raw .evtc attachments to .zevtc.",
+)
+
+EXPORT_ROWS = Counter(
+    "gw2bot_export_rows_total",
+    "Per-player rows exported, by file format and outcome (written/error).",
+    ("format", "outcome"),
+)
+EXPORT_FLUSH_DURATION = Histogram(
+    "gw2bot_export_flush_seconds",
+    "Time spent writing one batch of exported rows.",
+)
+
+ADMISSION_DECISIONS = Counter(
+    "gw2bot_admission_decisions_total",
+    "Admission control decisions, by command, decision (admitted/queued/rejected) "
+    "and the bucket that decided (user/guild/global).",
+    ("command", "decision", "scope"),
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "gw2bot_admission_queue_wait_seconds",
+    "Time queued commands waited for their budget.",
+)
+ADMISSION_COST_ESTIMATE = Gauge(
+    "gw2bot_admission_cost_estimate_seconds",
+    "Learned cost estimate per command and report kind (uploads: per MB).",
+    ("command", "kind"),
+)
+
+OUTBOUND_REQUESTS = Counter(
+    "gw2bot_outbound_requests_total",
+    "Discord message requests made by the outbound scheduler (send/edit).",
+    ("kind",),
+)
+OUTBOUND_SAVED = Counter(
+    "gw2bot_outbound_messages_saved_total",
+    "Discord requests avoided by the outbound scheduler, by reason.",
+    ("reason",),
+)
+OUTBOUND_WAIT = Counter(
+    "gw2bot_outbound_rate_limit_wait_seconds_total",
+    "Seconds spent waiting on rate limits, by bucket.",
+    ("bucket",),
+)
+OUTBOUND_QUEUED = Gauge(
+    "gw2bot_outbound_queued_messages",
+    "Messages waiting in the outbound scheduler.",
+)
+
+MEMORY_RESERVED_BYTES = Gauge(
+    "gw2bot_memory_reserved_bytes",
+    "Memory currently reserved by admitted jobs (memory governor estimate).",
+)
+MEMORY_USED_BYTES = Gauge(
+    "gw2bot_memory_used_bytes",
+    "Resident set size of the bot process.",
+)
+MEMORY_WAITING = Gauge(
+    "gw2bot_memory_waiting_jobs",
+    "Jobs waiting for memory budget.",
+)
+MEMORY_ADMISSIONS = Counter(
+    "gw2bot_memory_admissions_total",
+    "Memory governor decisions (admitted/queued/timeout/too_large).",
+    ("outcome",),
+)
+
+STARTUP_SECONDS = Gauge(
+    "gw2bot_startup_seconds",
+    "Duration of each startup stage of the last boot.",
+    ("stage",),
+)
+
+SESSIONS_ACTIVE = Gauge(
+    "gw2bot_sessions_active",
+    "Channels with a live !session scoreboard.",
+)
+SESSION_LOGS = Counter(
+    "gw2bot_session_logs_total",
+    "Logs folded into live session scoreboards.",
+)
+SESSION_SCOREBOARD_UPDATES = Counter(
+    "gw2bot_session_scoreboard_updates_total",
+    "Scoreboard refreshes, by outcome (edited/debounced/reposted).",
+    ("outcome",),
+)
+
+API_REQUESTS = Counter(
+    "gw2bot_api_requests_total",
+    "HTTP API requests, by endpoint (encounter/metric) and status code.",
+    ("endpoint", "status"),
+)
+API_DURATION = Histogram(
+    "gw2bot_api_request_seconds",
+    "HTTP API request handling time, by endpoint.",
+    ("endpoint",),
+)
+API_IN_FLIGHT = Gauge(
+    "gw2bot_api_in_flight",
+    "HTTP API requests currently loading or computing an encounter.",
+)
+
+JOBS_TOTAL = Counter(
+    "gw2bot_jobs_total",
+    "Reports requested from the worker queue, by outcome (cached/done/failed/timeout).",
+    ("outcome",),
+)
+JOB_WAIT = Histogram(
+    "gw2bot_job_wait_seconds",
+    "Time from queueing a report until a worker result (or failure) arrived.",
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "gw2bot_job_queue_depth",
+    "Queued or running worker jobs, as last seen by the gateway.",
+)
+
+
+# ---------------------------------------------------------------------------
+# Background helpers
+# ---------------------------------------------------------------------------
+
+async def monitor_event_loop_lag(interval: float = 1.0) -> None:
+    """
+    Sleep for `interval` in a loop and record how late each wake-up was.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - expected, 0.0)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HIST.observe(lag)
+
+
+async def _handle_metrics(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(
+        text=render_metrics(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> "web.AppRunner":
+    """
+    Serve `/metrics` on host:port from the running event loop.
+    aiohttp.web is imported here, so it costs nothing when metrics are off.
+    """
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+_lag_task: Optional[asyncio.Task] = None
+
+
+def start_event_loop_monitor(interval: float = 1.0) -> asyncio.Task:
+    """
+    Start (once) the background event loop lag monitor.
+    """
+    global _lag_task
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.get_running_loop().create_task(
+            monitor_event_loop_lag(interval)
+        )
+    return _lag_task
@@ -0,0 +1,320 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+import metrics
+from config import Config
+from ratelimit import TokenBucket
+
+
+# Lower value = sent first
+PRIORITY_RESULT = 0
+PRIORITY_FOLLOWUP = 1
+PRIORITY_STATUS = 2
+
+_MAX_CONTENT = 2000
+
+
+class _Outgoing:
+    __slots__ = ("priority", "seq", "key", "kwargs", "future", "dropped")
+
+    def __init__(self, priority: int, seq: int, key: int, kwargs: Dict[str, Any]) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.kwargs = kwargs
+        self.future: "asyncio.Future[Optional[discord.Message]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.dropped = False
+
+    def __lt__(self, other: "_Outgoing") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def is_plain_text(self) -> bool:
+        return set(self.kwargs) == {"content"}
+
+
+class _ChannelQueue:
+    """
+    Pending messages for one channel, drained by one worker task against the
+    channel's own token bucket, so a busy channel only ever waits on itself.
+    """
+
+    def __init__(self, channel: discord.abc.Messageable, capacity: float, period: float) -> None:
+        self.channel = channel
+        self.heap: List[_Outgoing] = []
+        self.bucket = TokenBucket(capacity, period)
+        self.worker: Optional[asyncio.Task] = None
+        # invocation key -> queued (unsent) status item
+        self.pending_status: Dict[int, _Outgoing] = {}
+        # invocation key -> status message already on Discord
+        self.status_messages: "OrderedDict[int, discord.Message]" = OrderedDict()
+        # invocation keys whose final result is queued
+        self.finishing: set = set()
+
+
+class OutboundScheduler:
+    """
+    Central queue for everything the bot sends to Discord.
+
+      status(ctx, text)   progress chatter ("Fetching…"); fire-and-forget.
+                          Repeated status for one command edits a single
+                          message, and unsent status is dropped once the
+                          command's result is queued.
+      send(ctx, ...)      results and errors. The first result of a command
+                          replaces its status message in place (one edit
+                          instead of a new message); plain-text follow-ups
+                          queued for the same channel are batched.
+
+    Results are sent before follow-ups before status, per channel. Each
+    channel has its own token bucket and worker; a global bucket caps the
+    total request rate.
+    """
+
+    def __init__(
+        self,
+        channel_capacity: float = 5,
+        channel_period: float = 5.0,
+        global_capacity: float = 40,
+        global_period: float = 1.0,
+    ) -> None:
+        self.channel_capacity = channel_capacity
+        self.channel_period = channel_period
+        self.global_bucket = TokenBucket(global_capacity, global_period)
+        self._queues: Dict[int, _ChannelQueue] = {}
+        self._seq = itertools.count()
+
+        self._saved_coalesced = metrics.OUTBOUND_SAVED.labels("coalesced")
+        self._saved_superseded = metrics.OUTBOUND_SAVED.labels("superseded")
+        self._saved_batched = metrics.OUTBOUND_SAVED.labels("batched")
+        self._saved_edit = metrics.OUTBOUND_SAVED.labels("result_edit")
+        self._wait_channel = metrics.OUTBOUND_WAIT.labels("channel")
+        self._wait_global = metrics.OUTBOUND_WAIT.labels("global")
+        self._sent_new = metrics.OUTBOUND_REQUESTS.labels("send")
+        self._sent_edit = metrics.OUTBOUND_REQUESTS.labels("edit")
+
+    # -- public API ---------------------------------------------------------
+
+    def status(self, ctx: commands.Context, text: str) -> None:
+        """
+        Queue a progress message for this command invocation.
+        """
+        q = self._queue(ctx.channel)
+        key = ctx.message.id
+        if key in q.finishing:
+            self._saved_superseded.inc()
+            return
+
+        pending = q.pending_status.get(key)
+        if pending is not None and not pending.dropped:
+            pending.kwargs["content"] = text
+            self._saved_coalesced.inc()
+            return
+
+        item = self._enqueue(q, PRIORITY_STATUS, key, {"content": text})
+        # Nobody awaits status; keep failures from being reported as unretrieved
+        item.future.add_done_callback(_consume_result)
+        q.pending_status[key] = item
+
+    async def send(
+        self,
+        ctx: commands.Context,
+        content: Optional[str] = None,
+        *,
+        followup: bool = False,
+        **kwargs: Any,
+    ) -> Optional[discord.Message]:
+        """
+        Queue a result (or, with followup=True, a secondary message) and wait
+        until it is on Discord. Accepts the same keywords as ctx.send.
+        """
+        q = self._queue(ctx.channel)
+        key = ctx.message.id
+        if content is not None:
+            kwargs["content"] = content
+
+        priority = PRIORITY_FOLLOWUP if followup else PRIORITY_RESULT
+        if not followup:
+            q.finishing.add(key)
+            pending = q.pending_status.pop(key, None)
+            if pending is not None:
+                pending.dropped = True
+                pending.future.set_result(None)
+                self._saved_superseded.inc()
+
+        item = self._enqueue(q, priority, key, kwargs)
+        return await item.future
+
+    async def edit(
+        self,
+        message: "discord.Message | discord.PartialMessage",
+        **kwargs: Any,
+    ) -> discord.Message:
+        """
+        Edit a message the bot posted earlier (e.g. a pinned scoreboard),
+        within the same channel and global budgets as queued messages.
+        """
+        q = self._queue(message.channel)
+        self._wait_channel.inc(await q.bucket.acquire())
+        self._wait_global.inc(await self.global_bucket.acquire())
+        self._sent_edit.inc()
+        return await message.edit(**kwargs)
+
+    # -- internals ----------------------------------------------------------
+
+    def _queue(self, channel: discord.abc.Messageable) -> _ChannelQueue:
+        channel_id = getattr(channel, "id", id(channel))
+        q = self._queues.get(channel_id)
+        if q is None:
+            q = _ChannelQueue(channel, self.channel_capacity, self.channel_period)
+            self._queues[channel_id] = q
+        return q
+
+    def _enqueue(self, q: _ChannelQueue, priority: int, key: int, kwargs: Dict[str, Any]) -> _Outgoing:
+        item = _Outgoing(priority, next(self._seq), key, kwargs)
+        heapq.heappush(q.heap, item)
+        metrics.OUTBOUND_QUEUED.inc()
+        if q.worker is None or q.worker.done():
+            q.worker = asyncio.get_running_loop().create_task(self._drain(q))
+        return item
+
+    def _pop_live(self, q: _ChannelQueue) -> Optional[_Outgoing]:
+        while q.heap:
+            item = heapq.heappop(q.heap)
+            metrics.OUTBOUND_QUEUED.dec()
+            if not item.dropped:
+                return item
+        return None
+
+    async def _drain(self, q: _ChannelQueue) -> None:
+        while q.heap:
+            # Wait for budget first: messages keep arriving meanwhile, so the
+            # highest priority one is picked and more can be batched.
+            self._wait_channel.inc(await q.bucket.acquire())
+            self._wait_global.inc(await self.global_bucket.acquire())
+
+            item = self._pop_live(q)
+            if item is None:
+                # Everything was superseded while we waited
+                q.bucket.refund()
+                self.global_bucket.refund()
+                break
+
+            batch = [item]
+            if item.priority == PRIORITY_FOLLOWUP and item.is_plain_text():
+                batch.extend(self._take_batch(q, len(item.kwargs["content"])))
+
+            try:
+                message = await self._deliver(q, batch)
+            except Exception as e:
+                for it in batch:
+                    if not it.future.done():
+                        it.future.set_exception(e)
+                continue
+
+            for it in batch:
+                if not it.future.done():
+                    it.future.set_result(message)
+
+    def _take_batch(self, q: _ChannelQueue, length: int) -> List[_Outgoing]:
+        """
+        Pop further plain-text follow-ups that fit in the same message.
+        """
+        extra: List[_Outgoing] = []
+        while q.heap:
+            nxt = q.heap[0]
+            if nxt.dropped:
+                heapq.heappop(q.heap)
+                metrics.OUTBOUND_QUEUED.dec()
+                continue
+            if nxt.priority != PRIORITY_FOLLOWUP or not nxt.is_plain_text():
+                break
+            added = len(nxt.kwargs["content"]) + 1
+            if length + added > _MAX_CONTENT:
+                break
+            heapq.heappop(q.heap)
+            metrics.OUTBOUND_QUEUED.dec()
+            extra.append(nxt)
+            length += added
+        self._saved_batched.inc(len(extra))
+        return extra
+
+    async def _deliver(self, q: _ChannelQueue, batch: List[_Outgoing]) -> discord.Message:
+        item = batch[0]
+        kwargs = dict(item.kwargs)
+        if len(batch) > 1:
+            kwargs["content"] = "\n".join(it.kwargs["content"] for it in batch)
+
+        if item.priority == PRIORITY_STATUS:
+            q.pending_status.pop(item.key, None)
+            existing = q.status_messages.get(item.key)
+            if existing is not None:
+                self._sent_edit.inc()
+                return await existing.edit(content=kwargs["content"])
+            message = await q.channel.send(**kwargs)
+            self._sent_new.inc()
+            q.status_messages[item.key] = message
+            while len(q.status_messages) > 256:
+                q.status_messages.popitem(last=False)
+            return message
+
+        if item.priority == PRIORITY_RESULT:
+            q.finishing.discard(item.key)
+            existing = q.status_messages.pop(item.key, None)
+            if existing is not None and "file" not in kwargs and "files" not in kwargs:
+                kwargs.setdefault("content", None)
+                kwargs.setdefault("embed", None)
+                try:
+                    message = await existing.edit(**kwargs)
+                    self._sent_edit.inc()
+                    self._saved_edit.inc()
+                    return message
+                except discord.NotFound:
+                    # Status message was deleted, fall back to a new one
+                    kwargs = dict(item.kwargs)
+
+        message = await q.channel.send(**kwargs)
+        self._sent_new.inc()
+        return message
+
+
+def _consume_result(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class _DiscordRateLimitLogHandler(logging.Handler):
+    """
+    discord.py waits out HTTP 429s itself and only logs them; count the time.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if "rate limited" not in str(record.msg):
+                return
+            retry_after = next(
+                (a for a in reversed(record.args or ()) if isinstance(a, (int, float))),
+                None,
+            )
+            if retry_after is not None:
+                metrics.OUTBOUND_WAIT.labels("discord_429").inc(float(retry_after))
+        except Exception:
+            pass
+
+
+def install_rate_limit_logging() -> None:
+    logging.getLogger("discord.http").addHandler(_DiscordRateLimitLogHandler())
+
+
+outbound = OutboundScheduler(
+    channel_capacity=Config.OUTBOUND_CHANNEL_RATE,
+    channel_period=Config.OUTBOUND_CHANNEL_PERIOD,
+    global_capacity=Config.OUTBOUND_GLOBAL_RATE,
+)
@@ -0,0 +1,188 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Awaitable, Optional
+
+
+# Only one cProfile session can be active per interpreter.
+_profile_lock = asyncio.Lock()
+
+
+# ---------------------------------------------------------------------------
+# On-demand profiling (cProfile + tracemalloc)
+# ---------------------------------------------------------------------------
+
+async def profile_awaitable(
+    awaitable: Awaitable,
+    title: str,
+    top_n: int = 40,
+) -> str:
+    """
+    Await `awaitable` under cProfile and tracemalloc and return a text report
+    with the top functions by cumulative time and the top allocation sites.
+
+    The profiler sees the whole event-loop thread while it is enabled, so
+    other commands running concurrently also show up in the report.
+    """
+    async with _profile_lock:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile()
+        error: Optional[BaseException] = None
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await awaitable
+        except Exception as e:  # report it, the profile is still useful
+            error = e
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+    out = io.StringIO()
+    out.write(f"Profile: {title}\n")
+    out.write(f"Wall time: {elapsed:.3f}s\n")
+    out.write(
+        f"Traced memory: current={current / 1024 / 1024:.1f} MiB, "
+        f"peak={peak / 1024 / 1024:.1f} MiB\n"
+    )
+    if error is not None:
+        out.write(f"Command raised: {error!r}\n")
+
+    out.write(f"\n=== Top {top_n} functions by cumulative time ===\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+
+    out.write(f"\n=== Top {top_n} allocation sites (still alive at end) ===\n")
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+    for stat in snapshot.statistics("lineno")[:top_n]:
+        frame = stat.traceback[0]
+        out.write(
+            f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  "
+            f"{frame.filename}:{frame.lineno}\n"
+        )
+
+    return out.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Low-overhead periodic sampling of the event-loop thread
+# ---------------------------------------------------------------------------
+
+class LoopSampler(threading.Thread):
+    """
+    Background thread that periodically samples the event-loop thread's stack.
+
+    Each sample is a single `sys._current_frames()` lookup plus a walk of the
+    frame chain, done on this thread, so the loop itself does no extra work.
+    Stacks are aggregated as folded strings ("outer;inner;leaf"), which can
+    be fed straight into flamegraph tools.
+    """
+
+    MAX_STACKS = 5000
+
+    def __init__(self, target_thread_id: int, interval: float = 0.05) -> None:
+        super().__init__(name="loop-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.samples = 0
+        self.started_at = time.time()
+        self._stacks: Counter = Counter()
+        self._leaves: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            f = frame
+            while f is not None:
+                code = f.f_code
+                names.append(f"{code.co_name} ({code.co_filename}:{f.f_lineno})")
+                f = f.f_back
+            leaf = names[0]
+            folded = ";".join(reversed(names))
+
+            with self._lock:
+                self.samples += 1
+                self._leaves[leaf] += 1
+                if folded in self._stacks or len(self._stacks) < self.MAX_STACKS:
+                    self._stacks[folded] += 1
+                else:
+                    self._stacks["[other]"] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = 0
+            self.started_at = time.time()
+            self._stacks.clear()
+            self._leaves.clear()
+
+    def report(self, top_n: int = 40) -> str:
+        """
+        Text report: top leaf frames followed by every folded stack.
+        """
+        with self._lock:
+            samples = self.samples
+            leaves = self._leaves.most_common(top_n)
+            stacks = sorted(self._stacks.items(), key=lambda kv: kv[1], reverse=True)
+
+        out = io.StringIO()
+        out.write(
+            f"Event loop samples: {samples} "
+            f"(every {self.interval * 1000:.0f} ms over "
+            f"{time.time() - self.started_at:.0f}s)\n"
+        )
+        out.write(f"\n=== Top {top_n} frames on the loop thread ===\n")
+        for leaf, count in leaves:
+            pct = (count / samples * 100.0) if samples else 0.0
+            out.write(f"{pct:6.2f}%  {count:8d}  {leaf}\n")
+
+        out.write("\n=== Folded stacks ===\n")
+        for folded, count in stacks:
+            out.write(f"{folded} {count}\n")
+        return out.getvalue()
+
+
+_sampler: Optional[LoopSampler] = None
+
+
+def start_loop_sampler(interval: float) -> LoopSampler:
+    """
+    Start (once) sampling the calling thread, which should be the loop thread.
+    """
+    global _sampler
+    if _sampler is None:
+        _sampler = LoopSampler(threading.get_ident(), interval=interval)
+        _sampler.start()
+    return _sampler
+
+
+def get_loop_sampler() -> Optional[LoopSampler]:
+    return _sampler
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Classic token bucket: up to `capacity` tokens, refilled at
+    `capacity / period` tokens per second.
+    """
+
+    __slots__ = ("capacity", "fill_rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, period: float) -> None:
+        self.capacity = float(capacity)
+        self.fill_rate = self.capacity / max(float(period), 1e-9)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: Optional[float] = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.fill_rate)
+            self.updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take `tokens` now (possibly going into debt) and return how many
+        seconds the caller has to wait before using them.
+        """
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.fill_rate
+
+    def try_acquire(self, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `tokens` only if available. Returns (ok, retry_after_seconds).
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True, 0.0
+        return False, (tokens - self.tokens) / self.fill_rate
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until `tokens` would be available, without taking them.
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.fill_rate
+
+    def refund(self, tokens: float = 1.0) -> None:
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Wait until `tokens` are available; returns the seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,192 @@
+"""
+Recompute every metric over a directory of saved Elite Insights JSON files,
+offline, e.g. to see how past MVPs change with new scoring weights:
+
+    python reprocess.py logs/ --output results.jsonl
+    python reprocess.py logs/ --scoring-config new_weights.json --processes 4
+    python reprocess.py logs/ --export-dir data/export       # also columnar rows
+
+Files are `*.json` or `*.json.gz` (searched recursively). Each one goes
+through the same encounter_from_json / compute_phase_metrics code as the
+bot, in a multiprocessing pool; results are streamed to --output as JSON
+lines (one per file) in completion order. Progress shows files/sec, and the
+summary the peak memory of each worker process.
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from encounter import compute_phase_metrics, encounter_from_json
+from export import encounter_rows, open_exporter
+from memgov import peak_rss
+import scoring_config
+
+
+PROGRESS_EVERY = 5.0
+
+# Phase metrics written per phase (the rest of the graph is intermediate)
+OUTPUT_METRICS = (
+    "mvp_name",
+    "mvp_scores",
+    "damage_share",
+    "fail_counts",
+    "fail_score_map",
+    "mech_success_scores",
+    "support_scores",
+)
+
+_MB = 1024 * 1024
+
+
+def find_logs(root: str) -> List[str]:
+    found = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith((".json", ".json.gz")):
+                found.append(os.path.join(directory, name))
+    found.sort()
+    return found
+
+
+def load_ei_json(path: str) -> dict:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return json.load(f)
+
+
+def report_id_for(path: str) -> str:
+    name = os.path.basename(path)
+    for suffix in (".json.gz", ".json"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _init_worker(scoring_path: Optional[str]) -> None:
+    scoring_config.init_scoring_config(scoring_path)
+
+
+def process_file(task: Tuple[str, bool]) -> Dict[str, Any]:
+    """
+    Worker: one EI JSON file -> result dict (plus export rows when asked).
+    Never raises; failures come back as {"error": ...}.
+    """
+    path, with_rows = task
+    started = time.perf_counter()
+    report_id = report_id_for(path)
+    result: Dict[str, Any] = {"file": path, "report_id": report_id}
+    try:
+        encounter = encounter_from_json(load_ei_json(path))
+        phases = []
+        for phase in encounter["phase_table"]["phases"]:
+            m = compute_phase_metrics(encounter, phase["index"]).evaluate_all()
+            entry = {"index": phase["index"], "name": phase["name"]}
+            entry.update((name, m[name]) for name in OUTPUT_METRICS)
+            phases.append(entry)
+        result.update(
+            boss=encounter["boss_name"],
+            success=encounter["success"],
+            is_cm=encounter["is_cm"],
+            duration=encounter["duration"],
+            time_start=encounter.get("time_start"),
+            scoring_key=scoring_config.current().key_for(encounter["boss_name"]),
+            phases=phases,
+        )
+        if with_rows:
+            result["rows"] = encounter_rows(report_id, encounter)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - started
+    result["pid"] = os.getpid()
+    result["peak_rss"] = peak_rss()
+    return result
+
+
+def run(
+    files: List[str],
+    processes: int,
+    scoring_path: Optional[str],
+    with_rows: bool,
+) -> Iterator[Dict[str, Any]]:
+    tasks = [(path, with_rows) for path in files]
+    if processes <= 1:
+        _init_worker(scoring_path)
+        for task in tasks:
+            yield process_file(task)
+        return
+    # A worker is replaced after a few hundred logs so one huge file's
+    # heap does not stay with it for the rest of the run
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(scoring_path,),
+        maxtasksperchild=200,
+    ) as pool:
+        yield from pool.imap_unordered(process_file, tasks, chunksize=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute metrics over saved EI JSON files")
+    parser.add_argument("input", help="directory with .json / .json.gz EI files")
+    parser.add_argument("--output", default="reprocess.jsonl", help="JSON lines output file")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--scoring-config",
+        default=Config.SCORING_CONFIG_PATH,
+        help="scoring weights file (default: SCORING_CONFIG_PATH)",
+    )
+    parser.add_argument("--export-dir", default="", help="also write per-player rows here")
+    parser.add_argument("--export-format", default=Config.EXPORT_FORMAT)
+    args = parser.parse_args()
+
+    files = find_logs(args.input)
+    if not files:
+        raise SystemExit(f"No .json / .json.gz files under {args.input}")
+    exporter = open_exporter(args.export_dir, args.export_format, Config.EXPORT_BATCH_ROWS)
+
+    print(f"Reprocessing {len(files)} files with {args.processes} process(es)")
+    started = time.perf_counter()
+    last_progress = started
+    done = failed = 0
+    # pid -> [files, peak RSS bytes]
+    workers: Dict[int, List[int]] = {}
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        for result in run(files, args.processes, args.scoring_config or None, exporter is not None):
+            done += 1
+            stats = workers.setdefault(result.pop("pid"), [0, 0])
+            stats[0] += 1
+            stats[1] = max(stats[1], result.pop("peak_rss"))
+
+            rows = result.pop("rows", None)
+            if rows and exporter is not None and exporter.add_rows(result["report_id"], rows):
+                exporter.flush()
+            if "error" in result:
+                failed += 1
+                print(f"[WARN] {result['file']}: {result['error']}")
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_EVERY:
+                last_progress = now
+                print(f"{done}/{len(files)} files, {done / (now - started):.1f} files/s")
+
+    if exporter is not None:
+        exporter.flush()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Done: {done} files ({failed} failed) in {elapsed:.1f}s, "
+        f"{done / elapsed:.1f} files/s -> {args.output}"
+    )
+    for pid, (count, peak) in sorted(workers.items()):
+        print(f"  worker {pid}: {count} files, peak RSS {peak / _MB:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
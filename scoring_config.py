@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from gw2_stats import BOON_GENERATION_WEIGHTS, IMPORTANT_BOONS
+from mechanics_config import FAILED_MECHANICS_CONFIG, SUCCESS_MECHANICS_CONFIG
+from scoring import MVP_WEIGHTS, SUPPORT_WEIGHTS
+
+
+class ScoringConfigError(ValueError):
+    pass
+
+
+def _digest(obj: Any) -> str:
+    blob = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:12]
+
+
+def _weights(section: str, raw: Any) -> Mapping[str, float]:
+    if not isinstance(raw, dict):
+        raise ScoringConfigError(f"{section}: expected an object")
+    out: Dict[str, float] = {}
+    for key, value in raw.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ScoringConfigError(f"{section}.{key}: expected a number, got {value!r}")
+        out[str(key)] = float(value)
+    return MappingProxyType(out)
+
+
+def _boss_rules(section: str, raw: Any) -> Mapping[str, Mapping[str, float]]:
+    if not isinstance(raw, dict):
+        raise ScoringConfigError(f"{section}: expected an object of bosses")
+    return MappingProxyType(
+        {boss: _weights(f"{section}.{boss}", rules) for boss, rules in raw.items()}
+    )
+
+
+class ScoringConfig:
+    """
+    Immutable snapshot of every scoring weight:
+
+      support_weights / mvp_weights     scoring.compute_support_scores / compute_mvp
+      boon_weights / important_boons    support boon score
+      success_rules / fail_rules        per-boss mechanic weights ("_default" fallback)
+
+    `version` is a hash of the whole snapshot. `key_for(boss)` only covers
+    the global weights plus that boss' mechanic rules, so it is what cached
+    results are keyed by: editing one boss' weights leaves every other
+    boss' cached results valid.
+    """
+
+    __slots__ = (
+        "support_weights",
+        "mvp_weights",
+        "boon_weights",
+        "important_boons",
+        "success_rules",
+        "fail_rules",
+        "version",
+        "source",
+        "loaded_at",
+        "_global_key",
+        "_boss_keys",
+    )
+
+    def __init__(self, data: Dict[str, Any], source: str) -> None:
+        self.support_weights = _weights("support_weights", data["support_weights"])
+        self.mvp_weights = _weights("mvp_weights", data["mvp_weights"])
+        self.boon_weights = _weights("boon_weights", data["boon_weights"])
+        boons = data["important_boons"]
+        if not isinstance(boons, (list, tuple, set, frozenset)):
+            raise ScoringConfigError("important_boons: expected a list of boon names")
+        self.important_boons = frozenset(str(b) for b in boons)
+        self.success_rules = _boss_rules("success_mechanics", data["success_mechanics"])
+        self.fail_rules = _boss_rules("fail_mechanics", data["fail_mechanics"])
+        self.source = source
+        self.loaded_at = time.time()
+
+        self._global_key = _digest(
+            [
+                dict(self.support_weights),
+                dict(self.mvp_weights),
+                dict(self.boon_weights),
+                sorted(self.important_boons),
+            ]
+        )
+        # Precompute per-boss keys; unknown bosses share the "_default" key
+        self._boss_keys: Dict[str, str] = {}
+        for boss in set(self.success_rules) | set(self.fail_rules) | {"_default"}:
+            self._boss_keys[boss] = _digest(
+                [
+                    self._global_key,
+                    dict(self.success_rules_for(boss)),
+                    dict(self.fail_rules_for(boss)),
+                ]
+            )
+        self.version = _digest([self._global_key, sorted(self._boss_keys.items())])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if hasattr(self, "version"):
+            raise AttributeError("ScoringConfig snapshots are immutable")
+        object.__setattr__(self, name, value)
+
+    def success_rules_for(self, boss_name: str) -> Mapping[str, float]:
+        rules = self.success_rules.get(boss_name)
+        if rules is None:
+            rules = self.success_rules.get("_default", MappingProxyType({}))
+        return rules
+
+    def fail_rules_for(self, boss_name: str) -> Mapping[str, float]:
+        rules = self.fail_rules.get(boss_name)
+        if rules is None:
+            rules = self.fail_rules.get("_default", MappingProxyType({}))
+        return rules
+
+    def key_for(self, boss_name: str) -> str:
+        """
+        Hash of everything a boss' results depend on.
+        """
+        key = self._boss_keys.get(boss_name)
+        if key is None:
+            key = self._boss_keys["_default"]
+        return key
+
+    def changed_bosses(self, other: "ScoringConfig") -> Iterable[str]:
+        """
+        Bosses whose key differs between two snapshots ("*" = all of them).
+        """
+        if self._global_key != other._global_key:
+            return ["*"]
+        bosses = set(self._boss_keys) | set(other._boss_keys)
+        return sorted(b for b in bosses if self.key_for(b) != other.key_for(b))
+
+
+def builtin_data() -> Dict[str, Any]:
+    """
+    The weights defined in code, in the same layout as the config file.
+    """
+    return {
+        "support_weights": dict(SUPPORT_WEIGHTS),
+        "mvp_weights": dict(MVP_WEIGHTS),
+        "boon_weights": dict(BOON_GENERATION_WEIGHTS),
+        "important_boons": sorted(IMPORTANT_BOONS),
+        "success_mechanics": {b: dict(r) for b, r in SUCCESS_MECHANICS_CONFIG.items()},
+        "fail_mechanics": {b: dict(r) for b, r in FAILED_MECHANICS_CONFIG.items()},
+    }
+
+
+def load_scoring_config(path: Optional[str]) -> ScoringConfig:
+    """
+    Built-in weights overlaid with the JSON file at `path` (if any).
+
+    Top-level sections in the file replace the built-in ones, except the
+    mechanics sections, which replace individual bosses only.
+    """
+    data = builtin_data()
+    if not path:
+        return ScoringConfig(data, "built-in")
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            overlay = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ScoringConfigError(f"{path}: {e}") from e
+    if not isinstance(overlay, dict):
+        raise ScoringConfigError(f"{path}: expected a JSON object")
+
+    unknown = set(overlay) - set(data)
+    if unknown:
+        raise ScoringConfigError(f"{path}: unknown sections {sorted(unknown)}")
+
+    for section, value in overlay.items():
+        if section in ("success_mechanics", "fail_mechanics"):
+            if not isinstance(value, dict):
+                raise ScoringConfigError(f"{section}: expected an object of bosses")
+            data[section].update(value)
+        else:
+            data[section] = value
+    return ScoringConfig(data, path)
+
+
+# ---------------------------------------------------------------------------
+# Current snapshot (swapped atomically by reload)
+# ---------------------------------------------------------------------------
+
+_current: Optional[ScoringConfig] = None
+_current_mtime: Optional[float] = None
+
+
+def current() -> ScoringConfig:
+    global _current
+    if _current is None:
+        _current = load_scoring_config(None)
+    return _current
+
+
+def reload_scoring_config(path: Optional[str]) -> ScoringConfig:
+    """
+    Load a new snapshot and make it current. On error the old snapshot
+    stays in place and ScoringConfigError is raised.
+    """
+    global _current, _current_mtime
+    snapshot = load_scoring_config(path)
+    _current_mtime = _mtime(path)
+    _current = snapshot
+    return snapshot
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def init_scoring_config(path: Optional[str]) -> ScoringConfig:
+    """
+    Startup load: a broken file falls back to the built-in weights.
+    """
+    try:
+        snapshot = reload_scoring_config(path)
+    except ScoringConfigError as e:
+        print(f"[WARN] Scoring config not loaded, using built-in weights: {e}")
+        global _current_mtime
+        _current_mtime = _mtime(path)
+        return current()
+    print(f"Scoring config {snapshot.version} loaded from {snapshot.source}")
+    return snapshot
+
+
+async def watch_scoring_config(path: str, interval: float) -> None:
+    """
+    Reload the scoring config whenever the file's mtime changes.
+    """
+    global _current_mtime
+    while True:
+        await asyncio.sleep(interval)
+        mtime = _mtime(path)
+        if mtime is None or mtime == _current_mtime:
+            continue
+        previous = current()
+        try:
+            snapshot = reload_scoring_config(path)
+        except ScoringConfigError as e:
+            _current_mtime = mtime  # don't retry a broken file every tick
+            print(f"[WARN] Scoring config not reloaded: {e}")
+            continue
+        if snapshot.version != previous.version:
+            print(
+                f"Scoring config reloaded: {previous.version} -> {snapshot.version} "
+                f"(changed: {', '.join(snapshot.changed_bosses(previous)) or 'none'})"
+            )
@@ -0,0 +1,228 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import metrics
+from config import Config
+
+
+# Bosses listed on the scoreboard (the totals cover every log)
+RECENT_BOSSES = 8
+
+
+class RaidSession:
+    """
+    Running per-player totals for one channel's raid.
+
+    Each log is folded in once (add_log) touching only that log's players,
+    so the cost per boss does not grow with the length of the raid.
+    """
+
+    def __init__(self, channel_id: int, started_by: str, started_at: Optional[float] = None) -> None:
+        self.channel_id = channel_id
+        self.started_by = started_by
+        self.started_at = started_at if started_at is not None else time.time()
+        self.scoreboard_message_id: Optional[int] = None
+        self.report_ids: List[str] = []
+        self._seen: Set[str] = set()
+        self.recent: List[Dict[str, Any]] = []
+        self.kills = 0
+        self.wipes = 0
+        self.fight_seconds = 0.0
+        # name -> accumulators (see _player)
+        self.players: Dict[str, Dict[str, Any]] = {}
+
+    def _player(self, name: str) -> Dict[str, Any]:
+        acc = self.players.get(name)
+        if acc is None:
+            acc = {
+                "profession": "",
+                "logs": 0,
+                "damage_share": 0.0,
+                "fail_score": 0.0,
+                "fails": 0,
+                "downs": 0,
+                "mvps": 0,
+                "boon_score": 0.0,
+                "boons": {},
+            }
+            self.players[name] = acc
+        return acc
+
+    def has_report(self, report_id: str) -> bool:
+        return report_id in self._seen
+
+    def add_log(
+        self,
+        report_id: str,
+        encounter: Dict[str, Any],
+        phase_metrics: Dict[str, Any],
+    ) -> bool:
+        """
+        Fold one log (full-fight metrics from compute_phase_metrics) into the
+        totals. Returns False if this report was already counted.
+        """
+        if self.has_report(report_id):
+            return False
+        self.report_ids.append(report_id)
+        self._seen.add(report_id)
+
+        success = bool(encounter.get("success"))
+        if success:
+            self.kills += 1
+        else:
+            self.wipes += 1
+        duration = encounter.get("duration")
+        if isinstance(duration, (int, float)):
+            self.fight_seconds += float(duration)
+
+        self.recent.append(
+            {
+                "report_id": report_id,
+                "boss": encounter["boss_name"],
+                "success": success,
+                "is_cm": bool(encounter.get("is_cm")),
+            }
+        )
+        del self.recent[:-RECENT_BOSSES]
+
+        table_players = encounter["phase_table"]["players"]
+        damage_share = phase_metrics["damage_share"]
+        fail_counts = phase_metrics["fail_counts"]
+        fail_scores = phase_metrics["fail_score_map"]
+        support = phase_metrics["support_metrics"]
+
+        for name, pdata in table_players.items():
+            acc = self._player(name)
+            acc["profession"] = pdata.get("profession") or acc["profession"]
+            acc["logs"] += 1
+            acc["damage_share"] += damage_share.get(name, 0.0)
+            acc["fail_score"] += fail_scores.get(name, 0.0)
+            acc["fails"] += fail_counts.get(name, 0)
+            acc["downs"] += pdata["downs"][0]
+            sm = support.get(name)
+            if sm is not None:
+                acc["boon_score"] += sm["boon_score"]
+                boons = acc["boons"]
+                for boon, amount in sm["boons_generated"].items():
+                    boons[boon] = boons.get(boon, 0.0) + amount
+
+        mvp_name = phase_metrics.get("mvp_name")
+        if mvp_name is not None:
+            self._player(mvp_name)["mvps"] += 1
+
+        metrics.SESSION_LOGS.inc()
+        return True
+
+    def standings(self) -> List[Dict[str, Any]]:
+        """
+        One row per player with per-log averages, best first (MVPs, then
+        average damage share).
+        """
+        rows = []
+        for name, acc in self.players.items():
+            logs = acc["logs"] or 1
+            rows.append(
+                {
+                    "name": name,
+                    "profession": acc["profession"],
+                    "logs": acc["logs"],
+                    "mvps": acc["mvps"],
+                    "avg_damage_share": acc["damage_share"] / logs,
+                    "fails": acc["fails"],
+                    "fail_score": acc["fail_score"],
+                    "downs": acc["downs"],
+                    "avg_boon_score": acc["boon_score"] / logs,
+                }
+            )
+        rows.sort(key=lambda r: (r["mvps"], r["avg_damage_share"]), reverse=True)
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "channel_id": self.channel_id,
+            "started_by": self.started_by,
+            "started_at": self.started_at,
+            "scoreboard_message_id": self.scoreboard_message_id,
+            "report_ids": self.report_ids,
+            "recent": self.recent,
+            "kills": self.kills,
+            "wipes": self.wipes,
+            "fight_seconds": self.fight_seconds,
+            "players": self.players,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RaidSession":
+        session = cls(int(data["channel_id"]), data.get("started_by", ""), data.get("started_at"))
+        session.scoreboard_message_id = data.get("scoreboard_message_id")
+        session.report_ids = list(data.get("report_ids") or [])
+        session._seen = set(session.report_ids)
+        session.recent = list(data.get("recent") or [])
+        session.kills = int(data.get("kills", 0))
+        session.wipes = int(data.get("wipes", 0))
+        session.fight_seconds = float(data.get("fight_seconds", 0.0))
+        session.players = dict(data.get("players") or {})
+        return session
+
+
+class SessionStore:
+    """
+    Active sessions by channel id, written to `path` (JSON) after every
+    change so a restart mid-raid picks up where it left off. An empty path
+    keeps sessions in memory only.
+    """
+
+    def __init__(self, path: str = "") -> None:
+        self.path = path
+        self._sessions: Dict[int, RaidSession] = {}
+
+    def load(self) -> int:
+        if not self.path:
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            sessions = [RaidSession.from_dict(item) for item in data.get("sessions", [])]
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable session file {self.path}: {e!r}")
+            return 0
+        self._sessions = {s.channel_id: s for s in sessions}
+        metrics.SESSIONS_ACTIVE.set(len(self._sessions))
+        return len(self._sessions)
+
+    def save(self) -> None:
+        metrics.SESSIONS_ACTIVE.set(len(self._sessions))
+        if not self.path:
+            return
+        payload = {"sessions": [s.to_dict() for s in self._sessions.values()]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Could not save sessions to {self.path}: {e!r}")
+
+    def get(self, channel_id: int) -> Optional[RaidSession]:
+        return self._sessions.get(channel_id)
+
+    def start(self, channel_id: int, started_by: str) -> RaidSession:
+        session = RaidSession(channel_id, started_by)
+        self._sessions[channel_id] = session
+        self.save()
+        return session
+
+    def stop(self, channel_id: int) -> Optional[RaidSession]:
+        session = self._sessions.pop(channel_id, None)
+        if session is not None:
+            self.save()
+        return session
+
+
+session_store = SessionStore(Config.SESSION_PATH)
@@ -0,0 +1,116 @@
+import os
+import pickle
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import metrics
+from jobs import decode_encounter, encode_encounter, is_current
+
+
+SNAPSHOT_FORMAT = 1
+
+
+def save_snapshot(
+    path: str,
+    encounters: Iterable[Tuple[Hashable, Dict[str, Any]]],
+    extra_blobs: Iterable[Tuple[Hashable, bytes]] = (),
+    limit: int = 64,
+) -> int:
+    """
+    Write hot encounters (least recently used first) to `path` and return
+    the number of bytes written. `extra_blobs` are already-encoded entries,
+    e.g. restored ones nobody asked for yet; they are kept behind the live ones.
+
+    Encounters are stored individually compressed, so a restore only has to
+    decode the ones that are actually requested.
+    """
+    entries: Dict[Hashable, bytes] = {}
+    for key, blob in extra_blobs:
+        entries[key] = blob
+    for key, encounter in encounters:
+        entries.pop(key, None)
+        entries[key] = encode_encounter(encounter)
+
+    items = list(entries.items())[-limit:]
+    payload = pickle.dumps(
+        {
+            "format": SNAPSHOT_FORMAT,
+            "saved_at": time.time(),
+            "encounters": items,
+        },
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+class WarmStart:
+    """
+    Encounters restored from the last snapshot, kept compressed until a
+    command asks for one (take) or the next snapshot carries them over.
+    """
+
+    def __init__(self) -> None:
+        self._blobs: Dict[Hashable, bytes] = {}
+        self.saved_at: Optional[float] = None
+        self._hits, self._misses = metrics.cache_counters("warm_start")
+
+    def load(self, path: str) -> int:
+        """
+        Read a snapshot file; returns the number of encounters available.
+        A missing or unreadable file just means a cold start.
+        """
+        try:
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable snapshot {path}: {e!r}")
+            return 0
+
+        if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+            print(f"[WARN] Ignoring snapshot {path}: unknown format")
+            return 0
+
+        self.saved_at = payload.get("saved_at")
+        blobs = dict(payload.get("encounters") or [])
+        # Encounters saved by a version with another layout are not restored
+        self._blobs = {key: blob for key, blob in blobs.items() if is_current(blob)}
+        if len(self._blobs) < len(blobs):
+            print(
+                f"[WARN] Skipping {len(blobs) - len(self._blobs)} snapshot entries "
+                f"in an outdated format"
+            )
+        return len(self._blobs)
+
+    def take(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        if not self._blobs:
+            return None
+        blob = self._blobs.pop(key, None)
+        if blob is None:
+            self._misses.inc()
+            return None
+        try:
+            encounter = decode_encounter(blob)
+        except Exception as e:
+            print(f"[WARN] Dropping snapshot entry {key!r}: {e!r}")
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        return encounter
+
+    def remaining(self) -> List[Tuple[Hashable, bytes]]:
+        return list(self._blobs.items())
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+warm_start = WarmStart()
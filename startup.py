@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+import metrics
+
+
+# Set when bot.py starts importing (startup is its first import)
+_started = time.perf_counter()
+_last = _started
+_stages: List[Tuple[str, float]] = []
+
+
+def _record(stage: str, seconds: float) -> None:
+    _stages.append((stage, seconds))
+    metrics.STARTUP_SECONDS.labels(stage).set(seconds)
+
+
+def mark(stage: str) -> None:
+    """
+    Record the time since the previous mark (or process start) as `stage`.
+    """
+    global _last
+    now = time.perf_counter()
+    _record(stage, now - _last)
+    _last = now
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Record the duration of the block as `stage`.
+    """
+    global _last
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _last = time.perf_counter()
+        _record(stage, _last - started)
+
+
+def report() -> str:
+    """
+    One line per stage plus the total since bot.py started importing.
+    """
+    total = time.perf_counter() - _started
+    lines = [f"  {stage:<16} {seconds * 1000:8.1f} ms" for stage, seconds in _stages]
+    lines.append(f"  {'total':<16} {total * 1000:8.1f} ms")
+    metrics.STARTUP_SECONDS.labels("total").set(total)
+    return "Startup timing:\n" + "\n".join(lines)
@@ -0,0 +1,39 @@
+from typing import Dict, List
+
+# EI target names whose damage counts as "boss damage" for an encounter.
+# Encounters not listed here fall back to the targets EI itself assigns to
+# the full-fight phase (phases[0]["targets"]), i.e. its main targets.
+BOSS_TARGETS_CONFIG: Dict[str, List[str]] = {
+    "Twin Largos": ["Nikare", "Kenut"],
+
+    "Conjured Amalgamate": [
+        "Conjured Amalgamate",
+        "Left Arm",
+        "Right Arm",
+    ],
+
+    "Qadim": [
+        "Qadim",
+        "Ancient Invoked Hydra",
+        "Apocalypse Bringer",
+        "Wyvern Matriarch",
+        "Wyvern Patriarch",
+    ],
+
+    "Cardinal Adina": ["Cardinal Adina"],
+
+    "Cardinal Sabir": ["Cardinal Sabir"],
+
+    "Qadim the Peerless": ["Qadim the Peerless"],
+}
+
+
+def get_boss_target_names(boss_name: str) -> List[str]:
+    """
+    Configured boss target names, ignoring a trailing " CM" on the fight name.
+    """
+    if boss_name in BOSS_TARGETS_CONFIG:
+        return BOSS_TARGETS_CONFIG[boss_name]
+    if boss_name.endswith(" CM"):
+        return BOSS_TARGETS_CONFIG.get(boss_name[:-3], [])
+    return []
@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import backtest
+from scoring import compute_mvp, compute_support_scores
+
+
+PROFESSIONS = ("Firebrand", "Chronomancer", "Druid", "Scourge", "Weaver")
+
+# (mvp weights, support weights); the first is the base of evaluate()
+SETTINGS = [
+    ({"dps": 0.75, "support": 0.25, "fail_penalty": 0.4},
+     {"healing": 0.0, "boon": 0.1, "mech": 0.5, "breakbar": 0.7}),
+    ({"dps": 0.5, "support": 0.5, "fail_penalty": 0.2},
+     {"healing": 0.3, "boon": 0.4, "mech": 0.1, "breakbar": 0.0}),
+    ({"dps": 1.0, "support": 0.1, "fail_penalty": 1.0},
+     {"healing": 1.0, "boon": 0.0, "mech": 0.0, "breakbar": 0.2}),
+    ({"dps": 0.2, "support": 1.0, "fail_penalty": 0.0},
+     {"healing": 0.0, "boon": 1.0, "mech": 1.0, "breakbar": 1.0}),
+]
+
+
+def synthetic_rows(n_encounters=30, seed=7):
+    """
+    Export-style rows; some encounters are short of players (padding) and
+    many values are zero (ties), as in real logs.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for e in range(n_encounters):
+        for p in range(rng.randint(3, 10)):
+            rows.append({
+                "report_id": f"r{e}",
+                "player": f"p{p}",
+                "profession": rng.choice(PROFESSIONS),
+                "damage_share": rng.random() * 0.3,
+                "healing": rng.choice([0.0, rng.random() * 1e5]),
+                "boon_score": rng.choice([0.0, rng.random() * 50]),
+                "success_score": rng.choice([0.0, rng.random() * 3]),
+                "breakbar": rng.choice([0.0, rng.random() * 800]),
+                "fail_score": rng.choice([0.0, 0.0, rng.random() * 4]),
+                "is_mvp": False,
+            })
+    return rows
+
+
+def reference_scores(rows, mvp_weights, support_weights):
+    """
+    report id -> (MVP name, {player: score}) from the bot's own scoring.
+    """
+    by_report = {}
+    for row in rows:
+        by_report.setdefault(row["report_id"], []).append(row)
+    result = {}
+    for report_id, players in by_report.items():
+        support = compute_support_scores(
+            {
+                r["player"]: {
+                    "healing": r["healing"],
+                    "boon_score": r["boon_score"],
+                    "mech_success": r["success_score"],
+                    "breakbar": r["breakbar"],
+                }
+                for r in players
+            },
+            support_weights,
+        )
+        result[report_id] = compute_mvp(
+            boss_damage={r["player"]: r["damage_share"] for r in players},
+            support_scores=support,
+            mech_success_scores={r["player"]: r["success_score"] for r in players},
+            mech_fail_scores={r["player"]: r["fail_score"] for r in players},
+            weights=mvp_weights,
+        )
+    return result
+
+
+def settings_matrix():
+    return np.array([
+        [{**{f"mvp.{k}": v for k, v in mvp.items()},
+          **{f"support.{k}": v for k, v in support.items()}}[key]
+         for key in backtest.GRID_KEYS]
+        for mvp, support in SETTINGS
+    ])
+
+
+def test_features_times_weights_is_compute_mvp_score():
+    rows = synthetic_rows()
+    features, mask, _, _, _ = backtest.load_tensor(rows)
+    weights = backtest.combined_weights(settings_matrix())
+    scores = np.einsum("epf,fk->epk", features, weights)
+
+    reports = list(dict.fromkeys(r["report_id"] for r in rows))
+    for k, (mvp_weights, support_weights) in enumerate(SETTINGS):
+        expected = reference_scores(rows, mvp_weights, support_weights)
+        for e, report_id in enumerate(reports):
+            _, player_scores = expected[report_id]
+            got = scores[e, : mask[e].sum(), k]
+            assert got == pytest.approx(list(player_scores.values()), abs=1e-12)
+
+
+def test_evaluate_matches_compute_mvp():
+    rows = synthetic_rows()
+    features, mask, prof, prof_names, _ = backtest.load_tensor(rows)
+    settings = settings_matrix()
+    result = backtest.evaluate(features, mask, prof, len(prof_names), settings, settings[0])
+
+    reports = list(dict.fromkeys(r["report_id"] for r in rows))
+    players = [list(dict.fromkeys(r["player"] for r in rows if r["report_id"] == rid)) for rid in reports]
+    base = reference_scores(rows, *SETTINGS[0])
+    assert [players[e][i] for e, i in enumerate(result["base_mvp"])] == [base[r][0] for r in reports]
+
+    for k, (mvp_weights, support_weights) in enumerate(SETTINGS):
+        expected = reference_scores(rows, mvp_weights, support_weights)
+        changed = sum(expected[r][0] != base[r][0] for r in reports) / len(reports)
+        assert result["mvp_change"][k] == pytest.approx(changed)
+        assert result["prof_mvp"][k].sum() == len(reports)
+    # The base setting ranks every encounter exactly like itself
+    assert result["spearman"][0] == pytest.approx(1.0)
+
+
+def test_ranks_average_ties_and_skip_padding():
+    scores = np.array([[3.0, 1.0, 1.0, 5.0, -np.inf], [0.0, 0.0, 0.0, 0.0, 2.0]])
+    valid = np.isfinite(scores)
+    assert backtest._ranks(scores, valid).tolist() == [
+        [2.0, 0.5, 0.5, 3.0, 0.0],
+        [1.5, 1.5, 1.5, 1.5, 4.0],
+    ]
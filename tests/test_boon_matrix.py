@@ -0,0 +1,69 @@
+from gw2_stats import boon_matrix_row, compute_boon_matrix
+
+
+BUFF_MAP = {
+    "b740": {"name": "Might", "classification": "Boon"},
+    "b1187": {"name": "Quickness", "classification": "Boon"},
+    "b30328": {"name": "Alacrity", "classification": "Boon"},
+    "b737": {"name": "Burning", "classification": "Condition"},
+}
+
+
+def _buffs(generation):
+    """
+    {buff id: [generation per phase]} -> EI groupBuffs/squadBuffs entries.
+    """
+    return [
+        {"id": buff_id, "buffData": [{"generation": g} for g in values]}
+        for buff_id, values in generation.items()
+    ]
+
+
+def _player(name, group, squad=None):
+    return {"name": name, "groupBuffs": _buffs(group), "squadBuffs": _buffs(squad or {})}
+
+
+def _ei(players):
+    return {"buffMap": BUFF_MAP, "players": players}
+
+
+def test_round_trip_per_player_phase_and_kind():
+    ei = _ei([
+        _player("A", {740: [10.0, 4.0, 6.0], 1187: [2.0, 0.0, 2.0]}, {740: [20.0, 8.0, 12.0]}),
+        _player("B", {30328: [5.0, 5.0, 0.0], 737: [9.0, 9.0, 9.0]}),
+        _player("C", {740: [1.0, 0.5, 0.5]}),
+    ])
+    matrix = compute_boon_matrix(ei, 3)
+
+    assert boon_matrix_row(matrix, 0, "A") == {"Might": 10.0, "Quickness": 2.0}
+    assert boon_matrix_row(matrix, 1, "A") == {"Might": 4.0}
+    assert boon_matrix_row(matrix, 2, "A", "squad") == {"Might": 12.0}
+    # Conditions are not boons
+    assert boon_matrix_row(matrix, 1, "B") == {"Alacrity": 5.0}
+    assert boon_matrix_row(matrix, 2, "B") == {}
+    assert boon_matrix_row(matrix, 2, "C") == {"Might": 0.5}
+    assert boon_matrix_row(matrix, 0, "nobody") == {}
+
+
+def test_filters_and_missing_phases():
+    ei = _ei([_player("A", {740: [10.0], 1187: [3.0, 1.0]})])
+    matrix = compute_boon_matrix(ei, 3)
+
+    # A phase missing from buffData falls back to the full fight
+    assert boon_matrix_row(matrix, 2, "A") == {"Might": 10.0, "Quickness": 3.0}
+    assert boon_matrix_row(matrix, 1, "A", important_boons={"Quickness"}) == {"Quickness": 1.0}
+    assert compute_boon_matrix(ei, 2, {"Might"})["boons"] == ["Might"]
+
+
+def test_duplicate_names_do_not_shift_later_rows():
+    ei = _ei([
+        _player("A", {740: [1.0, 5.0]}),
+        _player("A", {740: [2.0, 8.0]}),
+        _player("C", {740: [3.0, 14.0]}),
+    ])
+    matrix = compute_boon_matrix(ei, 2)
+
+    assert boon_matrix_row(matrix, 1, "C") == {"Might": 14.0}
+    assert boon_matrix_row(matrix, 0, "C") == {"Might": 3.0}
+    # The name maps to its last player, as in compute_phase_table
+    assert boon_matrix_row(matrix, 1, "A") == {"Might": 8.0}
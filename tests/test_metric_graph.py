@@ -0,0 +1,120 @@
+import copy
+import pickle
+
+import pytest
+
+from encounter import compute_phase_metrics
+from metric_graph import LazyMetrics, MetricGraph
+from scoring_config import ScoringConfig, builtin_data
+
+
+def counting_graph():
+    """
+    a <- b <- c, plus an independent d; calls[name] counts evaluations.
+    """
+    calls = {}
+    graph = MetricGraph()
+
+    def counted(name, fn):
+        def node(m, *deps):
+            calls[name] = calls.get(name, 0) + 1
+            return fn(m, *deps)
+        return node
+
+    graph.node("a")(counted("a", lambda m: m.encounter["x"] * 2))
+    graph.node("b", "a")(counted("b", lambda m, a: a + 1))
+    graph.node("c", "b")(counted("c", lambda m, b: b * 10))
+    graph.node("d")(counted("d", lambda m: m.phase_index))
+    return graph, calls
+
+
+def test_nodes_are_computed_on_demand_and_once():
+    graph, calls = counting_graph()
+    m = LazyMetrics(graph, {"x": 3}, 2, None)
+
+    assert m["b"] == 7
+    assert calls == {"a": 1, "b": 1}
+    assert m["c"] == 70
+    assert m["a"] == 6
+    assert calls == {"a": 1, "b": 1, "c": 1}
+    assert set(m.computed()) == {"a", "b", "c"}
+
+
+def test_bound_views_share_computed_values():
+    graph, calls = counting_graph()
+    memo = LazyMetrics(graph, None, 0, None)
+
+    assert memo.bound({"x": 1}, None)["b"] == 3
+    assert memo.bound({"x": 1}, None)["c"] == 30
+    assert calls == {"a": 1, "b": 1, "c": 1}
+    assert set(memo.computed()) == {"a", "b", "c"}
+    # The memo itself never holds the encounter
+    assert memo.encounter is None
+    with pytest.raises(RuntimeError):
+        memo["d"]
+
+
+def test_unknown_node_and_mapping_protocol():
+    graph, _ = counting_graph()
+    m = LazyMetrics(graph, {"x": 1}, 0, None, values={"extra": 5})
+    with pytest.raises(KeyError):
+        m["missing"]
+    assert "missing" not in m and "a" in m and "extra" in m
+    assert list(m) == ["a", "b", "c", "d", "extra"]
+    assert m.get("missing") is None
+
+
+def test_pickling_keeps_values_only():
+    graph = MetricGraph()
+    graph.node("a")(_double_x)
+    graph.node("b")(_double_x)
+    m = LazyMetrics(graph, {"x": 4}, 0, None)
+    assert m["a"] == 8
+
+    restored = pickle.loads(pickle.dumps(m))
+    assert restored.encounter is None and restored.computed() == ("a",)
+    assert restored["a"] == 8
+    assert restored.bound({"x": 5}, None)["b"] == 10
+
+
+def _double_x(m):
+    return m.encounter["x"] * 2
+
+
+def _config(**mvp_weights):
+    data = copy.deepcopy(builtin_data())
+    data["mvp_weights"].update(mvp_weights)
+    return ScoringConfig(data, "test")
+
+
+def _encounter():
+    return {
+        "boss_name": "Vale Guardian",
+        "phase_table": {"phases": [{"index": 0, "name": "Full Fight"}]},
+        "by_phase": {},
+    }
+
+
+def test_phase_metrics_are_memoized_per_scoring_key():
+    encounter = _encounter()
+    config = _config()
+
+    first = compute_phase_metrics(encounter, 0, config)
+    assert first["phase"]["name"] == "Full Fight"
+    again = compute_phase_metrics(encounter, 0, config)
+    assert "phase" in again.computed()
+    assert again["scoring_key"] == config.key_for("Vale Guardian")
+    # Only the unbound memo is stored on the encounter
+    assert all(m.encounter is None for m in encounter["by_phase"].values())
+
+
+def test_changed_weights_make_memoized_results_stale():
+    encounter = _encounter()
+    old, new = _config(), _config(dps=0.1)
+    assert old.key_for("Vale Guardian") != new.key_for("Vale Guardian")
+
+    compute_phase_metrics(encounter, 0, old)["phase"]
+    fresh = compute_phase_metrics(encounter, 0, new)
+    assert fresh.computed() == ("scoring_key",)
+    assert fresh["scoring_key"] == new.key_for("Vale Guardian")
+    assert list(encounter["by_phase"]) == [(0, new.key_for("Vale Guardian"))]
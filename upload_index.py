@@ -0,0 +1,118 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional, Tuple
+
+import metrics
+
+
+# (report_id, boss_name, duration_seconds, success, is_cm, permalink),
+# the same tuple upload_attached_log returns
+UploadInfo = Tuple[str, str, Optional[float], bool, bool, Optional[str]]
+
+_CHUNK = 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    """
+    sha256 of an attachment, fed in 1 MiB chunks. hashlib releases the GIL
+    on each chunk, so this can run in a thread beside the event loop.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(data)
+    for offset in range(0, len(view), _CHUNK):
+        digest.update(view[offset : offset + _CHUNK])
+    return digest.hexdigest()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256     TEXT PRIMARY KEY,
+    report_id  TEXT    NOT NULL,
+    permalink  TEXT,
+    boss_name  TEXT    NOT NULL,
+    duration   REAL,
+    success    INTEGER NOT NULL,
+    is_cm      INTEGER NOT NULL,
+    size       INTEGER NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 0,
+    created    REAL    NOT NULL
+);
+"""
+
+
+class UploadIndex:
+    """
+    Content hash of every uploaded log -> the dps.report upload it produced,
+    in a SQLite file, so the same .zevtc attached twice is uploaded once.
+
+    All methods block; the bot calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._hits, self._misses = metrics.cache_counters("upload_hash")
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def lookup(self, sha256: str, size: int) -> Optional[UploadInfo]:
+        """
+        The earlier upload of identical bytes, or None. A hit counts `size`
+        as upload bytes saved.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT report_id, boss_name, duration, success, is_cm, permalink "
+                "FROM uploads WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+            if row is None:
+                self._misses.inc()
+                return None
+            conn.execute("UPDATE uploads SET hits = hits + 1 WHERE sha256 = ?", (sha256,))
+        self.count_hit(size)
+        report_id, boss_name, duration, success, is_cm, permalink = row
+        return report_id, boss_name, duration, bool(success), bool(is_cm), permalink
+
+    def count_hit(self, size: int) -> None:
+        self._hits.inc()
+        metrics.UPLOAD_BYTES_SAVED.labels("duplicate").inc(size)
+
+    def record(self, sha256: str, size: int, info: UploadInfo) -> None:
+        report_id, boss_name, duration, success, is_cm, permalink = info
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads "
+                "(sha256, report_id, permalink, boss_name, duration, success, is_cm, size, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    sha256,
+                    report_id,
+                    permalink,
+                    boss_name,
+                    duration,
+                    int(bool(success)),
+                    int(bool(is_cm)),
+                    size,
+                    time.time(),
+                ),
+            )
+
+
+def open_upload_index(path: str) -> Optional[UploadIndex]:
+    """
+    UploadIndex for `path`, or None when deduplication is disabled.
+    """
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return UploadIndex(path)
@@ -0,0 +1,113 @@
+import math
+from typing import Any, Callable, Optional, Sequence
+
+import discord
+from discord.ext import commands
+
+from config import Config
+from outbound import outbound
+
+
+class PaginatedView(discord.ui.View):
+    """
+    One message, many pages: keeps a cursor over an already-ranked list and
+    renders only the visible page, when a user clicks ◀ / ▶.
+
+    render_item(rank, item) -> str       one line for one entry (rank is 1-based)
+    make_embed(description) -> Embed     wraps a page's text (title, colour, fields)
+
+    When the view times out the buttons are disabled and the references to
+    the items and callbacks are dropped, so the cached state can be freed.
+    """
+
+    def __init__(
+        self,
+        items: Sequence[Any],
+        render_item: Callable[[int, Any], str],
+        make_embed: Callable[[str], discord.Embed],
+        page_size: int,
+        timeout: float,
+    ) -> None:
+        super().__init__(timeout=timeout)
+        self.items = items
+        self.render_item = render_item
+        self.make_embed = make_embed
+        self.page_size = max(page_size, 1)
+        self.page = 0
+        self.pages = max(1, math.ceil(len(items) / self.page_size))
+        self.message: Optional[discord.Message] = None
+        self._sync_buttons()
+
+    def render(self) -> discord.Embed:
+        start = self.page * self.page_size
+        page_items = self.items[start:start + self.page_size]
+        lines = [
+            self.render_item(start + offset + 1, item)
+            for offset, item in enumerate(page_items)
+        ]
+        embed = self.make_embed("\n".join(lines)[:4000])
+
+        if self.pages > 1:
+            page_text = f"Page {self.page + 1}/{self.pages}"
+            footer = embed.footer.text if embed.footer else None
+            embed.set_footer(text=f"{footer} • {page_text}" if footer else page_text)
+        return embed
+
+    def _sync_buttons(self) -> None:
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def _show(self, interaction: discord.Interaction) -> None:
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(self.page - 1, 0)
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.page + 1, self.pages - 1)
+        await self._show(interaction)
+
+    async def on_timeout(self) -> None:
+        for child in self.children:
+            child.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+        # Free the cursor's references to cached metrics
+        self.items = ()
+        self.render_item = None
+        self.make_embed = None
+        self.message = None
+
+
+async def send_paginated(
+    ctx: commands.Context,
+    items: Sequence[Any],
+    render_item: Callable[[int, Any], str],
+    make_embed: Callable[[str], discord.Embed],
+    page_size: Optional[int] = None,
+) -> discord.Message:
+    """
+    Send the first page of `items`; attach ◀ / ▶ buttons only if there is
+    more than one page.
+    """
+    view = PaginatedView(
+        items,
+        render_item,
+        make_embed,
+        page_size=page_size or Config.PAGE_SIZE,
+        timeout=Config.VIEW_TIMEOUT,
+    )
+    if view.pages <= 1:
+        view.stop()
+        return await outbound.send(ctx, embed=view.render())
+
+    view.message = await outbound.send(ctx, embed=view.render(), view=view)
+    return view.message
@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import metrics
+
+
+# Frames kept from the innermost end of a captured stack
+STACK_LIMIT = 40
+
+# asyncio task -> (kind, detail) of the work it is doing, e.g.
+# ("mvp", "!mvp XXXX-YYYY_boss"); read by the watchdog thread on a stall
+_task_labels: "weakref.WeakKeyDictionary[asyncio.Task, Tuple[str, str]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def label_current_task(kind: str, detail: str) -> None:
+    """
+    Name what the running task is doing, so a stall inside it can be
+    attributed (kind becomes a metric label; keep it low-cardinality).
+    """
+    task = asyncio.current_task()
+    if task is not None:
+        _task_labels[task] = (kind, detail[:200])
+
+
+class _Stall:
+    __slots__ = ("detected_at", "last_beat", "kind", "detail", "stack")
+
+    def __init__(self, last_beat: float, kind: str, detail: str, stack: str) -> None:
+        self.detected_at = time.time()
+        self.last_beat = last_beat
+        self.kind = kind
+        self.detail = detail
+        self.stack = stack
+
+
+class StallWatchdog(threading.Thread):
+    """
+    Background thread that notices when the event loop stops running.
+
+    The loop re-arms a call_later heartbeat every `interval`; this thread
+    checks it and, once the heartbeat is `threshold` seconds late, grabs
+    the loop thread's stack and the label of the task that is running
+    (see label_current_task). When the loop comes back, the stall is
+    reported with its full duration: printed, appended to `log_path` and
+    counted in gw2bot_loop_stalls_total / gw2bot_loop_stall_seconds.
+    """
+
+    RECENT = 20
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        threshold: float,
+        interval: float = 0.1,
+        log_path: str = "",
+    ) -> None:
+        super().__init__(name="stall-watchdog", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.threshold = threshold
+        self.interval = interval
+        self.log_path = log_path
+        self.recent: Deque[Dict[str, Any]] = collections.deque(maxlen=self.RECENT)
+        self._last_beat = time.monotonic()
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stop_event = threading.Event()
+
+    # -- loop side ------------------------------------------------------------
+
+    def _beat(self) -> None:
+        self._last_beat = time.monotonic()
+        self._handle = self.loop.call_later(self.interval, self._beat)
+
+    def start(self) -> None:
+        self._beat()
+        super().start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._handle is not None:
+            self._handle.cancel()
+
+    # -- watchdog thread ------------------------------------------------------
+
+    def run(self) -> None:
+        poll = min(self.interval, self.threshold / 4)
+        stall: Optional[_Stall] = None
+        while not self._stop_event.wait(poll):
+            last_beat = self._last_beat
+            if stall is not None:
+                if last_beat != stall.last_beat:
+                    # Heartbeat is back: the stall lasted until it ran
+                    self._report(stall, last_beat - stall.last_beat - self.interval)
+                    stall = None
+                continue
+            if time.monotonic() - last_beat - self.interval >= self.threshold:
+                stall = self._capture(last_beat)
+
+    def _capture(self, last_beat: float) -> _Stall:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame else ""
+        kind, detail = "unknown", "(no command)"
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        if task is not None:
+            kind, detail = _task_labels.get(task, ("task", task.get_name()))
+        return _Stall(last_beat, kind, detail, stack)
+
+    def _report(self, stall: _Stall, duration: float) -> None:
+        metrics.LOOP_STALLS.labels(stall.kind).inc()
+        metrics.LOOP_STALL_SECONDS.observe(duration)
+        entry = {
+            "at": stall.detected_at,
+            "seconds": duration,
+            "kind": stall.kind,
+            "detail": stall.detail,
+            "stack": stall.stack,
+        }
+        self.recent.append(entry)
+
+        text = format_stall(entry)
+        print(f"[WARN] {text}")
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(text + "\n")
+            except OSError as e:
+                print(f"[WARN] Could not write stall log {self.log_path}: {e!r}")
+
+
+def format_stall(entry: Dict[str, Any]) -> str:
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["at"]))
+    return (
+        f"{stamp} Event loop stalled {entry['seconds']:.2f}s during {entry['detail']}\n"
+        f"{entry['stack'] or '(no stack)'}"
+    )
+
+
+_watchdog: Optional[StallWatchdog] = None
+
+
+def start_stall_watchdog(threshold: float, interval: float, log_path: str = "") -> StallWatchdog:
+    """
+    Start (once) watching the running loop; call from the loop thread.
+    """
+    global _watchdog
+    if _watchdog is None:
+        if log_path and os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        _watchdog = StallWatchdog(
+            asyncio.get_running_loop(),
+            threading.get_ident(),
+            threshold,
+            interval=interval,
+            log_path=log_path,
+        )
+        _watchdog.start()
+    return _watchdog
+
+
+def get_stall_watchdog() -> Optional[StallWatchdog]:
+    return _watchdog
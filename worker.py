@@ -0,0 +1,118 @@
+"""
+Fetch + compute worker for the job queue (see jobs.py).
+
+Run next to the bot with the same JOB_QUEUE_PATH:
+
+    JOB_QUEUE_PATH=data/jobs.sqlite3 python worker.py            # WORKER_PROCESSES workers
+    JOB_QUEUE_PATH=data/jobs.sqlite3 python worker.py --processes 4
+
+Each worker claims one report at a time, fetches its EI JSON from dps.report,
+builds the compact encounter and stores it in the shared result cache.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+
+from aiohttp import ClientResponseError
+
+from config import Config
+from dps_report_client import fetch_ei_json
+from encounter import compute_phase_metrics, encounter_from_json
+from jobs import SQLiteJobQueue, encode_encounter, open_job_queue
+import scoring_config
+
+
+PRUNE_EVERY = 3600.0
+
+
+async def process_report(report_id: str) -> bytes:
+    """
+    Fetch one report and return its encoded compact encounter.
+    """
+    ei_json = await fetch_ei_json(report_id)
+    encounter = encounter_from_json(ei_json, f"https://dps.report/{report_id}")
+    del ei_json
+
+    # Warm the default phase so the gateway's first command is a lookup
+    try:
+        compute_phase_metrics(encounter, Config.PHASE_INDEX).evaluate_all()
+    except IndexError:
+        pass
+    return encode_encounter(encounter)
+
+
+async def run_worker(queue: SQLiteJobQueue, name: str) -> None:
+    scoring_config.init_scoring_config(Config.SCORING_CONFIG_PATH)
+    if Config.SCORING_CONFIG_PATH and Config.SCORING_WATCH_INTERVAL > 0:
+        asyncio.get_running_loop().create_task(
+            scoring_config.watch_scoring_config(
+                Config.SCORING_CONFIG_PATH, Config.SCORING_WATCH_INTERVAL
+            )
+        )
+
+    last_prune = 0.0
+    while True:
+        if time.monotonic() - last_prune > PRUNE_EVERY:
+            await asyncio.to_thread(queue.prune, Config.JOB_RESULT_TTL)
+            last_prune = time.monotonic()
+
+        job = await asyncio.to_thread(queue.claim, name)
+        if job is None:
+            await asyncio.sleep(Config.JOB_POLL_INTERVAL)
+            continue
+
+        job_id, report_id = job
+        started = time.perf_counter()
+        try:
+            payload = await process_report(report_id)
+        except ClientResponseError as e:
+            await asyncio.to_thread(queue.fail, job_id, f"HTTP {e.status} – {e.message}", e.status)
+            print(f"[{name}] {report_id}: HTTP {e.status}")
+            continue
+        except Exception as e:
+            await asyncio.to_thread(queue.fail, job_id, f"{type(e).__name__}: {e}")
+            print(f"[WARN] [{name}] {report_id} failed: {e!r}")
+            continue
+
+        await asyncio.to_thread(queue.complete, job_id, report_id, payload)
+        print(
+            f"[{name}] {report_id}: {len(payload) / 1024:.0f} KiB "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+
+def worker_main(index: int) -> None:
+    queue = open_job_queue(Config.JOB_QUEUE_PATH, Config.JOB_STALE_AFTER)
+    name = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    print(f"Worker {name} polling {Config.JOB_QUEUE_PATH}")
+    try:
+        asyncio.run(run_worker(queue, name))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GW2 raid bot fetch/compute worker")
+    parser.add_argument("--processes", type=int, default=Config.WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    if not Config.JOB_QUEUE_PATH:
+        raise SystemExit("JOB_QUEUE_PATH is not set. Use the same value as the bot.")
+
+    if args.processes <= 1:
+        worker_main(0)
+    else:
+        procs = [
+            multiprocessing.Process(target=worker_main, args=(i,), daemon=True)
+            for i in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        try:
+            for proc in procs:
+                proc.join()
+        except KeyboardInterrupt:
+            pass